@@ -1,21 +1,282 @@
 import ast
+import asyncio
+import atexit
+import builtins
+import contextlib
+import copy
+import cProfile
+import datetime
+import difflib
+import fnmatch
+import functools
+import hashlib
+import hmac
+import importlib.machinery
+import importlib.util
+import io
+import json
+import mmap
 import os
+import pickle
+import pstats
 import re
+import shutil
+import signal
+import site
+import stat
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tokenize
+import traceback
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+import httpx
 from mcp.server.fastmcp import FastMCP
 
 # Initialize FastMCP server
 mcp = FastMCP("coder", log_level="ERROR")
 
+# Matches any line containing at least one non-whitespace character
+_NON_EMPTY_LINE_RE = re.compile(r"^[^\S\n]*\S", re.MULTILINE)
+# Body of a fenced markdown code block in a model response
+_CODE_FENCE_RE = re.compile(r"```(?:\w+)?\s*(.*?)\s*```", re.DOTALL)
+
+# On-disk caches of plain data (AI results, reports), next to the other
+# artifacts in cwd
+CACHE_DIR = Path.cwd() / "artifacts" / "cache" / "coder"
+
+# Caches holding pickles live in a per-user directory instead, never in a
+# work tree that a cloned repository controls
+_XDG_CACHE_HOME = os.environ.get("XDG_CACHE_HOME", "")
+if not os.path.isabs(_XDG_CACHE_HOME):
+    _XDG_CACHE_HOME = str(Path.home() / ".cache")
+USER_CACHE_DIR = Path(_XDG_CACHE_HOME) / "agent_ds" / "coder"
+
+# Pickled trees are only valid for the interpreter version that produced them
+_AST_CACHE_DIR = (
+    USER_CACHE_DIR / "ast" / f"py{sys.version_info[0]}{sys.version_info[1]}"
+)
+# Smaller sources parse in well under a millisecond; not worth a disk round trip
+_AST_DISK_CACHE_MIN_CHARS = 20_000
+
+
+# Parsed modules keyed by resolved path; entries are revalidated by (mtime_ns, size)
+_TREE_CACHE: Dict[str, tuple[int, int, str, ast.Module]] = {}
+_TREE_CACHE_MAX = 256
+
+
+@functools.lru_cache(maxsize=1)
+def _cache_signing_key() -> bytes:
+    """
+    Per-user secret that authenticates pickled cache entries.
+
+    Created with mode 0600 on first use. Raises OSError if it cannot be read
+    or created, in which case callers skip the disk cache.
+    """
+    path = USER_CACHE_DIR / "signing.key"
+    try:
+        key = path.read_bytes()
+    except FileNotFoundError:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            key = path.read_bytes()
+        else:
+            key = os.urandom(32)
+            with os.fdopen(fd, "wb") as f:
+                f.write(key)
+    if len(key) != 32:
+        raise OSError(f"Unusable cache signing key: {path}")
+    return key
+
+
+def _sign_cache_entry(payload: bytes) -> bytes:
+    """Prefix ``payload`` with its HMAC-SHA256 under the per-user key."""
+    return hmac.new(_cache_signing_key(), payload, hashlib.sha256).digest() + payload
+
+
+def _verified_cache_entry(blob: bytes) -> Optional[bytes]:
+    """The payload of a signed cache entry, or None if it was not signed by us."""
+    mac, payload = blob[:32], blob[32:]
+    expected = hmac.new(_cache_signing_key(), payload, hashlib.sha256).digest()
+    return payload if hmac.compare_digest(mac, expected) else None
+
+
+def _parse_with_disk_cache(content: str) -> ast.Module:
+    """
+    Parse source, reusing a tree pickled by an earlier server process.
+
+    Entries are keyed by SHA-256 of the source, so they never go stale. They
+    live under USER_CACHE_DIR and are only unpickled when their HMAC matches
+    the per-user key, so files this user's server did not write are ignored.
+    Each call returns a fresh tree object that the caller may mutate.
+    """
+    if len(content) < _AST_DISK_CACHE_MIN_CHARS:
+        return ast.parse(content)
+    key = hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).hexdigest()
+    cache_path = _AST_CACHE_DIR / key[:2] / key
+    try:
+        payload = _verified_cache_entry(cache_path.read_bytes())
+        if payload is not None:
+            tree = pickle.loads(payload)
+            if isinstance(tree, ast.Module):
+                return tree
+    except Exception:
+        # Missing, unreadable or unsigned entry; fall back to parsing
+        pass
+    tree = ast.parse(content)
+    try:
+        cache_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        payload = pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+        _atomic_write_bytes(cache_path, [_sign_cache_entry(payload)])
+    except OSError:
+        pass
+    return tree
+
+
+# Resolved path arguments keyed by (argument, cwd)
+_RESOLVE_CACHE: Dict[tuple[str, str], Path] = {}
+_RESOLVE_CACHE_MAX = 1024
+
+
+def _resolve_path(raw: str) -> tuple[Path, bool]:
+    """
+    ``Path(raw).expanduser().resolve()`` and whether it exists.
+
+    Resolution is memoized per (raw, cwd). Absolute ``.py`` paths without
+    ``..`` components, which is what agents normally pass, are only
+    normalized lexically and checked with one lstat, skipping resolve()'s
+    per-component readlink calls. Symlinks still go through resolve(), so
+    tools act on (and cache under) the link's target. Existence is always
+    checked afresh, since files are also created outside the tools.
+    """
+    if (
+        raw.endswith(".py")
+        and os.path.isabs(raw)
+        and ".." not in raw.replace("\\", "/").split("/")
+    ):
+        p = Path(os.path.normpath(raw))
+        try:
+            if not stat.S_ISLNK(os.lstat(p).st_mode):
+                return p, True
+        except OSError:
+            return p, False
+        # A symlink; resolve it below
+    key = (raw, os.getcwd())
+    p = _RESOLVE_CACHE.get(key)
+    if p is None:
+        p = Path(raw).expanduser().resolve()
+        if len(_RESOLVE_CACHE) >= _RESOLVE_CACHE_MAX:
+            _RESOLVE_CACHE.pop(next(iter(_RESOLVE_CACHE)), None)
+        _RESOLVE_CACHE[key] = p
+    return p, p.exists()
+
+
+def _forget_tree(path: Path) -> None:
+    """Drop cached state for a file after the tool itself rewrote it."""
+    _TREE_CACHE.pop(str(path), None)
+
+
+def _get_tree(path: Path) -> tuple[str, ast.Module]:
+    """
+    Return (content, tree) for a Python file, reusing the parse while it is unchanged.
+
+    The returned tree is shared between callers and must not be mutated.
+    """
+    st = path.stat()
+    key = str(path)
+    cached = _TREE_CACHE.get(key)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2], cached[3]
+    content = path.read_text(encoding="utf-8")
+    tree = _parse_with_disk_cache(content)
+    if len(_TREE_CACHE) >= _TREE_CACHE_MAX:
+        # Evict the oldest entry (dicts preserve insertion order)
+        _TREE_CACHE.pop(next(iter(_TREE_CACHE)))
+    _TREE_CACHE[key] = (st.st_mtime_ns, st.st_size, content, tree)
+    return content, tree
+
+
+@functools.lru_cache(maxsize=256)
+def _cc_blocks_cached(path: str, mtime_ns: int, size: int) -> tuple:
+    from radon.complexity import cc_visit_ast
+
+    return tuple(cc_visit_ast(_get_tree(Path(path))[1]))
+
+
+def _cc_blocks(path: Path) -> tuple:
+    """
+    Radon cyclomatic complexity blocks for a Python file.
+
+    Results are memoized per (mtime_ns, size), so edits invalidate them.
+    Raises ImportError if radon is not installed.
+    """
+    st = path.stat()
+    return _cc_blocks_cached(str(path), st.st_mtime_ns, st.st_size)
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    """Replace a file's contents atomically with UTF-8 ``text``."""
+    _atomic_write_bytes(path, [text.encode("utf-8")])
+
+
+def _atomic_write_bytes(path: Path, chunks: List[Any]) -> None:
+    """
+    Replace a file's contents atomically with the concatenation of ``chunks``.
+
+    The chunks (bytes or memoryviews) are written to a temp file in the same
+    directory, fsynced, and renamed over the target with os.replace, so
+    readers never observe a partially written file. The original permission
+    bits are preserved. A symlink is written through: its final target is
+    replaced and the link itself is left in place.
+    """
+    target = Path(os.path.realpath(path))
+    fd, tmp_name = tempfile.mkstemp(
+        dir=str(target.parent), prefix=f".{target.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_name, stat.S_IMODE(target.stat().st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_name, target)
+        _forget_tree(path)
+        if target != path:
+            _forget_tree(target)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+
 
 def _analyze_python_file(path: Path) -> str:
     """Extracts high-level structure (classes, functions, docstrings) from a Python file."""
     try:
-        content = path.read_text(encoding="utf-8", errors="replace")
-        tree = ast.parse(content)
+        # Like the other analyzers, decode the bytes directly: the parser and
+        # the regexes accept \r\n, so text-mode newline translation is wasted
+        content = path.read_bytes().decode("utf-8", errors="replace")
+        tree = _parse_with_disk_cache(content)
         summary = []
 
         # Module Docstring
@@ -23,16 +284,25 @@ def _analyze_python_file(path: Path) -> str:
         if docstring:
             summary.append(f'Docstring: """{docstring.strip().splitlines()[0]}..."""')
 
+        # Only top-level nodes are visited; exact type checks against local
+        # names skip the isinstance and module attribute lookups per node
+        ClassDef, FunctionDef, Assign, Name = (
+            ast.ClassDef,
+            ast.FunctionDef,
+            ast.Assign,
+            ast.Name,
+        )
         for node in tree.body:
-            if isinstance(node, ast.ClassDef):
-                methods = [n.name for n in node.body if isinstance(n, ast.FunctionDef)]
-                summary.append(f"Class: {node.name} ({', '.join(methods)})")
-            elif isinstance(node, ast.FunctionDef):
+            node_type = type(node)
+            if node_type is ClassDef:
+                methods = ", ".join(n.name for n in node.body if type(n) is FunctionDef)
+                summary.append(f"Class: {node.name} ({methods})")
+            elif node_type is FunctionDef:
                 summary.append(f"Function: {node.name}")
-            elif isinstance(node, ast.Assign):
+            elif node_type is Assign:
                 # Try to catch uppercase constants
                 for target in node.targets:
-                    if isinstance(target, ast.Name) and target.id.isupper():
+                    if type(target) is Name and target.id.isupper():
                         summary.append(f"Constant: {target.id}")
 
         return "\n".join(summary)
@@ -40,27 +310,59 @@ def _analyze_python_file(path: Path) -> str:
         return f"Error parsing Python file: {e}"
 
 
+# Declarations picked up by the JavaScript/TypeScript structure summaries,
+# one alternative per kind; the named group holding the declared name tells
+# which alternative matched, so a single scan finds every kind. Each
+# alternative is a lookahead, so a match consumes no text and cannot hide a
+# declaration of another kind that starts inside it (a bodiless TS function's
+# return type pattern runs on to the next "{")
+_JS_DECLARATION_PATTERNS = {
+    # function name(...) { ... }
+    "func": r"function\s+(?P<func>\w+)\s*\([^)]*\)\s*{",
+    # Arrow functions assigned to const/let/var
+    "arrow": r"(?:const|let|var)\s+(?P<arrow>\w+)\s*=\s*\([^)]*\)\s*=>",
+    "cls": r"class\s+(?P<cls>\w+)",
+}
+_TS_DECLARATION_PATTERNS = {
+    **_JS_DECLARATION_PATTERNS,
+    # Allow a return type annotation before the body
+    "func": r"function\s+(?P<func>\w+)\s*\([^)]*\)\s*(?::[^{]*)?\s*{",
+    "interface": r"interface\s+(?P<interface>\w+)",
+    "type": r"type\s+(?P<type>\w+)\s*=",
+    "enum": r"enum\s+(?P<enum>\w+)",
+}
+_JS_DECLARATION_RE = re.compile(
+    "|".join(f"(?={pattern})" for pattern in _JS_DECLARATION_PATTERNS.values())
+)
+_TS_DECLARATION_RE = re.compile(
+    "|".join(f"(?={pattern})" for pattern in _TS_DECLARATION_PATTERNS.values())
+)
+# Summary label per kind, in the order the sections are listed
+_DECLARATION_LABELS = {
+    "func": "Function",
+    "arrow": "Arrow Function",
+    "cls": "Class",
+    "interface": "Interface",
+    "type": "Type Alias",
+    "enum": "Enum",
+}
+
+
+def _summarize_declarations(content: str, regex: re.Pattern) -> str:
+    """List the declarations ``regex`` finds in ``content``, grouped by kind."""
+    found = {kind: [] for kind in _DECLARATION_LABELS}
+    for match in regex.finditer(content):
+        kind = match.lastgroup
+        found[kind].append(f"{_DECLARATION_LABELS[kind]}: {match.group(kind)}")
+    summary = [line for lines in found.values() for line in lines]
+    return "\n".join(summary) if summary else "No functions/classes found."
+
+
 def _analyze_javascript_file(path: Path) -> str:
     """Extracts high-level structure (functions, classes) from a JavaScript file."""
     try:
-        content = path.read_text(encoding="utf-8", errors="replace")
-        summary = []
-        # Simple regex for function declarations
-        import re
-
-        # Match function declarations: function name(...) { ... }
-        func_pattern = r"function\s+(\w+)\s*\([^)]*\)\s*{"
-        for match in re.finditer(func_pattern, content):
-            summary.append(f"Function: {match.group(1)}")
-        # Match arrow functions assigned to const/let/var
-        arrow_pattern = r"(?:const|let|var)\s+(\w+)\s*=\s*\([^)]*\)\s*=>"
-        for match in re.finditer(arrow_pattern, content):
-            summary.append(f"Arrow Function: {match.group(1)}")
-        # Match class declarations
-        class_pattern = r"class\s+(\w+)"
-        for match in re.finditer(class_pattern, content):
-            summary.append(f"Class: {match.group(1)}")
-        return "\n".join(summary) if summary else "No functions/classes found."
+        content = path.read_bytes().decode("utf-8", errors="replace")
+        return _summarize_declarations(content, _JS_DECLARATION_RE)
     except Exception as e:
         return f"Error parsing JavaScript file: {e}"
 
@@ -68,36 +370,8 @@ def _analyze_javascript_file(path: Path) -> str:
 def _analyze_typescript_file(path: Path) -> str:
     """Extracts high-level structure from a TypeScript file."""
     try:
-        content = path.read_text(encoding="utf-8", errors="replace")
-        summary = []
-        import re
-
-        # Match function declarations (including TypeScript syntax)
-        func_pattern = r"function\s+(\w+)\s*\([^)]*\)\s*(?::[^{]*)?\s*{"
-        for match in re.finditer(func_pattern, content):
-            summary.append(f"Function: {match.group(1)}")
-        # Arrow functions
-        arrow_pattern = r"(?:const|let|var)\s+(\w+)\s*=\s*\([^)]*\)\s*=>"
-        for match in re.finditer(arrow_pattern, content):
-            summary.append(f"Arrow Function: {match.group(1)}")
-        # Classes
-        class_pattern = r"class\s+(\w+)"
-        for match in re.finditer(class_pattern, content):
-            summary.append(f"Class: {match.group(1)}")
-        # Interfaces
-        interface_pattern = r"interface\s+(\w+)"
-        for match in re.finditer(interface_pattern, content):
-            summary.append(f"Interface: {match.group(1)}")
-        # Type aliases
-        type_pattern = r"type\s+(\w+)\s*="
-        for match in re.finditer(type_pattern, content):
-            summary.append(f"Type Alias: {match.group(1)}")
-        # Enums
-        enum_pattern = r"enum\s+(\w+)"
-        for match in re.finditer(enum_pattern, content):
-            summary.append(f"Enum: {match.group(1)}")
-
-        return "\n".join(summary) if summary else "No functions/classes found."
+        content = path.read_bytes().decode("utf-8", errors="replace")
+        return _summarize_declarations(content, _TS_DECLARATION_RE)
     except Exception as e:
         return f"Error parsing TypeScript file: {e}"
 
@@ -105,9 +379,8 @@ def _analyze_typescript_file(path: Path) -> str:
 def _analyze_java_file(path: Path) -> str:
     """Extracts high-level structure from a Java file."""
     try:
-        content = path.read_text(encoding="utf-8", errors="replace")
+        content = path.read_bytes().decode("utf-8", errors="replace")
         summary = []
-        import re
 
         # Match class definitions (including public, abstract, etc.)
         class_pattern = (
@@ -136,9 +409,8 @@ def _analyze_java_file(path: Path) -> str:
 def _analyze_cpp_file(path: Path) -> str:
     """Extracts high-level structure from a C++ file."""
     try:
-        content = path.read_text(encoding="utf-8", errors="replace")
+        content = path.read_bytes().decode("utf-8", errors="replace")
         summary = []
-        import re
 
         # Match class/struct definitions
         class_pattern = r"(?:class|struct)\s+(\w+)\s*(?::[^{]*)?\s*\{"
@@ -165,9 +437,8 @@ def _analyze_cpp_file(path: Path) -> str:
 def _analyze_rust_file(path: Path) -> str:
     """Extracts high-level structure from a Rust file."""
     try:
-        content = path.read_text(encoding="utf-8", errors="replace")
+        content = path.read_bytes().decode("utf-8", errors="replace")
         summary = []
-        import re
 
         # Function definitions: fn name(...) -> ...
         fn_pattern = r"fn\s+(\w+)\s*\([^)]*\)(?:\s*->[^{]*)?\s*\{"
@@ -202,9 +473,8 @@ def _analyze_rust_file(path: Path) -> str:
 def _analyze_go_file(path: Path) -> str:
     """Extracts high-level structure from a Go file."""
     try:
-        content = path.read_text(encoding="utf-8", errors="replace")
+        content = path.read_bytes().decode("utf-8", errors="replace")
         summary = []
-        import re
 
         # Function definitions: func name(...) ... { or func (receiver) name(...) ... {
         # Match both regular functions and methods
@@ -244,17 +514,14 @@ def _analyze_go_file(path: Path) -> str:
 def _analyze_html_file(path: Path) -> str:
     """Extracts high-level structure from an HTML file."""
     try:
-        content = path.read_text(encoding="utf-8", errors="replace")
+        content = path.read_bytes().decode("utf-8", errors="replace")
         summary = []
-        import re
 
         # Extract tag names (simplified)
         # Match opening tags like <div>, <script>, etc.
         tag_pattern = r"<(\w+)(?:\s+[^>]*)?>"
         tags = re.findall(tag_pattern, content)
         # Count unique tags
-        from collections import Counter
-
         tag_counts = Counter(tags)
         for tag, count in tag_counts.most_common():
             summary.append(f"Tag: {tag} (appears {count} times)")
@@ -276,6 +543,154 @@ def _analyze_html_file(path: Path) -> str:
         return f"Error parsing HTML file: {e}"
 
 
+def _walk_tree(
+    root: str,
+    ignore_dirs: Optional[set] = None,
+    max_depth: Optional[int] = None,
+    prune: Optional[Callable[[str], bool]] = None,
+):
+    """
+    Walk ``root`` top-down like os.walk, yielding ``(dirpath, relpath, depth, files)``.
+
+    ``relpath`` is "" for ``root`` itself and ``depth`` counts levels below
+    it; both are carried along the explicit stack instead of being derived
+    from each path. Directories named in ``ignore_dirs`` or whose relative
+    path ``prune`` returns True for are skipped, and directories at
+    ``max_depth`` are listed but not descended into.
+    Symlinked directories are not followed; unreadable ones are skipped.
+    """
+    ignore_dirs = ignore_dirs or set()
+    stack = [(root, "", 0)]
+    while stack:
+        path, rel, depth = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        subdirs, files = [], []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.append(entry.name)
+            elif entry.name not in ignore_dirs and not entry.is_symlink():
+                sub_rel = f"{rel}{os.sep}{entry.name}" if rel else entry.name
+                if prune is None or not prune(sub_rel):
+                    subdirs.append((entry.path, sub_rel))
+        yield path, rel, depth, files
+        if max_depth is None or depth < max_depth:
+            # Reversed, so subdirectories are popped in listing order
+            stack.extend(
+                (sub_path, sub_rel, depth + 1)
+                for sub_path, sub_rel in reversed(subdirs)
+            )
+
+
+# Below this size reading the file is cheaper than setting up a mapping
+_MMAP_MIN_BYTES = 4096
+
+
+def _grep_buffer(regex: re.Pattern, buf: Any):
+    """
+    Yield ``(line number, line)`` for each line of ``buf`` that ``regex`` matches.
+
+    ``buf`` is text for a str pattern, or bytes / an mmap for a bytes one.
+    The regex runs over the whole buffer, so only matching lines are sliced
+    out. The line count is advanced by counting the newlines in the gap
+    since the previous match with one count call (mmap has no count, so the
+    gap is sliced first). A hit that runs past the end of its line is
+    re-checked against that line alone, so matches never span lines.
+    """
+    newline = "\n" if isinstance(buf, str) else b"\n"
+    cr = "\r" if isinstance(buf, str) else b"\r"
+    if "$" in str(regex.pattern) and buf.find(cr + newline) != -1:
+        # $ does not match before the \r of a CRLF line, so match line by line
+        lines = buf[:].split(newline)
+        if not lines[-1]:
+            # Nothing follows the final newline
+            lines.pop()
+        for lineno, line in enumerate(lines, start=1):
+            line = line[:-1] if line.endswith(cr) else line
+            if regex.search(line):
+                yield lineno, line
+        return
+    lineno, counted = 1, 0
+    size = len(buf)
+    pos = 0
+    while pos < size:
+        match = regex.search(buf, pos)
+        if match is None:
+            return
+        line_start = buf.rfind(newline, 0, match.start()) + 1
+        if line_start >= size:
+            # An empty match after the final newline; there is no line there
+            return
+        line_end = buf.find(newline, match.start())
+        if line_end == -1:
+            line_end = size
+        text_end = line_end
+        if text_end > line_start and buf[text_end - 1 : text_end] == cr:
+            text_end -= 1
+        if (
+            match.end() <= text_end and match.group().find(newline) == -1
+        ) or regex.search(buf, line_start, text_end):
+            lineno += buf[counted:line_start].count(newline)
+            counted = line_start
+            yield lineno, buf[line_start:text_end]
+        # One report per line, however many matches it holds
+        pos = line_end + 1
+
+
+# Pattern characters whose meaning differs between bytes and str patterns
+# (\w, \s, \b and other escapes, ., classes) or that may set inline flags
+_BYTES_UNSAFE_PATTERN_CHARS = frozenset("\\.[(")
+
+
+def _grep_files(root: Path, regex: re.Pattern, name_matches, max_depth: Optional[int]):
+    """
+    Yield ``path:line:text`` for each matching line in files below ``root``.
+
+    A bytes ``regex`` runs over the raw file contents, mmapped for larger
+    files; a str one over the contents decoded as UTF-8.
+    """
+    grep_bytes = isinstance(regex.pattern, bytes)
+    for dirpath, _, _, files in _walk_tree(str(root), max_depth=max_depth):
+        for file in files:
+            if not name_matches(file):
+                continue
+            file_path = Path(dirpath) / file
+            try:
+                with open(file_path, "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    if size == 0:
+                        continue
+                    if not grep_bytes:
+                        text = f.read().decode("utf-8", errors="replace")
+                        for i, line in _grep_buffer(regex, text):
+                            yield f"{file_path}:{i}:{line}"
+                        continue
+                    if size < _MMAP_MIN_BYTES:
+                        buf = f.read()
+                    else:
+                        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    try:
+                        for i, line in _grep_buffer(regex, buf):
+                            text = line.decode("utf-8", errors="replace")
+                            yield f"{file_path}:{i}:{text}"
+                    finally:
+                        if isinstance(buf, mmap.mmap):
+                            buf.close()
+            except Exception as e:
+                yield f"{file_path}:0:Error reading file: {e}"
+
+
+# Characters of search output returned before it is truncated
+_SEARCH_OUTPUT_LIMIT = 5000
+
+
 def _search_files_python(
     folder_path: str,
     pattern: str,
@@ -286,58 +701,119 @@ def _search_files_python(
     """
     Search for pattern in files using pure Python.
     """
-    import re
-    from pathlib import Path
-
-    p = Path(folder_path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(folder_path)
+    if not exists:
         return f"Error: Path not found: {folder_path}"
     if not p.is_dir():
         return f"Error: Path is not a directory: {folder_path}"
 
-    # Compile regex
-    flags = re.IGNORECASE if ignore_case else 0
+    # Compile regex, with ^/$ anchored per line. Plain ASCII patterns match
+    # the same on bytes as on text, so they run over the raw file contents;
+    # anything else (\w, ., classes, non-ASCII, IGNORECASE) needs
+    # Unicode semantics and runs over decoded text
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    use_bytes = (
+        pattern.isascii()
+        and not ignore_case
+        and _BYTES_UNSAFE_PATTERN_CHARS.isdisjoint(pattern)
+    )
     try:
-        regex = re.compile(pattern, flags)
+        regex = re.compile(pattern.encode("utf-8") if use_bytes else pattern, flags)
     except re.error as e:
         return f"Error in regex pattern: {e}"
 
     # Prepare file pattern matching
-    from fnmatch import fnmatch
-
+    name_matches = re.compile(fnmatch.translate(file_pattern)).match
     matches = []
-    # Walk directory
-    for root, dirs, files in os.walk(str(p)):
-        # Apply max_depth
-        if max_depth is not None:
-            current_depth = Path(root).relative_to(p).parts
-            if len(current_depth) >= max_depth:
-                dirs.clear()  # don't go deeper
-        for file in files:
-            if not fnmatch(file, file_pattern):
-                continue
-            file_path = Path(root) / file
-            try:
-                content = file_path.read_text(encoding="utf-8", errors="replace")
-                lines = content.splitlines()
-                for i, line in enumerate(lines, start=1):
-                    if regex.search(line):
-                        matches.append(f"{file_path}:{i}:{line}")
-            except UnicodeDecodeError:
-                # Skip binary files
-                continue
-            except Exception as e:
-                matches.append(f"{file_path}:0:Error reading file: {e}")
+    # Joined length so far; stop walking once the output would be truncated
+    length = -1
+    for match in _grep_files(p, regex, name_matches, max_depth):
+        matches.append(match)
+        length += len(match) + 1
+        if length > _SEARCH_OUTPUT_LIMIT:
+            break
 
     if not matches:
         return "No matches found."
 
     output = "\n".join(matches)
-    if len(output) > 5000:
-        output = output[:5000] + "\n... (output truncated)"
+    if len(output) > _SEARCH_OUTPUT_LIMIT:
+        output = output[:_SEARCH_OUTPUT_LIMIT] + "\n... (output truncated)"
     return output
 
 
+# Threads analyzing source files for investigate_and_save_report
+_REPORT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Source files above this size (usually generated or minified) are listed in
+# the report but not analyzed
+_REPORT_MAX_FILE_BYTES = 1 << 20
+
+
+def _gitignore_spec(root: Path) -> Any:
+    """
+    Compile ``root``'s .gitignore and .git/info/exclude into a pathspec matcher.
+
+    Returns None when pathspec is not installed or there are no patterns;
+    callers then rely on their fixed ignore lists alone. Nested .gitignore
+    files are not read.
+    """
+    try:
+        import pathspec
+    except ImportError:
+        return None
+    lines: List[str] = []
+    for name in (".gitignore", os.path.join(".git", "info", "exclude")):
+        try:
+            text = (root / name).read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            continue
+        lines.extend(text.splitlines())
+    if not lines:
+        return None
+    return pathspec.GitIgnoreSpec.from_lines(lines)
+
+
+# Per-folder file summaries from earlier reports, keyed by relative path and
+# valid while the file's mtime and size are unchanged
+_REPORT_CACHE_DIR = CACHE_DIR / "reports"
+_REPORT_CACHE_VERSION = 1
+
+
+def _load_report_cache(cache_path: Path) -> Dict[str, list]:
+    """Read a report summary cache; missing, stale or corrupt ones are empty."""
+    try:
+        data = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != _REPORT_CACHE_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def _cached_analysis(
+    cache: Dict[str, list], analyzer, path: Path, rel_path: str
+) -> tuple[str, Optional[list]]:
+    """
+    Run ``analyzer`` on ``path`` unless ``cache`` has a summary for this version.
+
+    Returns the summary and the cache entry to keep for it (None when the
+    file can no longer be stat'ed).
+    """
+    try:
+        st = path.stat()
+    except OSError:
+        return analyzer(path), None
+    entry = cache.get(rel_path)
+    if entry is not None and entry[:2] == [st.st_mtime_ns, st.st_size]:
+        return entry[2], entry
+    if st.st_size > _REPORT_MAX_FILE_BYTES:
+        analysis = f"Skipped: larger than {_REPORT_MAX_FILE_BYTES} bytes."
+    else:
+        analysis = analyzer(path)
+    return analysis, [st.st_mtime_ns, st.st_size, analysis]
+
+
 @mcp.tool()
 def investigate_and_save_report(folder_path: str) -> str:
     """
@@ -348,8 +824,6 @@ def investigate_and_save_report(folder_path: str) -> str:
     Args:
         folder_path: The absolute path of the folder to investigate.
     """
-    import datetime
-
     p = Path(folder_path).expanduser().resolve()
     if not p.exists() or not p.is_dir():
         return f"Error: {folder_path} is not a valid directory."
@@ -389,71 +863,80 @@ def investigate_and_save_report(folder_path: str) -> str:
     html_analyses = []
     other_files_summary = []
 
+    # Source files to analyze: (target list, analyzer, path, relative path)
+    tasks = []
+
     # Statistics
     file_count = 0
     line_count = 0
     language_counts: Dict[str, int] = {}
 
-    for root, dirs, files in os.walk(str(p)):
-        dirs[:] = [d for d in dirs if d not in IGNORE_DIRS]
+    # Directories and files the project's .gitignore excludes are skipped
+    # on top of the fixed lists (pathspec matches "/"-separated paths)
+    spec = _gitignore_spec(p)
+    prune = None
+    if spec is not None:
+        prune = lambda rel: spec.match_file(rel.replace(os.sep, "/") + "/")
 
-        rel_path = os.path.relpath(root, str(p))
-        if rel_path == ".":
-            level = 0
-            prefix = ""
-        else:
-            level = rel_path.count(os.sep) + 1
-            prefix = rel_path + "/"
+    for root, rel_path, level, files in _walk_tree(str(p), IGNORE_DIRS, prune=prune):
+        # Everything derived from the directory is computed once, not per file
+        prefix = rel_path + "/" if rel_path else ""
+        spec_prefix = prefix.replace(os.sep, "/")
+        root_path = Path(root)
 
         indent = "  " * level
-        structure_lines.append(f"{indent}{os.path.basename(root)}/")
+        structure_lines.append(f"{indent}{root_path.name}/")
 
-        subindent = "  " * (level + 1)
+        subindent = indent + "  "
         for f in sorted(files):
             if f in IGNORE_FILES:
                 continue
-            structure_lines.append(f"{subindent}{f}")
+            if spec is not None and spec.match_file(spec_prefix + f):
+                continue
+            structure_lines.append(subindent + f)
 
             # Update statistics
             file_count += 1
-            ext = f.split(".")[-1].lower() if "." in f else ""
+            ext = f.rpartition(".")[2].lower() if "." in f else ""
             if ext:
                 language_counts[ext] = language_counts.get(ext, 0) + 1
 
-            file_path = Path(root) / f
+            file_path = root_path / f
             file_rel_path = prefix + f
 
             # Analyze Python Files
             if f.endswith(".py"):
-                analysis = _analyze_python_file(file_path)
-                if analysis:
-                    python_analyses.append(
-                        f"- **{file_rel_path}**\n```text\n{analysis}\n```"
-                    )
+                tasks.append(
+                    (python_analyses, _analyze_python_file, file_path, file_rel_path)
+                )
 
             # Analyze JavaScript Files
             elif f.endswith(".js"):
-                analysis = _analyze_javascript_file(file_path)
-                if analysis:
-                    javascript_analyses.append(
-                        f"- **{file_rel_path}**\n```text\n{analysis}\n```"
+                tasks.append(
+                    (
+                        javascript_analyses,
+                        _analyze_javascript_file,
+                        file_path,
+                        file_rel_path,
                     )
+                )
 
             # Analyze TypeScript Files
             elif f.endswith(".ts") or f.endswith(".tsx"):
-                analysis = _analyze_typescript_file(file_path)
-                if analysis:
-                    typescript_analyses.append(
-                        f"- **{file_rel_path}**\n```text\n{analysis}\n```"
+                tasks.append(
+                    (
+                        typescript_analyses,
+                        _analyze_typescript_file,
+                        file_path,
+                        file_rel_path,
                     )
+                )
 
             # Analyze Java Files
             elif f.endswith(".java"):
-                analysis = _analyze_java_file(file_path)
-                if analysis:
-                    java_analyses.append(
-                        f"- **{file_rel_path}**\n```text\n{analysis}\n```"
-                    )
+                tasks.append(
+                    (java_analyses, _analyze_java_file, file_path, file_rel_path)
+                )
 
             # Analyze C++ Files
             elif (
@@ -463,35 +946,25 @@ def investigate_and_save_report(folder_path: str) -> str:
                 or f.endswith(".cc")
                 or f.endswith(".cxx")
             ):
-                analysis = _analyze_cpp_file(file_path)
-                if analysis:
-                    cpp_analyses.append(
-                        f"- **{file_rel_path}**\n```text\n{analysis}\n```"
-                    )
+                tasks.append(
+                    (cpp_analyses, _analyze_cpp_file, file_path, file_rel_path)
+                )
 
             # Analyze Rust Files
             elif f.endswith(".rs"):
-                analysis = _analyze_rust_file(file_path)
-                if analysis:
-                    rust_analyses.append(
-                        f"- **{file_rel_path}**\n```text\n{analysis}\n```"
-                    )
+                tasks.append(
+                    (rust_analyses, _analyze_rust_file, file_path, file_rel_path)
+                )
 
             # Analyze Go Files
             elif f.endswith(".go"):
-                analysis = _analyze_go_file(file_path)
-                if analysis:
-                    go_analyses.append(
-                        f"- **{file_rel_path}**\n```text\n{analysis}\n```"
-                    )
+                tasks.append((go_analyses, _analyze_go_file, file_path, file_rel_path))
 
             # Analyze HTML Files
             elif f.endswith(".html") or f.endswith(".htm"):
-                analysis = _analyze_html_file(file_path)
-                if analysis:
-                    html_analyses.append(
-                        f"- **{file_rel_path}**\n```text\n{analysis}\n```"
-                    )
+                tasks.append(
+                    (html_analyses, _analyze_html_file, file_path, file_rel_path)
+                )
 
             # Summarize Config/Readmes (Keep it short)
             elif f.upper().startswith("README") or f in [
@@ -510,6 +983,32 @@ def investigate_and_save_report(folder_path: str) -> str:
                 except Exception:
                     pass
 
+    # Unchanged files reuse their summary from the previous report. The
+    # analyzers mostly read files and run regexes or ast.parse, so a
+    # thread pool overlaps the I/O; map() keeps the walk order
+    cache_path = _REPORT_CACHE_DIR / f"{_ai_cache_key(p)}.json"
+    cache = _load_report_cache(cache_path)
+    new_cache: Dict[str, list] = {}
+    with ThreadPoolExecutor(max_workers=_REPORT_WORKERS) as executor:
+        results = executor.map(
+            lambda task: _cached_analysis(cache, task[1], task[2], task[3]), tasks
+        )
+        for (target, _, _, file_rel_path), (analysis, entry) in zip(tasks, results):
+            if entry is not None:
+                new_cache[file_rel_path] = entry
+            if analysis:
+                target.append(f"- **{file_rel_path}**\n```text\n{analysis}\n```")
+    if new_cache != cache:
+        try:
+            _REPORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            _atomic_write_text(
+                cache_path,
+                json.dumps({"version": _REPORT_CACHE_VERSION, "files": new_cache}),
+            )
+        except OSError:
+            # Caching is best-effort; never fail the tool because of it
+            pass
+
     # Construct the report
     report_content = [
         f"# Project Context Report: {p.name}",
@@ -572,10 +1071,13 @@ def investigate_and_save_report(folder_path: str) -> str:
     report_content.append("## 8. Configuration & Documentation (Preview)")
     report_content.extend(other_files_summary)
 
-    final_report = "\n".join(report_content)
-
     try:
-        report_path.write_text(final_report, encoding="utf-8")
+        # Stream the lines to the file rather than joining one large string
+        with report_path.open("w", encoding="utf-8") as f:
+            for i, line in enumerate(report_content):
+                if i:
+                    f.write("\n")
+                f.write(line)
         return f"Investigation complete. Context report saved to {report_path}."
     except Exception as e:
         return f"Error investigating folder: {str(e)}"
@@ -592,27 +1094,43 @@ def read_code_file(file_path: str, start_line: int = 1, end_line: int = -1) -> s
         end_line: Ending line number (1-based, inclusive). Set to -1 for end of file.
     """
     try:
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found at {file_path}"
         if not p.is_file():
             return f"Error: Path is not a file: {file_path}"
 
-        with open(p, "r", encoding="utf-8", errors="replace") as f:
-            lines = f.readlines()
-
-        total_lines = len(lines)
-        if start_line < 1:
-            start_line = 1
-        if end_line == -1 or end_line > total_lines:
-            end_line = total_lines
-
-        if start_line > total_lines:
-            return "File has fewer lines than start_line."
-
-        selected_lines = lines[start_line - 1 : end_line]
-
-        content = "".join(selected_lines)
+        # Map the file and decode only the requested lines. Files containing
+        # \r fall back to text mode, whose universal newlines also split on it
+        with open(p, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            if buf.find(b"\r") >= 0:
+                with open(p, "r", encoding="utf-8", errors="replace") as f:
+                    lines = f.readlines()
+                total_lines = len(lines)
+            else:
+                lines = None
+                total_lines = _count_lines(buf)
+            if start_line < 1:
+                start_line = 1
+            if end_line == -1 or end_line > total_lines:
+                end_line = total_lines
+
+            if start_line > total_lines:
+                return "File has fewer lines than start_line."
+
+            if lines is not None:
+                content = "".join(lines[start_line - 1 : end_line])
+            else:
+                offsets = _line_offsets(buf, max(start_line - 1, end_line))
+                content = buf[offsets[start_line - 1] : offsets[end_line]].decode(
+                    "utf-8", errors="replace"
+                )
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
         return f"--- {file_path} (Lines {start_line}-{end_line} of {total_lines}) ---\n{content}"
     except OSError as e:
         return f"OS error reading {file_path}: {e}"
@@ -653,8 +1171,8 @@ def edit_code_file(
         dry_run: If True, only preview changes without writing file.
     """
     try:
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
 
         content = p.read_text(encoding="utf-8")
@@ -675,8 +1193,6 @@ def edit_code_file(
         new_content = content.replace(old_string, new_string)
 
         if dry_run:
-            import difflib
-
             diff = difflib.unified_diff(
                 content.splitlines(keepends=True),
                 new_content.splitlines(keepends=True),
@@ -690,12 +1206,19 @@ def edit_code_file(
             else:
                 return "Dry-run: No changes would be made (old_string already matches new_string?)."
         else:
-            p.write_text(new_content, encoding="utf-8")
+            _atomic_write_text(p, new_content)
             return "File updated successfully."
     except Exception as e:
         return f"Error editing file: {str(e)}"
 
 
+# One SEARCH/REPLACE block; markers are assumed to be on their own lines and
+# the groups capture the content between them
+_EDIT_BLOCK_RE = re.compile(
+    r"<<<<<<< SEARCH\s*\n(.*?)=======\s*\n(.*?)>>>>>>> REPLACE", re.DOTALL
+)
+
+
 @mcp.tool()
 def apply_edit_blocks(file_path: str, edits: str, dry_run: bool = False) -> str:
     """
@@ -713,47 +1236,49 @@ def apply_edit_blocks(file_path: str, edits: str, dry_run: bool = False) -> str:
         dry_run: If True, only preview changes without writing file.
     """
     try:
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
 
         content = p.read_text(encoding="utf-8")
 
-        # Regex to find blocks. We assume markers are on their own lines.
-        # Captures content between markers.
-        pattern = re.compile(
-            r"<<<<<<< SEARCH\s*\n(.*?)=======\s*\n(.*?)>>>>>>> REPLACE", re.DOTALL
-        )
-
-        changes = pattern.findall(edits)
-        if not changes:
+        blocks = list(_EDIT_BLOCK_RE.finditer(edits))
+        if not blocks:
             return "Error: No valid SEARCH/REPLACE blocks found. Ensure you use the exact format:\n<<<<<<< SEARCH\n...\n=======\n...\n>>>>>>> REPLACE"
 
         new_content = content
 
-        for i, (search_block, replace_block) in enumerate(changes, 1):
-            if search_block not in new_content:
+        # One scan per edit: the first find locates the block and a second
+        # find past it is enough to tell whether the match is ambiguous
+        for i, block in enumerate(blocks, 1):
+            search_block, replace_block = block.groups()
+            # Where the failing block sits in the edits string
+            where = f"Edit #{i} (edits[{block.start()}:{block.end()}])"
+            start = new_content.find(search_block)
+            if start < 0:
                 # Provide a snippet of the file content for debugging
                 snippet = content[:500] + ("..." if len(content) > 500 else "")
-                return f"Error applying Edit #{i}: SEARCH block not found in file. Ensure exact match including indentation and whitespace.\n\nFirst 500 characters of file:\n```\n{snippet}\n```\n\nTip: Use the read_code_file tool to see the exact content."
+                return f"Error applying {where}: SEARCH block not found in file. Ensure exact match including indentation and whitespace.\n\nFirst 500 characters of file:\n```\n{snippet}\n```\n\nTip: Use the read_code_file tool to see the exact content."
 
-            if new_content.count(search_block) > 1:
-                return f"Error applying Edit #{i}: SEARCH block matches multiple locations (count: {new_content.count(search_block)}). Include more context."
+            end = start + len(search_block)
+            # An empty block matches again one position later, as with count()
+            if new_content.find(search_block, end if search_block else 1) >= 0:
+                return f"Error applying {where}: SEARCH block matches multiple locations (count: {new_content.count(search_block)}). Include more context."
 
-            new_content = new_content.replace(search_block, replace_block, 1)
+            new_content = new_content[:start] + replace_block + new_content[end:]
 
         # Optional syntax validation for Python files
         if p.suffix == ".py":
             try:
-                ast.parse(new_content)
+                # Compiling straight to bytecode validates the same grammar
+                # without materialising Python-level AST nodes
+                compile(new_content, str(p), "exec", dont_inherit=True)
             except SyntaxError as syn_err:
                 # Provide more helpful error message
                 return f"Error applying edits: Resulting Python file has syntax error: {syn_err}. Changes were not applied."
 
         if dry_run:
             # Compute diff
-            import difflib
-
             diff = difflib.unified_diff(
                 content.splitlines(keepends=True),
                 new_content.splitlines(keepends=True),
@@ -767,13 +1292,26 @@ def apply_edit_blocks(file_path: str, edits: str, dry_run: bool = False) -> str:
             else:
                 return "Dry-run: No changes would be made (SEARCH block already matches REPLACE block?)."
         else:
-            p.write_text(new_content, encoding="utf-8")
-            return f"Successfully applied {len(changes)} edits to {p.name}."
+            _atomic_write_text(p, new_content)
+            return f"Successfully applied {len(blocks)} edits to {p.name}."
 
     except Exception as e:
         return f"Error applying edits: {str(e)}"
 
 
+# Command output returned to the client; larger output keeps its head and tail
+_COMMAND_OUTPUT_MAX_CHARS = 64 * 1024
+
+
+def _head_tail(text: str, limit: int) -> str:
+    """Shorten ``text`` to its first and last ``limit // 2`` characters."""
+    if len(text) <= limit:
+        return text
+    half = limit // 2
+    omitted = len(text) - 2 * half
+    return f"{text[:half]}\n... ({omitted} characters omitted) ...\n{text[-half:]}"
+
+
 @mcp.tool()
 def run_terminal_command(command: str) -> str:
     """
@@ -794,10 +1332,17 @@ def run_terminal_command(command: str) -> str:
             timeout=60,  # Default timeout
         )
 
-        output = (
-            f"COMMAND: {command}\n\nSTDOUT:\n{result.stdout}\nSTDERR:\n{result.stderr}"
+        stdout, stderr = result.stdout, result.stderr
+        if len(stdout) + len(stderr) > _COMMAND_OUTPUT_MAX_CHARS:
+            # Each stream gets half the budget plus whatever the other leaves
+            half = _COMMAND_OUTPUT_MAX_CHARS // 2
+            stdout, stderr = (
+                _head_tail(stdout, max(half, _COMMAND_OUTPUT_MAX_CHARS - len(stderr))),
+                _head_tail(stderr, max(half, _COMMAND_OUTPUT_MAX_CHARS - len(stdout))),
+            )
+        return "".join(
+            ("COMMAND: ", command, "\n\nSTDOUT:\n", stdout, "\nSTDERR:\n", stderr)
         )
-        return output
     except subprocess.TimeoutExpired:
         return f"Error: Command '{command}' timed out."
     except Exception as e:
@@ -839,6 +1384,7 @@ def create_file(
         with open(p, mode, encoding=encoding) as f:
             if content is not None:
                 f.write(content)
+        _forget_tree(p)
 
         action = (
             "Appended to" if append else "Created" if not p.exists() else "Overwritten"
@@ -848,6 +1394,317 @@ def create_file(
         return f"Error creating file: {str(e)}"
 
 
+_FORMATTER_COMMANDS: Dict[str, List[str]] = {
+    "black": ["black"],
+    "ruff": ["ruff", "format"],
+    "isort": ["isort"],
+    "rustfmt": ["rustfmt"],
+    "prettier": ["prettier", "--write"],
+}
+# Paths per formatter invocation; keeps command lines well below ARG_MAX.
+_FORMAT_BATCH_SIZE = 200
+
+
+def _run_formatter(
+    formatter: str, paths: List[str], options: str = "", timeout: int = 30
+) -> List[subprocess.CompletedProcess]:
+    """
+    Run ``formatter`` over ``paths`` with as few processes as possible.
+
+    Every formatter in _FORMATTER_COMMANDS accepts many paths at once, so the
+    interpreter/binary startup is paid once per batch rather than per file.
+    Raises KeyError for an unknown formatter and lets subprocess errors
+    propagate to the calling tool.
+    """
+    base = _FORMATTER_COMMANDS[formatter]
+    extra = options.split() if options else []
+    results = []
+    for start in range(0, len(paths), _FORMAT_BATCH_SIZE):
+        cmd = base + paths[start : start + _FORMAT_BATCH_SIZE] + extra
+        results.append(
+            subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        )
+    return results
+
+
+_LSP_LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
+
+# Files ruff reads its settings from, in each directory up to the workspace
+_RUFF_CONFIG_NAMES = ("pyproject.toml", "ruff.toml", ".ruff.toml")
+
+
+class _RuffServer:
+    """
+    Minimal LSP client for a long-lived ``ruff server`` process.
+
+    Formatting and fixing through the server avoids starting ruff and
+    re-reading its configuration on every call. Only files under the current working
+    directory (the server's workspace) are handled, so configuration is
+    resolved as the CLI would. The server is restarted when a configuration
+    file governing the requested path changes, since it only reads them on
+    start-up. Any protocol failure shuts the server down for the rest of
+    the session and callers fall back to the ruff CLI.
+    """
+
+    def __init__(self, timeout: float = 30.0):
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._next_id = 0
+        self._disabled = False
+        self._root = Path.cwd().resolve()
+        # (mtime_ns, size), or None when absent, of each configuration file
+        # seen since the server started
+        self._config_stamps: Dict[Path, Optional[tuple]] = {}
+
+    def format_file(self, path: Path) -> bool:
+        """Format ``path`` in place; return False if the CLI should be used."""
+        return bool(self._call(self._format, path))
+
+    def fix_file(self, path: Path) -> Optional[bool]:
+        """
+        Apply ruff's fixes to ``path`` in place.
+
+        Returns True when no diagnostics remain, False when some do and None
+        if the CLI should be used.
+        """
+        return self._call(self._fix, path)
+
+    def _call(self, action, path: Path) -> Any:
+        if self._disabled or not path.is_relative_to(self._root):
+            return None
+        with self._lock:
+            timer = threading.Timer(self._timeout, self.shutdown)
+            timer.start()
+            try:
+                stamps = self._config_stamps_for(path)
+                if self._proc is not None and any(
+                    self._config_stamps.get(config, stamp) != stamp
+                    for config, stamp in stamps.items()
+                ):
+                    self.shutdown()
+                if self._proc is None:
+                    self._start()
+                    self._config_stamps = {}
+                self._config_stamps.update(stamps)
+                return action(path)
+            except (OSError, ValueError, KeyError, TypeError):
+                self._disabled = True
+                self.shutdown()
+                return None
+            finally:
+                timer.cancel()
+
+    def shutdown(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+    def _config_stamps_for(self, path: Path) -> Dict[Path, Optional[tuple]]:
+        stamps = {}
+        directory = path.parent
+        while True:
+            for name in _RUFF_CONFIG_NAMES:
+                config = directory / name
+                try:
+                    st = config.stat()
+                    stamps[config] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    stamps[config] = None
+            if directory == self._root or directory == directory.parent:
+                return stamps
+            directory = directory.parent
+
+    def _start(self) -> None:
+        self._proc = subprocess.Popen(
+            ["ruff", "server"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        result = self._request(
+            "initialize",
+            {
+                "processId": os.getpid(),
+                "rootUri": self._root.as_uri(),
+                "workspaceFolders": [
+                    {"uri": self._root.as_uri(), "name": self._root.name}
+                ],
+                # UTF-32 positions are plain str indices
+                "capabilities": {"general": {"positionEncodings": ["utf-32"]}},
+            },
+        )
+        if result["capabilities"].get("positionEncoding") != "utf-32":
+            raise ValueError("ruff server does not support utf-32 positions")
+        self._notify("initialized", {})
+
+    def _open(self, uri: str, text: str) -> None:
+        self._notify(
+            "textDocument/didOpen",
+            {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "python",
+                    "version": 1,
+                    "text": text,
+                }
+            },
+        )
+
+    def _format(self, path: Path) -> bool:
+        text = path.read_text(encoding="utf-8")
+        uri = path.as_uri()
+        self._open(uri, text)
+        try:
+            edits = self._request(
+                "textDocument/formatting",
+                {
+                    "textDocument": {"uri": uri},
+                    "options": {"tabSize": 4, "insertSpaces": True},
+                },
+            )
+        except RuntimeError:
+            return False  # e.g. a syntax error; let the CLI report it
+        finally:
+            self._notify("textDocument/didClose", {"textDocument": {"uri": uri}})
+        if not edits:
+            # ruff answers "no edits" for unparsable files too; let the CLI
+            # report the syntax error in that case
+            try:
+                ast.parse(text)
+            except SyntaxError:
+                return False
+            return True
+        new_text = self._apply_edits(text, edits)
+        if new_text != text:
+            _atomic_write_text(path, new_text)
+        return True
+
+    def _fix(self, path: Path) -> Optional[bool]:
+        text = path.read_text(encoding="utf-8")
+        uri = path.as_uri()
+        self._open(uri, text)
+        try:
+            actions = self._request(
+                "textDocument/codeAction",
+                {
+                    "textDocument": {"uri": uri},
+                    "range": {
+                        "start": {"line": 0, "character": 0},
+                        "end": {"line": text.count("\n") + 1, "character": 0},
+                    },
+                    "context": {"diagnostics": [], "only": ["source.fixAll.ruff"]},
+                },
+            )
+            edits = []
+            for action in actions or []:
+                edit = action.get("edit") or {}
+                edits.extend(edit.get("changes", {}).get(uri, []))
+                for change in edit.get("documentChanges", []):
+                    if change.get("textDocument", {}).get("uri") == uri:
+                        edits.extend(change["edits"])
+            new_text = self._apply_edits(text, edits) if edits else text
+            if new_text != text:
+                _atomic_write_text(path, new_text)
+                self._notify(
+                    "textDocument/didChange",
+                    {
+                        "textDocument": {"uri": uri, "version": 2},
+                        "contentChanges": [{"text": new_text}],
+                    },
+                )
+            report = self._request(
+                "textDocument/diagnostic", {"textDocument": {"uri": uri}}
+            )
+        except RuntimeError:
+            return None
+        finally:
+            self._notify("textDocument/didClose", {"textDocument": {"uri": uri}})
+        return not report.get("items")
+
+    @staticmethod
+    def _apply_edits(text: str, edits: List[Dict[str, Any]]) -> str:
+        line_starts = [0] + [m.end() for m in _LSP_LINE_BREAK_RE.finditer(text)]
+
+        def offset(position: Dict[str, int]) -> int:
+            line = position["line"]
+            if line >= len(line_starts):
+                return len(text)
+            return line_starts[line] + position["character"]
+
+        # Apply from the end so earlier offsets stay valid
+        spans = sorted(
+            (
+                (offset(e["range"]["start"]), offset(e["range"]["end"]), e["newText"])
+                for e in edits
+            ),
+            reverse=True,
+        )
+        for start, end, new in spans:
+            text = text[:start] + new + text[end:]
+        return text
+
+    def _running_proc(self) -> subprocess.Popen:
+        # The watchdog timer may shut the server down mid-request
+        proc = self._proc
+        if proc is None:
+            raise OSError("ruff server is not running")
+        return proc
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode("utf-8")
+        stdin = self._running_proc().stdin
+        stdin.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        stdin.flush()
+
+    def _receive(self) -> Dict[str, Any]:
+        stdout = self._running_proc().stdout
+        length = None
+        while True:
+            header = stdout.readline()
+            if not header:
+                raise OSError("ruff server closed its output")
+            header = header.strip()
+            if not header:
+                break
+            name, _, value = header.partition(b":")
+            if name.lower() == b"content-length":
+                length = int(value)
+        if length is None:
+            raise ValueError("LSP message without Content-Length")
+        return json.loads(stdout.read(length))
+
+    def _notify(self, method: str, params: Dict[str, Any]) -> None:
+        self._send({"method": method, "params": params})
+
+    def _request(self, method: str, params: Dict[str, Any]) -> Any:
+        self._next_id += 1
+        request_id = self._next_id
+        self._send({"id": request_id, "method": method, "params": params})
+        while True:
+            message = self._receive()
+            if "method" in message:
+                if "id" in message:
+                    # Server-to-client request. Configuration takes one
+                    # (empty, i.e. default) settings object per item asked
+                    # for; registrations and the rest take null.
+                    result = None
+                    if message["method"] == "workspace/configuration":
+                        result = [{}] * len(message["params"]["items"])
+                    self._send({"id": message["id"], "result": result})
+                continue
+            if message.get("id") != request_id:
+                continue
+            if "error" in message:
+                raise RuntimeError(message["error"].get("message", "LSP error"))
+            return message.get("result")
+
+
+_RUFF_SERVER = _RuffServer()
+atexit.register(_RUFF_SERVER.shutdown)
+
+
 @mcp.tool()
 def format_code_with_black(file_path: str) -> str:
     """
@@ -857,8 +1714,8 @@ def format_code_with_black(file_path: str) -> str:
         file_path: Absolute path to the Python file to format.
     """
     try:
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found at {file_path}"
         if not p.is_file():
             return f"Error: Path is not a file: {file_path}"
@@ -866,9 +1723,7 @@ def format_code_with_black(file_path: str) -> str:
             return f"Error: Not a Python file (missing .py extension)."
 
         # Run black on the file
-        result = subprocess.run(
-            ["black", str(p)], capture_output=True, text=True, timeout=30
-        )
+        result = _run_formatter("black", [str(p)])[0]
         if result.returncode == 0:
             return f"Successfully formatted {p.name} with Black."
         else:
@@ -888,8 +1743,8 @@ def analyze_code_complexity(file_path: str) -> str:
         file_path: Absolute path to the Python file to analyze.
     """
     try:
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found at {file_path}"
         if not p.is_file():
             return f"Error: Path is not a file: {file_path}"
@@ -919,8 +1774,8 @@ def lint_python_file(file_path: str) -> str:
         file_path: Absolute path to the Python file to lint.
     """
     try:
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found at {file_path}"
         if not p.is_file():
             return f"Error: Path is not a file: {file_path}"
@@ -928,8 +1783,6 @@ def lint_python_file(file_path: str) -> str:
             return f"Error: Not a Python file (missing .py extension)."
 
         # Run flake8
-        import subprocess
-
         result = subprocess.run(
             ["flake8", str(p)], capture_output=True, text=True, timeout=30
         )
@@ -976,7 +1829,7 @@ def search_in_files_advanced(
 
 
 @mcp.tool()
-def generate_code(prompt: str, language: str = "python") -> str:
+async def generate_code(prompt: str, language: str = "python") -> str:
     """
     Generate code based on a natural language prompt using OpenAI.
 
@@ -988,16 +1841,14 @@ def generate_code(prompt: str, language: str = "python") -> str:
         Generated code or error message.
     """
     try:
-        import os
-
-        import openai
-
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
             return "Error: OPENAI_API_KEY environment variable not set."
 
-        client = openai.OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
+        # Awaited on the async client, so other tool calls are served while
+        # the completion is generated
+        client = _get_async_openai_client(api_key)
+        response = await client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {
@@ -1041,10 +1892,6 @@ def code_snippet_generate(
         Generated code snippet or error message.
     """
     try:
-        import os
-
-        import openai
-
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
             return "Error: OPENAI_API_KEY environment variable not set."
@@ -1058,7 +1905,7 @@ def code_snippet_generate(
             prompt if prompt else f"Generate a {snippet_type} snippet in {language}."
         )
 
-        client = openai.OpenAI(api_key=api_key)
+        client = _get_openai_client(api_key)
         response = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
@@ -1097,15 +1944,13 @@ def code_completion(file_path: str, prefix: str = "") -> str:
         A list of suggested identifiers.
     """
     try:
-        import ast
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
 
-        content = p.read_text(encoding="utf-8", errors="replace")
-        tree = ast.parse(content)
+        # Decode the bytes directly, as the structure analyzers do: the parser
+        # accepts \r\n, so text-mode newline translation is wasted
+        tree = ast.parse(p.read_bytes().decode("utf-8", errors="replace"))
         identifiers = set()
 
         # Collect identifiers from AST nodes
@@ -1146,12 +1991,8 @@ def code_style_check(file_path: str) -> str:
         A report of style issues (formatting, import sorting).
     """
     try:
-        import subprocess
-        import sys
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if not p.is_file():
             return f"Error: Path is not a file: {file_path}"
@@ -1236,15 +2077,8 @@ def search_and_replace(
         Summary of replacements made.
     """
     try:
-        import fnmatch
-        import os
-        import re
-        import shutil
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        from pathlib import Path
-
-        p = Path(folder_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(folder_path)
+        if not exists:
             return f"Error: Path not found: {folder_path}"
         if not p.is_dir():
             return f"Error: Path is not a directory: {folder_path}"
@@ -1255,26 +2089,27 @@ def search_and_replace(
         except re.error as e:
             return f"Invalid regex pattern: {e}"
 
-        # Collect matching files
-        matched_files = []
-        for root, dirs, files in os.walk(str(p)):
+        # Collect matching files along with their contents, so each file is
+        # read once for both the search and the replacement
+        name_matches = re.compile(fnmatch.translate(file_pattern)).match
+        contents: Dict[Path, str] = {}
+        for root, _, _, files in _walk_tree(str(p)):
+            if max_files is not None and len(contents) >= max_files:
+                break
             for f in files:
-                if not fnmatch.fnmatch(f, file_pattern):
+                if not name_matches(f):
                     continue
                 file_path = Path(root) / f
                 try:
                     content = file_path.read_text(encoding="utf-8", errors="replace")
-                    if regex.search(content):
-                        matched_files.append(file_path)
-                except UnicodeDecodeError:
-                    # Skip binary files
+                except Exception:
+                    # Unreadable files are skipped
                     continue
-                except Exception as e:
-                    # Log error but continue
-                    pass
-
-        if max_files is not None:
-            matched_files = matched_files[:max_files]
+                if regex.search(content):
+                    contents[file_path] = content
+                    if max_files is not None and len(contents) >= max_files:
+                        break
+        matched_files = list(contents)
 
         if not matched_files:
             return "No files matched the search pattern."
@@ -1284,10 +2119,11 @@ def search_and_replace(
             for file_path in matched_files:
                 lines.append(f"- `{file_path}`")
                 try:
-                    content = file_path.read_text(encoding="utf-8", errors="replace")
+                    content = contents[file_path]
                     matches = list(regex.finditer(content))
                     if matches:
                         lines.append(f"  Matches: {len(matches)}")
+                        lines_content = content.splitlines()
                         # Show up to 3 matches with surrounding lines
                         for i, match in enumerate(matches[:3]):
                             start = match.start()
@@ -1295,7 +2131,6 @@ def search_and_replace(
                             # Find line numbers
                             line_start = content[:start].count("\n") + 1
                             # Extract the line containing the match
-                            lines_content = content.splitlines()
                             line_idx = line_start - 1
                             before = max(0, line_idx - 1)
                             after = min(len(lines_content), line_idx + 2)
@@ -1314,10 +2149,10 @@ def search_and_replace(
         replaced_count = 0
         if not parallel:
             for file_path in matched_files:
-                # Read content
-                content = file_path.read_text(encoding="utf-8", errors="replace")
                 # Replace all occurrences
-                new_content, num_replacements = regex.subn(replace_pattern, content)
+                new_content, num_replacements = regex.subn(
+                    replace_pattern, contents[file_path]
+                )
                 if num_replacements == 0:
                     continue
                 # Create backup if requested
@@ -1325,18 +2160,16 @@ def search_and_replace(
                     backup_path = file_path.with_suffix(file_path.suffix + ".bak")
                     shutil.copy2(file_path, backup_path)
                 # Write new content
-                file_path.write_text(new_content, encoding="utf-8")
+                _atomic_write_text(file_path, new_content)
                 replaced_count += 1
         else:
             # Parallel processing
-            import concurrent.futures
-
             n_workers = workers if workers is not None else os.cpu_count() or 4
 
             def process_file(file_path):
-                # Read content
-                content = file_path.read_text(encoding="utf-8", errors="replace")
-                new_content, num_replacements = regex.subn(replace_pattern, content)
+                new_content, num_replacements = regex.subn(
+                    replace_pattern, contents[file_path]
+                )
                 if num_replacements == 0:
                     return (file_path, 0)
                 # Create backup if requested
@@ -1344,14 +2177,14 @@ def search_and_replace(
                     backup_path = file_path.with_suffix(file_path.suffix + ".bak")
                     shutil.copy2(file_path, backup_path)
                 # Write new content
-                file_path.write_text(new_content, encoding="utf-8")
+                _atomic_write_text(file_path, new_content)
                 return (file_path, num_replacements)
 
             with ThreadPoolExecutor(max_workers=n_workers) as executor:
                 future_to_file = {
                     executor.submit(process_file, fp): fp for fp in matched_files
                 }
-                for future in concurrent.futures.as_completed(future_to_file):
+                for future in as_completed(future_to_file):
                     try:
                         file_path, num = future.result()
                         if num > 0:
@@ -1384,82 +2217,75 @@ def batch_format(
     Args:
         directory: Path to the directory containing Python files.
         file_pattern: File pattern to match (default "*.py").
-        parallel: If True, format files in parallel using multiple workers.
-        workers: Number of worker threads (default: number of CPU cores).
+        parallel: If True, let Black format files in parallel worker processes.
+        workers: Number of Black worker processes (default: number of CPU cores).
                  Ignored if parallel is False.
 
     Returns:
         Summary of formatted files.
     """
     try:
-        import fnmatch
-        import os
-        import subprocess
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        from pathlib import Path
-        from typing import Optional
-
-        p = Path(directory).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(directory)
+        if not exists:
             return f"Error: Directory not found: {directory}"
         if not p.is_dir():
             return f"Error: Path is not a directory: {directory}"
 
-        # Collect matching files
-        files = []
-        for file in p.rglob(file_pattern):
-            if file.is_file():
-                files.append(str(file))
+        # Collect matching files (scandir walk, skipping VCS/venv/cache dirs)
+        files = [str(file) for file in _iter_matching_files(p, file_pattern)]
 
         if not files:
             return f"No files matching pattern '{file_pattern}' found."
 
-        formatted_count = 0
-        errors = []
+        # One black process per batch of files instead of one per file; black
+        # spreads a batch over its own worker processes
+        n_workers = 1
+        if parallel:
+            n_workers = workers if workers is not None else os.cpu_count() or 4
+            if n_workers < 1:
+                return "Error: workers must be at least 1."
+        try:
+            results = _run_formatter(
+                "black",
+                files,
+                f"--workers {n_workers}",
+                timeout=30 * min(len(files), _FORMAT_BATCH_SIZE),
+            )
+        except subprocess.TimeoutExpired:
+            return "Error in batch_format: Black formatting timed out."
+        except FileNotFoundError:
+            return "Error: black not installed. Please install it (pip install black)."
 
-        def format_file(file: str) -> tuple[str, bool, str]:
-            """Returns (file, success, error_message)"""
-            try:
-                result = subprocess.run(
-                    ["black", file],
-                    capture_output=True,
-                    text=True,
-                    timeout=30,
+        # black reports each failure as "error: cannot format <path>: ..." or
+        # "error: cannot parse: <path>:<line>:<col>: ..."; a nonzero exit
+        # without such lines (bad option, crash) means the whole batch failed
+        errors = []
+        failed_count = 0
+        for start, result in zip(range(0, len(files), _FORMAT_BATCH_SIZE), results):
+            file_errors = [
+                line[len("error: ") :]
+                for line in result.stderr.splitlines()
+                if line.startswith("error: cannot ")
+            ]
+            if result.returncode != 0 and not file_errors:
+                batch = files[start : start + _FORMAT_BATCH_SIZE]
+                failed_count += len(batch)
+                # The last stderr line carries the usage error or exception
+                stderr_lines = result.stderr.strip().splitlines()
+                message = (
+                    stderr_lines[-1]
+                    if stderr_lines
+                    else f"exit code {result.returncode}"
                 )
-                if result.returncode == 0:
-                    return (file, True, "")
-                else:
-                    return (file, False, result.stderr)
-            except subprocess.TimeoutExpired:
-                return (file, False, "Black formatting timed out.")
-            except Exception as e:
-                return (file, False, str(e))
-
-        if not parallel or len(files) == 1:
-            # Sequential processing
-            for file_path in files:
-                _, success, err_msg = format_file(file_path)
-                if success:
-                    formatted_count += 1
-                else:
-                    errors.append(f"{file_path}: {err_msg}")
-        else:
-            # Parallel processing
-            n_workers = workers if workers is not None else os.cpu_count() or 4
-            with ThreadPoolExecutor(max_workers=n_workers) as executor:
-                future_to_file = {executor.submit(format_file, f): f for f in files}
-                for future in as_completed(future_to_file):
-                    file_path, success, err_msg = future.result()
-                    if success:
-                        formatted_count += 1
-                    else:
-                        errors.append(f"{file_path}: {err_msg}")
+                errors.append(f"black failed on {len(batch)} files: {message}")
+            else:
+                failed_count += len(file_errors)
+                errors.extend(file_errors)
+        formatted_count = len(files) - failed_count
 
         summary_lines = [f"Formatted {formatted_count} out of {len(files)} files."]
         if parallel:
-            summary_lines.append(
-                f"Parallel execution with {n_workers if 'n_workers' in locals() else 'default'} workers."
-            )
+            summary_lines.append(f"Parallel execution with {n_workers} workers.")
         if errors:
             summary_lines.append("\nErrors:")
             for err in errors[:5]:  # limit error output
@@ -1471,22 +2297,169 @@ def batch_format(
         return f"Error in batch_format: {str(e)}"
 
 
+class _GitCatFile:
+    """
+    Long-lived ``git cat-file --batch`` process for one repository.
+
+    Reading blobs through it avoids starting git for each lookup. cat-file
+    loads the index once, so the process is restarted whenever the index
+    file changes; any protocol failure just makes lookups return None.
+    """
+
+    def __init__(self, repo: Path, index: Path):
+        self._repo = repo
+        self._index = index
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._stamp: Optional[tuple] = None
+        # Staged modes looked up since the index last changed
+        self._modes: Dict[str, Optional[str]] = {}
+        self._modes_stamp: Optional[tuple] = None
+
+    def _index_stamp(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self._index)
+        except OSError:
+            return None
+        # git replaces the index by renaming a lock file over it, so the
+        # inode changes even when mtime granularity hides a write
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def staged_mode(self, rel: str) -> Optional[str]:
+        """The index mode of ``rel`` (e.g. "100644"), or None if not staged."""
+        with self._lock:
+            stamp = self._index_stamp()
+            if stamp != self._modes_stamp:
+                self._modes, self._modes_stamp = {}, stamp
+            if rel not in self._modes:
+                result = subprocess.run(
+                    ["git", "-C", str(self._repo), "ls-files", "-s", "-z", "--", rel],
+                    capture_output=True,
+                )
+                entries = result.stdout.split(b"\0")
+                # "<mode> <sha> <stage>\t<path>"; several stages mean a conflict
+                self._modes[rel] = (
+                    entries[0].split(b" ", 1)[0].decode("ascii")
+                    if result.returncode == 0 and len(entries) == 2
+                    else None
+                )
+            return self._modes[rel]
+
+    def read_blob(self, spec: str) -> Optional[bytes]:
+        """Return the blob named by ``spec``, or None if it is not a blob."""
+        if "\n" in spec:
+            return None
+        with self._lock:
+            stamp = self._index_stamp()
+            try:
+                if self._proc is None or stamp != self._stamp:
+                    self.shutdown()
+                    self._proc = subprocess.Popen(
+                        ["git", "-C", str(self._repo), "cat-file", "--batch"],
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.DEVNULL,
+                    )
+                    self._stamp = stamp
+                proc = self._proc
+                proc.stdin.write(spec.encode("utf-8") + b"\n")
+                proc.stdin.flush()
+                # "<sha> <type> <size>" followed by the content and a newline,
+                # or "<spec> missing" / "<spec> ambiguous"
+                header = proc.stdout.readline()
+                if not header:
+                    raise OSError("git cat-file exited")
+                fields = header.rsplit(None, 2)
+                if len(fields) != 3 or not fields[2].isdigit():
+                    return None
+                data = proc.stdout.read(int(fields[2]) + 1)[:-1]
+                return data if fields[1] == b"blob" else None
+            except (OSError, ValueError):
+                self.shutdown()
+                return None
+
+    def shutdown(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+# cat-file workers keyed by resolved repository path; None marks a path
+# that is not inside a git work tree
+_GIT_CAT_FILES: Dict[Path, Optional[_GitCatFile]] = {}
+_GIT_CAT_FILES_LOCK = threading.Lock()
+
+
+def _git_cat_file(repo_path: str) -> Optional[_GitCatFile]:
+    repo = Path(repo_path).resolve()
+    with _GIT_CAT_FILES_LOCK:
+        if repo not in _GIT_CAT_FILES:
+            result = subprocess.run(
+                ["git", "-C", str(repo), "rev-parse", "--git-path", "index"],
+                capture_output=True,
+                text=True,
+            )
+            _GIT_CAT_FILES[repo] = (
+                _GitCatFile(repo, repo / result.stdout.strip())
+                if result.returncode == 0 and result.stdout.strip()
+                else None
+            )
+        return _GIT_CAT_FILES[repo]
+
+
+@atexit.register
+def _shutdown_git_cat_files() -> None:
+    for worker in _GIT_CAT_FILES.values():
+        if worker is not None:
+            worker.shutdown()
+
+
+def _unchanged_in_index(repo_path: str, file_path: str) -> bool:
+    """
+    True when ``file_path`` is a plain file whose bytes and mode equal its
+    index entry.
+
+    The mode comes from ``git ls-files -s`` since cat-file cannot show it;
+    any mismatch leaves the decision to ``git diff``.
+    """
+    repo = Path(repo_path).resolve()
+    path = repo / file_path
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if not stat.S_ISREG(st.st_mode):
+        return False
+    worker = _git_cat_file(repo_path)
+    if worker is None:
+        return False
+    rel = Path(os.path.relpath(path, repo)).as_posix()
+    mode = "100755" if st.st_mode & stat.S_IXUSR else "100644"
+    if worker.staged_mode(rel) != mode:
+        return False
+    blob = worker.read_blob(f":./{rel}")
+    return blob is not None and len(blob) == st.st_size and blob == path.read_bytes()
+
+
 @mcp.tool()
-def git_status(repo_path: str = ".") -> str:
+def git_status(repo_path: str = ".", include_submodules: bool = False) -> str:
     """
     Show git status of a repository.
 
+    Submodules are not inspected unless requested, which skips walking their
+    work trees. Optional locks are not taken, so the index refresh never
+    contends with a concurrent git process.
+
     Args:
         repo_path: Path to the git repository (default current directory).
+        include_submodules: If True, also report changes inside submodules.
     """
     try:
-        import subprocess
-
-        result = subprocess.run(
-            ["git", "-C", repo_path, "status", "--short"],
-            capture_output=True,
-            text=True,
-        )
+        cmd = ["git", "--no-optional-locks", "-C", repo_path, "status", "--short"]
+        if not include_submodules:
+            cmd.append("--ignore-submodules=all")
+        result = subprocess.run(cmd, capture_output=True, text=True)
         if result.returncode != 0:
             return f"Error running git status: {result.stderr}"
         return result.stdout if result.stdout else "No changes."
@@ -1495,18 +2468,29 @@ def git_status(repo_path: str = ".") -> str:
 
 
 @mcp.tool()
-def git_diff(repo_path: str = ".", file_path: Optional[str] = None) -> str:
+def git_diff(
+    repo_path: str = ".",
+    file_path: Optional[str] = None,
+    include_submodules: bool = False,
+) -> str:
     """
     Show git diff of a repository or specific file.
 
+    Submodules are skipped unless requested, as in git_status.
+
     Args:
         repo_path: Path to the git repository.
         file_path: Optional specific file to diff.
+        include_submodules: If True, also diff submodule changes.
     """
     try:
-        import subprocess
-
-        cmd = ["git", "-C", repo_path, "diff"]
+        # A file identical to its index entry has no diff; checking that
+        # through the long-lived cat-file worker skips starting git diff
+        if file_path and _unchanged_in_index(repo_path, file_path):
+            return "No differences."
+        cmd = ["git", "--no-optional-locks", "-C", repo_path, "diff"]
+        if not include_submodules:
+            cmd.append("--ignore-submodules=all")
         if file_path:
             cmd.append(file_path)
         result = subprocess.run(cmd, capture_output=True, text=True)
@@ -1528,8 +2512,6 @@ def git_commit(repo_path: str = ".", message: str = "", files: List[str] = []) -
         files: List of files to commit (empty for all changes).
     """
     try:
-        import subprocess
-
         if not message:
             return "Error: commit message is required."
         cmd = ["git", "-C", repo_path, "commit", "-m", message]
@@ -1548,27 +2530,76 @@ def git_commit(repo_path: str = ".", message: str = "", files: List[str] = []) -
 @mcp.tool()
 def git_log(repo_path: str = ".", count: int = 10) -> str:
     """
-    Show git log.
+    Show git log as a table of abbreviated hash, date, author and subject.
 
     Args:
         repo_path: Path to the git repository.
         count: Number of commits to show.
     """
     try:
-        import subprocess
-
+        # NUL-terminated records with unit-separated fields, so subjects
+        # containing any printable text split unambiguously
         result = subprocess.run(
-            ["git", "-C", repo_path, "log", f"-{count}", "--oneline"],
+            [
+                "git",
+                "-C",
+                repo_path,
+                "log",
+                f"-{count}",
+                "-z",
+                "--date=short",
+                "--pretty=format:%h%x1f%ad%x1f%an%x1f%s",
+            ],
             capture_output=True,
             text=True,
         )
         if result.returncode != 0:
             return f"Error running git log: {result.stderr}"
-        return result.stdout if result.stdout else "No commits."
+        if not result.stdout:
+            return "No commits."
+        lines = ["| Commit | Date | Author | Subject |", "|---|---|---|---|"]
+        for record in result.stdout.split("\0"):
+            fields = record.replace("|", "\\|").split("\x1f")
+            if len(fields) == 4:
+                lines.append("| " + " | ".join(fields) + " |")
+        return "\n".join(lines)
     except Exception as e:
         return f"Error: {str(e)}"
 
 
+# mypy and pylint run in-process when importable, saving an interpreter
+# start per call. Neither is safe to run concurrently in one interpreter.
+_LINT_API_LOCK = threading.Lock()
+# mtime_ns of the source behind each module in astroid's cache, taken when
+# pylint parsed it; astroid itself never notices a file changing
+_ASTROID_MTIMES: Dict[str, Optional[int]] = {}
+
+
+def _source_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _evict_stale_astroid_modules(manager: Any) -> None:
+    """Drop cached astroid modules whose source changed since pylint parsed it."""
+    for name, module in list(manager.astroid_cache.items()):
+        path = getattr(module, "file", None)
+        if not path:
+            continue
+        if path not in _ASTROID_MTIMES or _ASTROID_MTIMES[path] != _source_mtime(path):
+            del manager.astroid_cache[name]
+            _ASTROID_MTIMES.pop(path, None)
+
+
+def _record_astroid_modules(manager: Any) -> None:
+    for module in manager.astroid_cache.values():
+        path = getattr(module, "file", None)
+        if path and path not in _ASTROID_MTIMES:
+            _ASTROID_MTIMES[path] = _source_mtime(path)
+
+
 @mcp.tool()
 def type_check_with_mypy(file_path: str) -> str:
     """
@@ -1578,17 +2609,22 @@ def type_check_with_mypy(file_path: str) -> str:
         file_path: Path to the Python file.
     """
     try:
-        import subprocess
-
-        result = subprocess.run(
-            ["mypy", file_path],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode == 0:
+        try:
+            from mypy import api as mypy_api
+        except ImportError:
+            result = subprocess.run(
+                ["mypy", file_path],
+                capture_output=True,
+                text=True,
+            )
+            stdout, stderr, status = result.stdout, result.stderr, result.returncode
+        else:
+            with _LINT_API_LOCK:
+                stdout, stderr, status = mypy_api.run([file_path])
+        if status == 0:
             return "No type errors found."
         else:
-            return f"Type checking results:\n{result.stdout}\n{result.stderr}"
+            return f"Type checking results:\n{stdout}\n{stderr}"
     except FileNotFoundError:
         return "Error: mypy not installed. Install with 'pip install mypy'."
     except Exception as e:
@@ -1604,15 +2640,26 @@ def lint_with_pylint(file_path: str) -> str:
         file_path: Path to the Python file.
     """
     try:
-        import subprocess
-
-        result = subprocess.run(
-            ["pylint", file_path],
-            capture_output=True,
-            text=True,
-        )
-        # pylint returns non-zero when there are issues, which is fine
-        return result.stdout if result.stdout else "No output from pylint."
+        try:
+            import astroid
+            from pylint.lint import Run
+            from pylint.reporters.text import TextReporter
+        except ImportError:
+            result = subprocess.run(
+                ["pylint", file_path],
+                capture_output=True,
+                text=True,
+            )
+            output = result.stdout
+        else:
+            buf = io.StringIO()
+            with _LINT_API_LOCK:
+                _evict_stale_astroid_modules(astroid.MANAGER)
+                Run([file_path], reporter=TextReporter(buf), exit=False)
+                _record_astroid_modules(astroid.MANAGER)
+            output = buf.getvalue()
+        # pylint reports non-zero status when there are issues, which is fine
+        return output if output else "No output from pylint."
     except FileNotFoundError:
         return "Error: pylint not installed. Install with 'pip install pylint'."
     except Exception as e:
@@ -1633,8 +2680,6 @@ def ai_suggest_code(prompt: str, code: str = "", language: str = "python") -> st
         Suggested code or explanation.
     """
     try:
-        import openai
-
         # Prepare messages
         messages = []
         if code:
@@ -1647,8 +2692,9 @@ def ai_suggest_code(prompt: str, code: str = "", language: str = "python") -> st
         else:
             messages.append({"role": "user", "content": prompt})
 
-        # Call OpenAI API
-        response = openai.chat.completions.create(
+        # Call OpenAI API through the client shared with the other AI tools
+        client = _get_openai_client(os.environ.get("OPENAI_API_KEY"))
+        response = client.chat.completions.create(
             model="gpt-4-turbo-preview",
             messages=messages,  # type: ignore
             temperature=0.7,
@@ -1660,22 +2706,95 @@ def ai_suggest_code(prompt: str, code: str = "", language: str = "python") -> st
         return f"Error generating AI suggestion: {str(e)}"
 
 
+@functools.lru_cache(maxsize=64)
+def _load_pyproject_cached(path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def _load_pyproject(path: Path) -> Dict[str, Any]:
+    """
+    Parsed pyproject.toml, memoized per (mtime_ns, size) so edits invalidate it.
+
+    The returned dict is shared between callers and must not be mutated.
+    Without a TOML parser (Python < 3.11 and no tomli) it is empty, as if
+    the file had no configuration.
+    """
+    if tomllib is None:
+        return {}
+    st = path.stat()
+    return _load_pyproject_cached(str(path), st.st_mtime_ns, st.st_size)
+
+
+# pip's outdated-package report queries the package index and takes seconds;
+# it is cached per pip executable for this long (seconds)
+_PIP_OUTDATED_TTL = 600
+
+
+async def _pip_outdated_json() -> Optional[str]:
+    """
+    ``pip list --outdated --format=json`` output, or None if pip failed.
+
+    Successful reports are kept in the disk cache for _PIP_OUTDATED_TTL
+    seconds. The key includes the mtime of each site-packages directory, so
+    installing or removing a package starts a fresh report.
+    """
+    pip = shutil.which("pip") or "pip"
+    key_parts = [pip]
+    site_dirs = site.getsitepackages()
+    if site.ENABLE_USER_SITE:
+        site_dirs.append(site.getusersitepackages())
+    for site_dir in site_dirs:
+        try:
+            key_parts.append(f"{site_dir}:{os.stat(site_dir).st_mtime_ns}")
+        except OSError:
+            continue
+    key = hashlib.blake2b(
+        "\0".join(key_parts).encode("utf-8"), digest_size=16
+    ).hexdigest()
+    cached = _get_cached_ai_result("pip_outdated", key, max_age=_PIP_OUTDATED_TTL)
+    if cached is not None:
+        return cached
+    proc = await asyncio.create_subprocess_exec(
+        pip,
+        "--disable-pip-version-check",
+        "list",
+        "--outdated",
+        "--format=json",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=60)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise TimeoutError("pip list timed out after 60 seconds")
+    if proc.returncode != 0:
+        return None
+    result = stdout.decode("utf-8", errors="replace")
+    _store_cached_ai_result("pip_outdated", key, result)
+    return result
+
+
 @mcp.tool()
-def analyze_dependencies(project_path: str = ".") -> str:
+async def analyze_dependencies(project_path: str = ".") -> str:
     """
     Analyze Python dependencies in a project.
 
+    The outdated-package check (``pip list --outdated``, which queries the
+    package index) runs as an asyncio subprocess, and is skipped when the
+    project has no dependency files. Its result is reused for
+    _PIP_OUTDATED_TTL seconds.
+
     Args:
         project_path: Path to the project root (default current directory).
 
     Returns:
         Markdown report of dependencies and their status.
     """
-    import subprocess
-    from pathlib import Path
-
-    p = Path(project_path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(project_path)
+    if not exists:
         return f"Error: Path not found: {project_path}"
 
     # Look for dependency files
@@ -1689,46 +2808,40 @@ def analyze_dependencies(project_path: str = ".") -> str:
     if requirements_file.exists():
         has_deps = True
         content = requirements_file.read_text(encoding="utf-8", errors="replace")
-        lines = [line.strip() for line in content.splitlines() if line.strip()]
         report.append("### requirements.txt")
-        for line in lines:
-            report.append(f"- `{line}`")
+        report.extend(
+            f"- `{line}`" for line in map(str.strip, content.splitlines()) if line
+        )
 
     # Read pyproject.toml (simple extraction)
     if pyproject_file.exists():
         has_deps = True
-        import tomli
-
         try:
-            data = tomli.loads(pyproject_file.read_text(encoding="utf-8"))
+            data = _load_pyproject(pyproject_file)
             deps = data.get("tool", {}).get("poetry", {}).get("dependencies", {})
             if deps:
                 report.append("### pyproject.toml (Poetry dependencies)")
-                for name, spec in deps.items():
-                    if isinstance(spec, str):
-                        report.append(f"- `{name} = {spec}`")
-                    else:
-                        report.append(f"- `{name} = {spec.get('version', '?')}`")
+                report.extend(
+                    f"- `{name} = {spec if isinstance(spec, str) else spec.get('version', '?')}`"
+                    for name, spec in deps.items()
+                )
         except Exception as e:
             report.append(f"Note: Could not parse pyproject.toml: {e}")
 
+    if not has_deps:
+        return "No dependency files found (requirements.txt, pyproject.toml, Pipfile)."
+
     # Check outdated packages (optional)
     try:
-        result = subprocess.run(
-            ["pip", "list", "--outdated", "--format=json"],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode == 0:
-            import json
-
-            outdated = json.loads(result.stdout)
+        stdout = await _pip_outdated_json()
+        if stdout is not None:
+            outdated = json.loads(stdout)
             if outdated:
                 report.append("### Outdated Packages")
-                for pkg in outdated:
-                    report.append(
-                        f"- `{pkg['name']}`: {pkg['version']} -> {pkg['latest_version']}"
-                    )
+                report.extend(
+                    f"- `{pkg['name']}`: {pkg['version']} -> {pkg['latest_version']}"
+                    for pkg in outdated
+                )
             else:
                 report.append("### All packages are up‑to‑date.")
         else:
@@ -1736,9 +2849,6 @@ def analyze_dependencies(project_path: str = ".") -> str:
     except Exception as e:
         report.append(f"### Outdated check failed: {e}")
 
-    if not has_deps:
-        return "No dependency files found (requirements.txt, pyproject.toml, Pipfile)."
-
     return "\n".join(report)
 
 
@@ -1759,25 +2869,22 @@ def refactor_rename(
         Success message or error description.
     """
     try:
-        import ast
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
 
-        content = p.read_text(encoding="utf-8")
-        tree = ast.parse(content, filename=str(p))
+        content, tree = _get_tree(p)
 
-        # Find nodes to rename
+        # Find nodes to rename, by line; the source is then edited at their
+        # spans so comments and formatting are kept
+        spans: Dict[int, List[tuple[int, int]]] = defaultdict(list)
         renamed = 0
         for node in ast.walk(tree):
             if isinstance(node, ast.Name) and node.id == old_name:
                 # If line_number is given, check node location
-                if line_number is not None:
-                    if hasattr(node, "lineno") and node.lineno != line_number:
-                        continue
-                node.id = new_name
+                if line_number is not None and node.lineno != line_number:
+                    continue
+                spans[node.lineno].append((node.col_offset, node.end_col_offset))
                 renamed += 1
 
         if renamed == 0:
@@ -1785,13 +2892,17 @@ def refactor_rename(
                 f" at line {line_number}." if line_number else "."
             )
 
-        # Convert back to source
-        try:
-            new_content = ast.unparse(tree)
-        except AttributeError:
-            return "Error: ast.unparse not available (requires Python 3.9+)."
-
-        p.write_text(new_content, encoding="utf-8")
+        # AST column offsets count UTF-8 bytes; splice right to left so the
+        # earlier offsets on a line stay valid
+        replacement = new_name.encode("utf-8")
+        lines = content.split("\n")
+        for lineno, cols in spans.items():
+            line = lines[lineno - 1].encode("utf-8")
+            for start, end in sorted(cols, reverse=True):
+                line = line[:start] + replacement + line[end:]
+            lines[lineno - 1] = line.decode("utf-8")
+
+        _atomic_write_text(p, "\n".join(lines))
         return f"Renamed {renamed} occurrence(s) of '{old_name}' to '{new_name}'."
     except Exception as e:
         return f"Error during rename: {str(e)}"
@@ -1812,10 +2923,8 @@ def debug_insert_breakpoint(
         Success message or error description.
     """
     try:
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
 
         lines = p.read_text(encoding="utf-8").splitlines()
@@ -1832,50 +2941,114 @@ def debug_insert_breakpoint(
         lines.insert(line_number - 1, bp_line)
         new_content = "\n".join(lines)
         p.write_text(new_content, encoding="utf-8")
+        _forget_tree(p)
         return f"Inserted breakpoint at line {line_number}."
     except Exception as e:
         return f"Error inserting breakpoint: {str(e)}"
 
 
+class _ProfileTimeout(BaseException):
+    """
+    Raised by the SIGALRM handler when an in-process profile run overruns.
+
+    A BaseException, so ``except Exception`` in the profiled script cannot
+    swallow it.
+    """
+
+
+def _raise_profile_timeout(signum, frame):
+    raise _ProfileTimeout()
+
+
 @mcp.tool()
-def profile_python_file(file_path: str, sort_by: str = "time") -> str:
+def profile_python_file(
+    file_path: str, sort_by: str = "time", isolate: bool = False
+) -> str:
     """
     Profile a Python script using cProfile and return a summary.
 
+    The script runs inside the server process, which avoids starting a second
+    interpreter but lets it change module-level state the server shares.
+    The 30 second limit relies on SIGALRM, so when that is unavailable (off
+    the main thread, or on Windows) the script runs isolated instead.
+
     Args:
         file_path: Absolute path to the Python script.
         sort_by: Sorting criterion for profiling output (e.g., "time", "calls", "cumulative").
+        isolate: If True, run the script in a separate ``python -m cProfile``
+            process instead, for scripts that should not touch the server.
 
     Returns:
         Profiling report as a string.
     """
     try:
-        import subprocess
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
 
-        # Run cProfile
-        cmd = ["python", "-m", "cProfile", "-s", sort_by, str(p)]
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30,  # seconds
+        # SIGALRM only works on POSIX and from the main thread
+        use_alarm = (
+            hasattr(signal, "SIGALRM")
+            and threading.current_thread() is threading.main_thread()
         )
-        if result.returncode != 0:
-            return f"Error running profiler: {result.stderr}"
+        if isolate or not use_alarm:
+            try:
+                result = subprocess.run(
+                    [sys.executable, "-m", "cProfile", "-s", sort_by, str(p)],
+                    capture_output=True,
+                    text=True,
+                    timeout=30,
+                )
+            except subprocess.TimeoutExpired:
+                return "Error: Profiling timed out after 30 seconds."
+            if result.returncode != 0:
+                return f"Error running profiler: script exited with {result.returncode}\n{result.stdout}{result.stderr}"
+            output = result.stdout + result.stderr
+            if len(output) > 2000:
+                output = output[:2000] + "\n... (output truncated)"
+            return f"## Profiling Report for {p.name}\n\n```\n{output}\n```"
+
+        # Run cProfile in-process: no fork/exec or second interpreter start-up
+        code = compile(p.read_bytes(), str(p), "exec")
+        script_globals = {
+            "__name__": "__main__",
+            "__file__": str(p),
+            "__builtins__": builtins,
+        }
+        profiler = cProfile.Profile()
+        # Capture the script's own output so it cannot corrupt the stdio transport
+        script_output = io.StringIO()
+        saved_argv, saved_path = sys.argv, sys.path[:]
+        sys.argv = [str(p)]
+        sys.path.insert(0, str(p.parent))
+        previous_handler = signal.signal(signal.SIGALRM, _raise_profile_timeout)
+        signal.alarm(30)  # seconds
+        try:
+            with contextlib.redirect_stdout(script_output), contextlib.redirect_stderr(
+                script_output
+            ):
+                profiler.runctx(code, script_globals, script_globals)
+        except SystemExit as exc:
+            if exc.code not in (None, 0):
+                return f"Error running profiler: script exited with {exc.code}\n{script_output.getvalue()}"
+        except _ProfileTimeout:
+            return "Error: Profiling timed out after 30 seconds."
+        except Exception:
+            return f"Error running profiler: {traceback.format_exc()}"
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, previous_handler)
+            sys.argv, sys.path[:] = saved_argv, saved_path
+
+        stats_output = io.StringIO()
+        pstats.Stats(profiler, stream=stats_output).sort_stats(sort_by).print_stats(50)
 
         # Limit output length
-        output = result.stdout
+        output = script_output.getvalue() + stats_output.getvalue()
         if len(output) > 2000:
             output = output[:2000] + "\n... (output truncated)"
 
         return f"## Profiling Report for {p.name}\n\n```\n{output}\n```"
-    except subprocess.TimeoutExpired:
-        return "Error: Profiling timed out after 30 seconds."
     except Exception as e:
         return f"Error during profiling: {str(e)}"
 
@@ -1896,30 +3069,28 @@ def detect_code_smells(
         Markdown report listing functions that exceed thresholds.
     """
     try:
-        from radon.complexity import cc_visit
         from radon.raw import analyze
     except ImportError:
         return "Error: radon library not installed. Install with 'pip install radon'."
 
-    from pathlib import Path
-
-    p = Path(file_path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(file_path)
+    if not exists:
         return f"Error: File not found: {file_path}"
     if p.suffix != ".py":
         return "Error: Only Python files are supported."
 
-    content = p.read_text(encoding="utf-8")
+    content = _get_tree(p)[0]
     # Raw metrics
     raw = analyze(content)
-    # Cyclomatic complexity
-    blocks = cc_visit(content)
+    # Cyclomatic complexity (memoized until the file changes)
+    blocks = _cc_blocks(p)
 
-    report = []
-    report.append(f"# Code Smell Analysis for {p.name}")
-    report.append(f"Cyclomatic complexity threshold: {cc_threshold}")
-    report.append(f"Lines of code threshold: {loc_threshold}")
-    report.append("")
+    report = [
+        f"# Code Smell Analysis for {p.name}",
+        f"Cyclomatic complexity threshold: {cc_threshold}",
+        f"Lines of code threshold: {loc_threshold}",
+        "",
+    ]
 
     smells = []
     for block in blocks:
@@ -1933,11 +3104,14 @@ def detect_code_smells(
     if not smells:
         report.append("✅ No code smells detected.")
     else:
-        report.append("## Potential Code Smells")
-        report.append("| Function | Value | Issue |")
-        report.append("|----------|-------|-------|")
-        for name, value, issue in smells:
-            report.append(f"| {name} | {value} | {issue} |")
+        report += [
+            "## Potential Code Smells",
+            "| Function | Value | Issue |",
+            "|----------|-------|-------|",
+        ]
+        report.extend(
+            f"| {name} | {value} | {issue} |" for name, value, issue in smells
+        )
 
     return "\n".join(report)
 
@@ -1954,44 +3128,27 @@ def find_unused_imports(file_path: str) -> str:
         Markdown list of unused imports or success message.
     """
     try:
-        import ast
-        import builtins
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
 
-        content = p.read_text(encoding="utf-8")
-        tree = ast.parse(content)
+        content, tree = _get_tree(p)
+        scan = _scan_tree(tree)
 
         # Collect imported names
         imported_names = set()
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
+        for node in scan["import_nodes"]:
+            if isinstance(node, ast.Import) or node.module:
+                # For 'from module import x', we track x, not module
                 for alias in node.names:
                     imported_names.add(alias.name)
                     if alias.asname:
                         imported_names.add(alias.asname)
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    # For 'from module import x', we track x, not module
-                    for alias in node.names:
-                        imported_names.add(alias.name)
-                        if alias.asname:
-                            imported_names.add(alias.asname)
-
-        # Collect all names used in the code (excluding imports)
-        used_names = set()
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-                used_names.add(node.id)
 
-        # Remove builtins and special names
-        builtin_names = set(dir(builtins))
-        used_names -= builtin_names
+        # Names used in the code (excluding imports), minus builtins
+        used_names = scan["used_names"] - _BUILTIN_NAMES
 
         # Find unused imports
         unused = imported_names - used_names
@@ -2000,8 +3157,7 @@ def find_unused_imports(file_path: str) -> str:
 
         # Format output
         lines = ["## Unused Imports", ""]
-        for name in sorted(unused):
-            lines.append(f"- `{name}`")
+        lines.extend(f"- `{name}`" for name in sorted(unused))
         return "\n".join(lines)
     except SyntaxError as e:
         return f"Syntax error in file: {e}"
@@ -2009,6 +3165,27 @@ def find_unused_imports(file_path: str) -> str:
         return f"Error analyzing imports: {str(e)}"
 
 
+def _cut_statement(lines: List[bytes], node: ast.stmt) -> None:
+    """
+    Remove a statement from source ``lines`` (UTF-8, without newlines).
+
+    Lines the statement occupies alone are deleted together with any trailing
+    comment; a statement sharing a line with others loses its own span and
+    the adjoining semicolon.
+    """
+    first, last = node.lineno - 1, (node.end_lineno or node.lineno) - 1
+    prefix = lines[first][: node.col_offset]
+    suffix = lines[last][node.end_col_offset :]
+    if suffix.lstrip().startswith(b";"):
+        suffix = suffix.lstrip()[1:].lstrip()
+    elif prefix.rstrip().endswith(b";"):
+        prefix = prefix.rstrip()[:-1]
+    if not prefix.strip() and (not suffix.strip() or suffix.lstrip().startswith(b"#")):
+        del lines[first : last + 1]
+    else:
+        lines[first : last + 1] = [prefix + suffix]
+
+
 @mcp.tool()
 def remove_unused_imports(file_path: str) -> str:
     """
@@ -2021,71 +3198,51 @@ def remove_unused_imports(file_path: str) -> str:
         Summary of removed imports or success message.
     """
     try:
-        import ast
-        import builtins
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
 
-        content = p.read_text(encoding="utf-8")
-        tree = ast.parse(content)
+        content, tree = _get_tree(p)
 
-        # Map each import node to its imported names
-        import_info = []  # list of (node, names list)
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                names = [alias.name for alias in node.names]
-                import_info.append((node, names))
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    names = [alias.name for alias in node.names]
-                    import_info.append((node, names))  # type: ignore
-                else:
-                    # from . import something
-                    import_info.append((node, []))  # type: ignore
+        scan = _scan_tree(tree)
 
         # Collect used names
-        used_names = set()
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-                used_names.add(node.id)
-        used_names -= set(dir(builtins))
+        used_names = scan["used_names"] - _BUILTIN_NAMES
 
-        # Determine which import nodes to keep
+        # Top-level imports none of whose bound names are used; relative
+        # "from . import x" statements are left alone
+        top_level = {id(node) for node in tree.body}
+        removed_nodes = []
         removed_names = []
-        kept_nodes = []
-        for node, names in import_info:
+        for node in scan["import_nodes"]:
+            if id(node) not in top_level:
+                continue
+            if isinstance(node, ast.ImportFrom) and not node.module:
+                continue
+            bound = (
+                alias.asname or alias.name.split(".", 1)[0] for alias in node.names
+            )
             # if any name is used, keep the whole import node
-            if any(name in used_names for name in names):
-                kept_nodes.append(node)
-            else:
-                removed_names.extend(names)
+            if not any(name in used_names for name in bound):
+                removed_nodes.append(node)
+                removed_names.extend(alias.name for alias in node.names)
 
         if not removed_names:
             return "No unused imports found."
 
-        # Create new module body filtering out removed nodes (top‑level only)
-        new_body = []
-        for item in tree.body:
-            remove = False
-            for node, names in import_info:
-                if item is node and not any(name in used_names for name in names):
-                    remove = True
-                    break
-            if not remove:
-                new_body.append(item)
-
-        new_tree = ast.Module(body=new_body, type_ignores=[])
-        new_content = ast.unparse(new_tree)
-        p.write_text(new_content)
+        # Cut the statements out of the original text, last first so earlier
+        # positions stay valid, keeping comments and formatting elsewhere
+        source = [line.encode("utf-8") for line in content.split("\n")]
+        for node in sorted(
+            removed_nodes, key=lambda n: (n.lineno, n.col_offset), reverse=True
+        ):
+            _cut_statement(source, node)
+        _atomic_write_text(p, b"\n".join(source).decode("utf-8"))
 
         lines = ["## Removed Unused Imports", ""]
-        for name in sorted(set(removed_names)):
-            lines.append(f"- `{name}`")
+        lines.extend(f"- `{name}`" for name in sorted(set(removed_names)))
         lines.append(f"\nFile updated successfully.")
         return "\n".join(lines)
     except SyntaxError as e:
@@ -2106,66 +3263,26 @@ def suggest_imports(file_path: str) -> str:
         Markdown list of suggested imports or success message.
     """
     try:
-        import ast
-        import importlib.util
-        import sys
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
 
-        content = p.read_text(encoding="utf-8")
-        tree = ast.parse(content)
-
-        # Collect all names used in the code
-        used_names = set()
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-                used_names.add(node.id)
-
-        # Remove builtins
-        import builtins
+        content, tree = _get_tree(p)
 
-        builtin_names = set(dir(builtins))
-        used_names -= builtin_names
+        # Collect used and imported names in a single walk
+        scan = _scan_tree(tree)
 
-        # Remove names that are already imported
-        imported_names = set()
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    imported_names.add(alias.name)
-                    if alias.asname:
-                        imported_names.add(alias.asname)
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    for alias in node.names:
-                        imported_names.add(alias.name)
-                        if alias.asname:
-                            imported_names.add(alias.asname)
-        used_names -= imported_names
+        # Remove builtins and names that are already imported
+        used_names = scan["used_names"] - _BUILTIN_NAMES
+        used_names -= scan["imported_names"]
 
         if not used_names:
             return "No missing imports detected."
 
         # Try to find which names correspond to importable modules
-        suggestions = []
-        for name in sorted(used_names):
-            # Check if it's a standard library module
-            if hasattr(sys, "stdlib_module_names"):
-                if name in sys.stdlib_module_names:
-                    suggestions.append(f"import {name}")
-                    continue
-            # Try to find spec
-            spec = importlib.util.find_spec(name)
-            if spec is not None:
-                suggestions.append(f"import {name}")
-                continue
-            # Could be from a submodule (e.g., pandas.DataFrame)
-            # We'll skip for now
+        suggestions = _find_importable_modules(used_names)
 
         if not suggestions:
             return "Could not find importable modules for the missing names."
@@ -2180,42 +3297,217 @@ def suggest_imports(file_path: str) -> str:
         return f"Error analyzing imports: {str(e)}"
 
 
-@mcp.tool()
-def generate_unit_tests(file_path: str, function_name: Optional[str] = None) -> str:
-    """
-    Generate unit tests for functions in a Python file using OpenAI.
+def _annotation_to_str(node: ast.expr) -> str:
+    """Render a type annotation, fast-pathing simple names before ast.unparse."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Constant) and node.value is not Ellipsis:
+        return repr(node.value)
+    if isinstance(node, ast.Attribute) and isinstance(
+        node.value, (ast.Name, ast.Attribute)
+    ):
+        return f"{_annotation_to_str(node.value)}.{node.attr}"
+    if isinstance(node, ast.Subscript) and isinstance(
+        node.value, (ast.Name, ast.Attribute)
+    ):
+        inner = node.slice
+        if isinstance(inner, ast.Tuple) and len(inner.elts) > 1:
+            inner_str = ", ".join(_annotation_to_str(elt) for elt in inner.elts)
+        elif isinstance(inner, ast.Tuple):
+            return ast.unparse(node)
+        else:
+            inner_str = _annotation_to_str(inner)
+        return f"{_annotation_to_str(node.value)}[{inner_str}]"
+    return ast.unparse(node)
 
-    Args:
-        file_path: Path to the Python file.
-        function_name: Optional specific function to generate tests for. If None, generate for all functions.
 
-    Returns:
-        Generated test code as a string.
-    """
-    try:
-        import os
-        from pathlib import Path
+# Upper bound on source characters embedded in a single prompt
+_MAX_PROMPT_SOURCE_CHARS = 50_000
 
-        import openai
+# Most recent (key, result) per tool; agents commonly retry the exact same call
+_LAST_AI_RESULT: Dict[str, tuple[str, str]] = {}
 
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
-            return f"Error: File not found: {file_path}"
-        if p.suffix != ".py":
-            return "Error: Only Python files are supported."
+
+def _ai_cache_key(*parts: object) -> str:
+    """Hash the inputs that determine an AI-generated result."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(str(part).encode("utf-8", errors="replace"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _get_cached_ai_result(
+    kind: str, key: str, max_age: Optional[float] = None
+) -> Optional[str]:
+    """
+    Return a cached result from the single-entry memo or the disk cache.
+
+    With ``max_age`` (seconds), disk entries older than that are ignored.
+    """
+    last = _LAST_AI_RESULT.get(kind)
+    if last is not None and last[0] == key and max_age is None:
+        return last[1]
+    path = CACHE_DIR / kind / f"{key}.md"
+    try:
+        if max_age is not None and time.time() - path.stat().st_mtime > max_age:
+            return None
+        result = path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+    _LAST_AI_RESULT[kind] = (key, result)
+    return result
+
+
+def _store_cached_ai_result(kind: str, key: str, result: str) -> None:
+    """Remember a result in memory and write it atomically to the disk cache."""
+    _LAST_AI_RESULT[kind] = (key, result)
+    cache_dir = CACHE_DIR / kind
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_dir / f"{key}.{os.getpid()}.tmp"
+        tmp_path.write_text(result, encoding="utf-8")
+        os.replace(tmp_path, cache_dir / f"{key}.md")
+    except OSError:
+        # Caching is best-effort; never fail the tool because of it
+        pass
+
+
+# OpenAI clients keyed by API key, reused so connection pools survive across calls
+_OPENAI_CLIENTS: Dict[Optional[str], Any] = {}
+
+
+def _get_openai_client(api_key: Optional[str]) -> Any:
+    """
+    Return a cached OpenAI client for the given API key.
+
+    With None the client falls back to OPENAI_API_KEY and raises if it is
+    unset.
+    """
+    client = _OPENAI_CLIENTS.get(api_key)
+    if client is None:
+        import openai
+
+        client = openai.OpenAI(api_key=api_key)
+        _OPENAI_CLIENTS[api_key] = client
+    return client
+
+
+# Async clients keyed by API key, each with the event loop it was created on;
+# their connection pools cannot be shared across loops
+_ASYNC_OPENAI_CLIENTS: Dict[str, tuple[Any, Any]] = {}
+
+
+def _get_async_openai_client(api_key: str) -> Any:
+    """Return a cached AsyncOpenAI client for the key on the running loop."""
+    loop = asyncio.get_running_loop()
+    cached = _ASYNC_OPENAI_CLIENTS.get(api_key)
+    if cached is not None and cached[0] is loop:
+        return cached[1]
+    import openai
+
+    client = openai.AsyncOpenAI(api_key=api_key)
+    _ASYNC_OPENAI_CLIENTS[api_key] = (loop, client)
+    return client
+
+
+# Explanations/translations are reused for a week, then regenerated
+_CHAT_CACHE_TTL = 7 * 86400
+
+
+def _cached_chat_completion(kind: str, api_key: Optional[str], **kwargs: Any) -> str:
+    """
+    _stream_chat_completion, memoized on disk by model, sampling settings and
+    prompt, so repeated requests for the same snippet skip the API call.
+
+    The shared client for ``api_key`` is only created on a cache miss.
+    """
+    key = _ai_cache_key(
+        kwargs.get("model"),
+        kwargs.get("temperature"),
+        kwargs.get("max_tokens"),
+        kwargs.get("messages"),
+    )
+    cached = _get_cached_ai_result(kind, key, max_age=_CHAT_CACHE_TTL)
+    if cached is not None:
+        return cached
+    result = _stream_chat_completion(_get_openai_client(api_key), **kwargs)
+    if result:
+        _store_cached_ai_result(kind, key, result)
+    return result
+
+
+def _stream_chat_completion(client: Any, **kwargs: Any) -> str:
+    """
+    Run a chat completion with ``stream=True`` and return the joined text.
+
+    Tokens are consumed as they arrive instead of waiting for the server to
+    buffer the whole completion, and the HTTP read timeout applies per chunk
+    rather than to the entire generation.
+    """
+    parts = []
+    for chunk in client.chat.completions.create(stream=True, **kwargs):
+        if chunk.choices:
+            parts.append(chunk.choices[0].delta.content or "")
+    return "".join(parts)
+
+
+@mcp.tool()
+def generate_unit_tests(file_path: str, function_name: Optional[str] = None) -> str:
+    """
+    Generate unit tests for functions in a Python file using OpenAI.
+
+    Args:
+        file_path: Path to the Python file.
+        function_name: Optional specific function to generate tests for. If None, generate for all functions.
+
+    Returns:
+        Generated test code as a string.
+    """
+    try:
+        p, exists = _resolve_path(file_path)
+        if not exists:
+            return f"Error: File not found: {file_path}"
+        if p.suffix != ".py":
+            return "Error: Only Python files are supported."
 
         content = p.read_text(encoding="utf-8")
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
             return "Error: OPENAI_API_KEY environment variable not set."
 
+        cache_key = _ai_cache_key(p, function_name, content)
+        cached = _get_cached_ai_result("unit_tests", cache_key)
+        if cached is not None:
+            return cached
+
+        # Only send the target function's source when one is requested
+        if function_name:
+            for node in ast.walk(_get_tree(p)[1]):
+                if (
+                    isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                    and node.name == function_name
+                ):
+                    start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                    content = "\n".join(
+                        content.splitlines()[start - 1 : node.end_lineno]
+                    )
+                    break
+            else:
+                return f"Error: No function named '{function_name}' found."
+        if len(content) > _MAX_PROMPT_SOURCE_CHARS:
+            return (
+                f"Error: File too large to send to the model ({len(content)} characters). "
+                "Specify function_name to generate tests for a single function."
+            )
+
         # Prepare prompt
         prompt = f"Generate pytest unit tests for the following Python code:\n\n```python\n{content}\n```\n"
         if function_name:
             prompt += f"Focus on testing the function '{function_name}'.\n"
         prompt += "Provide only the test code, no explanations. Use pytest style."
 
-        client = openai.OpenAI(api_key=api_key)
+        client = _get_openai_client(api_key)
         response = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
@@ -2232,7 +3524,9 @@ def generate_unit_tests(file_path: str, function_name: Optional[str] = None) ->
         if content is None:
             return "Error: No content generated."
         generated = content.strip()
-        return f"Generated unit tests:\n```python\n{generated}\n```"
+        result = f"Generated unit tests:\n```python\n{generated}\n```"
+        _store_cached_ai_result("unit_tests", cache_key, result)
+        return result
     except ImportError:
         return "Error: openai package not installed. Install with 'pip install openai'."
     except Exception as e:
@@ -2259,14 +3553,8 @@ def generate_docstring(
         A summary of generated docstrings or error message.
     """
     try:
-        import ast
-        import os
-        from pathlib import Path
-
-        import openai
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
@@ -2276,6 +3564,12 @@ def generate_docstring(
             return "Error: OPENAI_API_KEY environment variable not set."
 
         content = p.read_text(encoding="utf-8")
+        # Only dry runs are cached; applying docstrings rewrites the file
+        cache_key = _ai_cache_key(p, target_name, style, content)
+        if dry_run:
+            cached = _get_cached_ai_result("docstrings", cache_key)
+            if cached is not None:
+                return cached
         tree = ast.parse(content)
 
         # Collect target nodes
@@ -2294,13 +3588,17 @@ def generate_docstring(
         # Helper function to insert/replace docstring in an AST node
         def _set_docstring(node, docstring_text):
             """Insert or replace docstring in the given AST node."""
-            import re
-
             # Remove triple quotes from start and end
             # Assumes docstring_text starts and ends with ''' or """
-            match = re.match(r"^(\"{3}|\'{3})(.*?)(\1)$", docstring_text, re.DOTALL)
-            if match:
-                content = match.group(2)
+            stripped = docstring_text.strip()
+            for quote in ('"""', "'''"):
+                if (
+                    len(stripped) >= 2 * len(quote)
+                    and stripped.startswith(quote)
+                    and stripped.endswith(quote)
+                ):
+                    content = stripped[len(quote) : -len(quote)]
+                    break
             else:
                 content = docstring_text  # fallback
             # Create docstring node
@@ -2325,6 +3623,7 @@ def generate_docstring(
                 # Insert at beginning
                 node.body.insert(0, docstring_node)
 
+        client = _get_openai_client(api_key)
         results = []
         for node in targets:
             # Extract signature and existing docstring
@@ -2335,34 +3634,38 @@ def generate_docstring(
                 # positional arguments
                 for arg in args.args:
                     if arg.annotation:
-                        arg_parts.append(f"{arg.arg}: {ast.unparse(arg.annotation)}")
+                        arg_parts.append(
+                            f"{arg.arg}: {_annotation_to_str(arg.annotation)}"
+                        )
                     else:
                         arg_parts.append(arg.arg)
                 # *args
                 if args.vararg:
                     if args.vararg.annotation:
                         arg_parts.append(
-                            f"*{args.vararg.arg}: {ast.unparse(args.vararg.annotation)}"
+                            f"*{args.vararg.arg}: {_annotation_to_str(args.vararg.annotation)}"
                         )
                     else:
                         arg_parts.append(f"*{args.vararg.arg}")
                 # keyword-only arguments
                 for arg in args.kwonlyargs:
                     if arg.annotation:
-                        arg_parts.append(f"{arg.arg}: {ast.unparse(arg.annotation)}")
+                        arg_parts.append(
+                            f"{arg.arg}: {_annotation_to_str(arg.annotation)}"
+                        )
                     else:
                         arg_parts.append(arg.arg)
                 # **kwargs
                 if args.kwarg:
                     if args.kwarg.annotation:
                         arg_parts.append(
-                            f"**{args.kwarg.arg}: {ast.unparse(args.kwarg.annotation)}"
+                            f"**{args.kwarg.arg}: {_annotation_to_str(args.kwarg.annotation)}"
                         )
                     else:
                         arg_parts.append(f"**{args.kwarg.arg}")
                 signature = f"{node.name}({', '.join(arg_parts)})"
                 if node.returns:
-                    signature += f" -> {ast.unparse(node.returns)}"
+                    signature += f" -> {_annotation_to_str(node.returns)}"
             else:
                 signature = node.name  # type: ignore[attr-defined]
 
@@ -2371,7 +3674,6 @@ def generate_docstring(
             prompt += "Provide only the docstring, no explanations.\n"
             prompt += "Format with triple quotes and proper indentation.\n"
 
-            client = openai.OpenAI(api_key=api_key)
             response = client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
@@ -2396,12 +3698,14 @@ def generate_docstring(
                 results.append(f"{signature}: docstring generated and applied")
 
         if dry_run:
-            return "Generated docstrings (dry-run):\n" + "\n\n".join(results)
+            result = "Generated docstrings (dry-run):\n" + "\n\n".join(results)
+            _store_cached_ai_result("docstrings", cache_key, result)
+            return result
         else:
             # Write modified content back
             try:
                 new_source = ast.unparse(tree)
-                p.write_text(new_source, encoding="utf-8")
+                _atomic_write_text(p, new_source)
                 return "Generated docstrings applied and file updated:\n" + "\n\n".join(
                     results
                 )
@@ -2425,35 +3729,25 @@ def code_stats(file_path: str) -> str:
         Statistics as a formatted string.
     """
     try:
-        import ast
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
 
-        content = p.read_text(encoding="utf-8")
-        lines = content.splitlines()
-        line_count = len(lines)
+        content, tree = _get_tree(p)
+        # Count in C over the whole buffer instead of materializing a line list
+        line_count = content.count("\n") + (
+            1 if content and not content.endswith("\n") else 0
+        )
         char_count = len(content)
-        non_empty_lines = [line for line in lines if line.strip()]
-        non_empty_count = len(non_empty_lines)
+        non_empty_count = sum(1 for _ in _NON_EMPTY_LINE_RE.finditer(content))
 
-        # Parse AST
-        tree = ast.parse(content)
-        function_count = sum(
-            1 for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)
-        )
-        class_count = sum(
-            1 for node in ast.walk(tree) if isinstance(node, ast.ClassDef)
-        )
-        import_count = sum(
-            1
-            for node in ast.walk(tree)
-            if isinstance(node, (ast.Import, ast.ImportFrom))
-        )
+        # Count definitions in a single walk
+        scan = _scan_tree(tree)
+        function_count = scan["functions"]
+        class_count = scan["classes"]
+        import_count = scan["imports"]
 
         stats = f"Statistics for {file_path}:\n"
         stats += f"  Lines: {line_count} (non-empty: {non_empty_count})\n"
@@ -2466,77 +3760,61 @@ def code_stats(file_path: str) -> str:
         return f"Error computing statistics: {str(e)}"
 
 
+async def _run_review_tool(label: str, argv: List[str]) -> List[str]:
+    """Run one code_review analyzer and return its report sections."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=30)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return [f"{label} timed out."]
+    except Exception as e:
+        return [f"{label} error: {e}"]
+    sections = []
+    out = stdout.decode("utf-8", errors="replace").strip()
+    err = stderr.decode("utf-8", errors="replace").strip()
+    if out:
+        sections.append(f"=== {label} ===\n" + out)
+    if err:
+        sections.append(f"{label} stderr: " + err)
+    return sections
+
+
 @mcp.tool()
-def code_review(path: str) -> str:
+async def code_review(path: str) -> str:
     """
     Run static analysis tools (pylint, flake8, bandit) on a Python file or directory.
 
+    The three tools run concurrently as asyncio subprocesses, so the review
+    takes as long as the slowest of them.
+
     Args:
         path: Absolute path to a Python file or directory.
 
     Returns:
         A summary report of issues found.
     """
-    import subprocess
-    import sys
-    from pathlib import Path
-
-    p = Path(path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(path)
+    if not exists:
         return f"Error: Path not found: {path}"
 
-    issues = []
-
-    # Run pylint
-    try:
-        result = subprocess.run(
+    reports = await asyncio.gather(
+        _run_review_tool(
+            "Pylint",
             [sys.executable, "-m", "pylint", "--output-format=text", str(p)],
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
-        if result.stdout:
-            issues.append("=== Pylint ===\n" + result.stdout.strip())
-        if result.stderr:
-            issues.append("Pylint stderr: " + result.stderr.strip())
-    except subprocess.TimeoutExpired:
-        issues.append("Pylint timed out.")
-    except Exception as e:
-        issues.append(f"Pylint error: {e}")
-
-    # Run flake8
-    try:
-        result = subprocess.run(
-            [sys.executable, "-m", "flake8", str(p)],
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
-        if result.stdout:
-            issues.append("=== Flake8 ===\n" + result.stdout.strip())
-        if result.stderr:
-            issues.append("Flake8 stderr: " + result.stderr.strip())
-    except subprocess.TimeoutExpired:
-        issues.append("Flake8 timed out.")
-    except Exception as e:
-        issues.append(f"Flake8 error: {e}")
-
-    # Run bandit
-    try:
-        result = subprocess.run(
-            [sys.executable, "-m", "bandit", "-r", str(p), "-f", "txt"],
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
-        if result.stdout:
-            issues.append("=== Bandit ===\n" + result.stdout.strip())
-        if result.stderr:
-            issues.append("Bandit stderr: " + result.stderr.strip())
-    except subprocess.TimeoutExpired:
-        issues.append("Bandit timed out.")
-    except Exception as e:
-        issues.append(f"Bandit error: {e}")
+        ),
+        _run_review_tool("Flake8", [sys.executable, "-m", "flake8", str(p)]),
+        _run_review_tool(
+            "Bandit", [sys.executable, "-m", "bandit", "-r", str(p), "-f", "txt"]
+        ),
+    )
+    issues = [section for report in reports for section in report]
 
     if not issues:
         return "No issues found or all tools failed."
@@ -2555,12 +3833,8 @@ def security_scan(path: str) -> str:
     Returns:
         Security issues found by bandit.
     """
-    import subprocess
-    import sys
-    from pathlib import Path
-
-    p = Path(path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(path)
+    if not exists:
         return f"Error: Path not found: {path}"
 
     try:
@@ -2595,12 +3869,8 @@ def test_coverage(path: str) -> str:
     Returns:
         Coverage report summary.
     """
-    import subprocess
-    import sys
-    from pathlib import Path
-
-    p = Path(path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(path)
+    if not exists:
         return f"Error: Path not found: {path}"
     if not p.is_dir():
         return "Error: Path must be a directory."
@@ -2652,58 +3922,147 @@ def test_coverage(path: str) -> str:
         return f"Coverage report error: {e}"
 
 
-def _collect_used_names(tree: ast.AST) -> set[str]:
-    """Collect all names used in the code (excluding builtins)."""
-    import builtins
+# Node kinds classified by _scan_tree, dispatched on the exact node type
+_SCAN_NAME, _SCAN_IMPORT, _SCAN_FUNCTION, _SCAN_CLASS = range(4)
+_SCAN_DISPATCH: Dict[type, int] = {
+    ast.Name: _SCAN_NAME,
+    ast.Import: _SCAN_IMPORT,
+    ast.ImportFrom: _SCAN_IMPORT,
+    ast.FunctionDef: _SCAN_FUNCTION,
+    ast.ClassDef: _SCAN_CLASS,
+}
 
-    used_names = set()
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-            used_names.add(node.id)
-    # Remove builtins
-    builtin_names = set(dir(builtins))
-    used_names -= builtin_names
-    return used_names
 
+def _scan_tree(tree: ast.AST) -> Dict[str, Any]:
+    """
+    Walk a tree once and collect what the analysis tools need.
 
-def _collect_imported_names(tree: ast.AST) -> set[str]:
-    """Collect all names that are already imported."""
-    imported_names = set()
+    Each node is classified with a single dict lookup on its type instead of a
+    chain of isinstance checks. Returns used (loaded) names, imported names,
+    the Import/ImportFrom nodes in walk order, and function/class/import counts.
+    """
+    used_names: set[str] = set()
+    imported_names: set[str] = set()
+    import_nodes: List[ast.stmt] = []
+    counts = [0, 0, 0, 0]
+    dispatch = _SCAN_DISPATCH
     for node in ast.walk(tree):
-        if isinstance(node, ast.Import):
-            for alias in node.names:
+        kind = dispatch.get(type(node))
+        if kind is None:
+            continue
+        counts[kind] += 1
+        if kind == _SCAN_NAME:
+            if isinstance(node.ctx, ast.Load):  # type: ignore[attr-defined]
+                used_names.add(node.id)  # type: ignore[attr-defined]
+        elif kind == _SCAN_IMPORT:
+            import_nodes.append(node)  # type: ignore[arg-type]
+            if isinstance(node, ast.ImportFrom) and not node.module:
+                continue
+            for alias in node.names:  # type: ignore[attr-defined]
                 imported_names.add(alias.name)
                 if alias.asname:
                     imported_names.add(alias.asname)
-        elif isinstance(node, ast.ImportFrom):
-            if node.module:
-                for alias in node.names:
-                    imported_names.add(alias.name)
-                    if alias.asname:
-                        imported_names.add(alias.asname)
-    return imported_names
+                elif "." in alias.name:
+                    # "import os.path" binds the top-level name "os"
+                    imported_names.add(alias.name.split(".", 1)[0])
+    return {
+        "used_names": used_names,
+        "imported_names": imported_names,
+        "import_nodes": import_nodes,
+        "functions": counts[_SCAN_FUNCTION],
+        "classes": counts[_SCAN_CLASS],
+        "imports": counts[_SCAN_IMPORT],
+    }
+
+
+@functools.lru_cache(maxsize=8192)
+def _spec_exists(name: str) -> bool:
+    """Return True if a top-level module named `name` can be imported (memoized)."""
+    return importlib.util.find_spec(name) is not None
+
+
+# Top-level standard library modules; a set lookup instead of a find_spec probe
+_STDLIB_MODULE_NAMES = frozenset(getattr(sys, "stdlib_module_names", ()))
+# Names that resolve without an import; built once rather than per call
+_BUILTIN_NAMES = frozenset(dir(builtins))
+
+
+@functools.lru_cache(maxsize=4096)
+def _import_statement_for(name: str) -> Optional[str]:
+    """Return ``import name`` if `name` is an importable module (memoized)."""
+    if name in _STDLIB_MODULE_NAMES or _spec_exists(name):
+        return f"import {name}"
+    # Could be from a submodule (e.g., pandas.DataFrame); skipped for now
+    return None
+
+
+# The _search_path_stamp() under which the memoized import probes were made
+_IMPORT_PROBE_STAMP: Dict[str, Any] = {}
+
+
+def _search_path_stamp() -> tuple[tuple[str, Optional[int]], ...]:
+    """sys.path entries with their mtime_ns, which an install or removal changes."""
+    stamp = []
+    for entry in sys.path:
+        try:
+            stamp.append((entry, os.stat(entry or ".").st_mtime_ns))
+        except OSError:
+            stamp.append((entry, None))
+    return tuple(stamp)
+
+
+@functools.lru_cache(maxsize=1)
+def _importable_top_level_names(
+    search_path: tuple[tuple[str, Optional[int]], ...],
+) -> frozenset[str]:
+    """
+    Top-level module and package names found directly on ``search_path``.
+
+    One scandir per sys.path entry replaces a find_spec path scan per name.
+    Directories count as (namespace) packages. Names missing from the set
+    may still be importable through zip files or custom meta-path finders.
+    Keyed by _search_path_stamp(), so installing a package rebuilds the set.
+    """
+    suffixes = tuple(importlib.machinery.all_suffixes())
+    names = set(sys.builtin_module_names)
+    for entry, _ in search_path:
+        try:
+            with os.scandir(entry or ".") as it:
+                for item in it:
+                    if item.is_dir():
+                        if item.name.isidentifier():
+                            names.add(item.name)
+                        continue
+                    for suffix in suffixes:
+                        if item.name.endswith(suffix):
+                            stem = item.name[: -len(suffix)]
+                            if stem.isidentifier():
+                                names.add(stem)
+                            break
+        except OSError:
+            continue
+    return frozenset(names)
 
 
 def _find_importable_modules(names: set[str]) -> list[str]:
     """Find which names correspond to importable modules."""
-    import importlib.util
-    import sys
-
-    imports_to_add = []
+    stamp = _search_path_stamp()
+    if stamp != _IMPORT_PROBE_STAMP.get("stamp"):
+        # A package was installed or removed since the memoized probes ran
+        _import_statement_for.cache_clear()
+        _spec_exists.cache_clear()
+        _IMPORT_PROBE_STAMP["stamp"] = stamp
+    available = _importable_top_level_names(stamp)
+    imports = []
     for name in sorted(names):
-        # Check if it's a standard library module
-        if hasattr(sys, "stdlib_module_names"):
-            if name in sys.stdlib_module_names:
-                imports_to_add.append(f"import {name}")
-                continue
-        # Try to find spec
-        spec = importlib.util.find_spec(name)
-        if spec is not None:
-            imports_to_add.append(f"import {name}")
-            continue
-        # Could be from a submodule (e.g., pandas.DataFrame)
-        # We'll skip for now
-    return imports_to_add
+        # Known module names short-circuit before the memoized probe
+        if name in _STDLIB_MODULE_NAMES or name in available:
+            imports.append(f"import {name}")
+        else:
+            statement = _import_statement_for(name)
+            if statement:
+                imports.append(statement)
+    return imports
 
 
 def _determine_insertion_point(lines: list[str]) -> int:
@@ -2730,19 +4089,112 @@ def _determine_insertion_point(lines: list[str]) -> int:
     return insert_line
 
 
+_VECTOR_INDENT_MIN_LINES = 32
+
+
 def _detect_indent(lines: list[str]) -> int:
     """Detect common indentation (number of leading spaces) of a block."""
     if not lines:
         return 0
+    if len(lines) >= _VECTOR_INDENT_MIN_LINES:
+        try:
+            return _detect_indent_vectorized(lines)
+        except ImportError:
+            pass
     indent = None
     for line in lines:
-        if line.strip():  # non-empty line
-            leading = len(line) - len(line.lstrip())
+        stripped = line.lstrip()
+        if stripped:  # non-empty line
+            leading = len(line) - len(stripped)
             if indent is None or leading < indent:
                 indent = leading
+                if not indent:
+                    break
     return indent if indent is not None else 0
 
 
+def _detect_indent_vectorized(lines: list[str]) -> int:
+    """
+    numpy version of _detect_indent for large blocks.
+
+    Works on the UTF-8 bytes of the whole block at once: the first
+    non-whitespace byte of each line is found in a single pass instead of one
+    ``lstrip`` per line. Only ASCII whitespace counts as indentation, which
+    matches what Python itself accepts.
+    """
+    import numpy as np
+
+    buf = np.frombuffer("\n".join(lines).encode("utf-8"), dtype=np.uint8)
+    starts = np.concatenate(([0], np.flatnonzero(buf == 0x0A) + 1))
+    blank = np.isin(buf, (0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x20))
+    text = np.flatnonzero(~blank)
+    if not text.size:
+        return 0
+    line_of = np.searchsorted(starts, text, side="right") - 1
+    line_ids, first = np.unique(line_of, return_index=True)
+    return int((text[first] - starts[line_ids]).min())
+
+
+# Buffers at least this large locate newlines with numpy (when installed)
+_VECTOR_NEWLINE_MIN_BYTES = 1 << 20
+
+
+def _line_offsets(buf: Any, last_line: int) -> List[int]:
+    """
+    Byte offsets at which lines 1..last_line of ``buf`` end.
+
+    ``offsets[k]`` is the end of line k (and the start of line k + 1), with
+    ``offsets[0] == 0``. The list is shorter when ``buf`` has fewer lines, so
+    ``len(offsets) - 1`` is then the line count. Only ``\\n`` ends a line.
+    """
+    if len(buf) >= _VECTOR_NEWLINE_MIN_BYTES:
+        try:
+            return _line_offsets_vectorized(buf, last_line)
+        except ImportError:
+            pass
+    offsets = [0]
+    pos, size = 0, len(buf)
+    while len(offsets) <= last_line and pos < size:
+        newline = buf.find(b"\n", pos)
+        pos = size if newline == -1 else newline + 1
+        offsets.append(pos)
+    return offsets
+
+
+# Bytes sliced out of a mapping per bytes.count call in _count_lines
+_COUNT_LINES_CHUNK = 1 << 20
+
+
+def _count_lines(buf: Any) -> int:
+    """
+    Number of lines in ``buf`` (only ``\\n`` ends a line), as readlines() counts.
+
+    mmap has no count(), so the buffer is counted in slices; each
+    bytes.count is a memchr-speed scan and memory stays bounded by the slice.
+    """
+    count = 0
+    for start in range(0, len(buf), _COUNT_LINES_CHUNK):
+        count += buf[start : start + _COUNT_LINES_CHUNK].count(b"\n")
+    if len(buf) and buf[-1:] != b"\n":
+        count += 1
+    return count
+
+
+def _line_offsets_vectorized(buf: Any, last_line: int) -> List[int]:
+    """numpy version of _line_offsets; one pass over the buffer in C."""
+    import numpy as np
+
+    data = np.frombuffer(buf, dtype=np.uint8)
+    ends = np.flatnonzero(data == 0x0A)[:last_line] + 1
+    offsets = [0] + ends.tolist()
+    has_tail = len(buf) and data[-1] != 0x0A
+    # Release the buffer export so an mmap can be closed afterwards
+    del data, ends
+    if len(offsets) <= last_line and has_tail:
+        offsets.append(len(buf))
+    return offsets
+
+
 def _infer_parameters(content: str, start_line: int, end_line: int) -> list[str]:
     """Infer parameters for a code block (placeholder)."""
     # For now, return empty list; could be enhanced later.
@@ -2761,23 +4213,19 @@ def add_missing_imports(file_path: str) -> str:
         Summary of imports added or error message.
     """
     try:
-        import ast
-        import sys
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
 
-        content = p.read_text(encoding="utf-8")
+        content, tree = _get_tree(p)
         lines = content.splitlines()
-        tree = ast.parse(content)
 
-        used_names = _collect_used_names(tree)
-        imported_names = _collect_imported_names(tree)
-        missing_names = used_names - imported_names
+        # Collect used and imported names in a single walk
+        scan = _scan_tree(tree)
+        used_names = scan["used_names"] - _BUILTIN_NAMES
+        missing_names = used_names - scan["imported_names"]
 
         if not missing_names:
             return "No missing imports detected."
@@ -2789,12 +4237,13 @@ def add_missing_imports(file_path: str) -> str:
 
         insert_line = _determine_insertion_point(lines)
 
-        # Insert imports
-        for imp in reversed(imports_to_add):
-            lines.insert(insert_line, imp)
-
-        new_content = "\n".join(lines) + ("\n" if lines else "")
-        p.write_text(new_content, encoding="utf-8")
+        # Stream head, new imports and tail instead of shifting the list
+        buf = io.StringIO()
+        buf.writelines(f"{line}\n" for line in lines[:insert_line])
+        buf.writelines(f"{imp}\n" for imp in imports_to_add)
+        buf.writelines(f"{line}\n" for line in lines[insert_line:])
+        p.write_text(buf.getvalue(), encoding="utf-8")
+        _forget_tree(p)
 
         summary = f"Added {len(imports_to_add)} import(s):\n"
         for imp in imports_to_add:
@@ -2818,22 +4267,14 @@ def sort_imports(file_path: str) -> str:
         Success message or error description.
     """
     try:
-        import subprocess
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
 
         # Run isort
-        result = subprocess.run(
-            ["isort", str(p)],
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
+        result = _run_formatter("isort", [str(p)])[0]
         if result.returncode == 0:
             return f"Successfully sorted imports in {p.name} using isort."
         else:
@@ -2858,22 +4299,16 @@ def format_with_ruff(file_path: str) -> str:
         Success message or error description.
     """
     try:
-        import subprocess
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
 
-        # Run ruff format
-        result = subprocess.run(
-            ["ruff", "format", str(p)],
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
+        # Prefer the long-lived ruff server; fall back to the CLI
+        if _RUFF_SERVER.format_file(p):
+            return f"Successfully formatted {p.name} using ruff."
+        result = _run_formatter("ruff", [str(p)])[0]
         if result.returncode == 0:
             return f"Successfully formatted {p.name} using ruff."
         else:
@@ -2908,11 +4343,8 @@ def format_code(file_path: str, formatter: str = "", options: str = "") -> str:
     Returns:
         Success message or error description.
     """
-    import subprocess
-    from pathlib import Path
-
-    p = Path(file_path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(file_path)
+    if not exists:
         return f"Error: File not found: {file_path}"
     if not p.is_file():
         return f"Error: Path is not a file: {file_path}"
@@ -2932,24 +4364,14 @@ def format_code(file_path: str, formatter: str = "", options: str = "") -> str:
         else:
             fmt = "prettier"  # fallback
 
-    # Build command
-    if fmt == "black":
-        cmd = ["black", str(p)]
-    elif fmt == "ruff":
-        cmd = ["ruff", "format", str(p)]
-    elif fmt == "rustfmt":
-        cmd = ["rustfmt", str(p)]
-    elif fmt == "prettier":
-        cmd = ["prettier", "--write", str(p)]
-    else:
+    if fmt not in _FORMATTER_COMMANDS:
         return f"Error: Unknown formatter '{fmt}'."
 
-    if options:
-        # Split options string into list (simple splitting by spaces, no quoting)
-        cmd.extend(options.split())
-
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        if fmt == "ruff" and not options and _RUFF_SERVER.format_file(p):
+            return f"Successfully formatted {p.name} using ruff."
+        # Options are split on spaces (no quoting support)
+        result = _run_formatter(fmt, [str(p)], options)[0]
         if result.returncode == 0:
             return f"Successfully formatted {p.name} using {fmt}."
         else:
@@ -2962,6 +4384,59 @@ def format_code(file_path: str, formatter: str = "", options: str = "") -> str:
         return f"Error running {fmt}: {str(e)}"
 
 
+@mcp.tool()
+def format_files(paths: List[str], formatter: str = "ruff", options: str = "") -> str:
+    """
+    Format several files with a single formatter run per batch of paths.
+
+    Much faster than calling format_code once per file, since the formatter
+    starts (and loads its configuration) once per batch of up to 200 paths.
+
+    Args:
+        paths: Paths of the files to format.
+        formatter: One of black, ruff, isort, rustfmt, prettier (default ruff).
+        options: Additional command-line options passed to the formatter.
+
+    Returns:
+        Summary of the run, including any formatter errors.
+    """
+    if formatter not in _FORMATTER_COMMANDS:
+        return f"Error: Unknown formatter '{formatter}'."
+
+    files = []
+    missing = []
+    for path in paths:
+        p = Path(path).expanduser().resolve()
+        if p.is_file():
+            files.append(str(p))
+        else:
+            missing.append(path)
+    if not files:
+        return "Error: No existing files to format."
+
+    try:
+        results = _run_formatter(formatter, files, options, timeout=120)
+    except subprocess.TimeoutExpired:
+        return f"Error: {formatter} timed out."
+    except FileNotFoundError:
+        return f"Error: {formatter} not installed. Please install it and ensure it's in PATH."
+    except Exception as e:
+        return f"Error running {formatter}: {str(e)}"
+
+    failed = [r for r in results if r.returncode != 0]
+    summary_lines = [
+        f"Ran {formatter} on {len(files)} file(s) in {len(results)} invocation(s)."
+    ]
+    if missing:
+        summary_lines.append(f"Skipped {len(missing)} missing file(s):")
+        summary_lines.extend(f"- {path}" for path in missing[:5])
+    if failed:
+        summary_lines.append(f"\n{len(failed)} invocation(s) failed:")
+        for result in failed[:5]:
+            summary_lines.append(f"STDOUT: {result.stdout}\nSTDERR: {result.stderr}")
+    return "\n".join(summary_lines)
+
+
 @mcp.tool()
 def extract_function(
     file_path: str,
@@ -2986,11 +4461,8 @@ def extract_function(
         Success message or error description.
     """
     try:
-        import ast
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
@@ -3028,15 +4500,6 @@ def extract_function(
         else:
             return_stmt = ""
 
-        # Generate new function
-        indent_str = " " * 4
-        param_str = ", ".join(param_list)
-        function_code = f"def {new_function_name}({param_str}):\n"
-        for line in dedented_lines:
-            function_code += indent_str + line + "\n"
-        if return_stmt:
-            function_code += indent_str + return_stmt + "\n"
-
         # Generate function call
         call_args = ", ".join(param_list)
         if return_var:
@@ -3044,12 +4507,19 @@ def extract_function(
         else:
             replacement = f"{new_function_name}({call_args})"
 
-        # Apply changes
-        new_lines = (
-            lines[: start_line - 1] + [function_code, replacement] + lines[end_line:]
-        )
-        new_content = "\n".join(new_lines)
-        p.write_text(new_content, encoding="utf-8")
+        # Apply changes: head, new function, call, tail
+        indent_str = " " * 4
+        param_str = ", ".join(param_list)
+        buf = io.StringIO()
+        buf.writelines(f"{line}\n" for line in lines[: start_line - 1])
+        buf.write(f"def {new_function_name}({param_str}):\n")
+        buf.writelines(f"{indent_str}{line}\n" for line in dedented_lines)
+        if return_stmt:
+            buf.write(f"{indent_str}{return_stmt}\n")
+        buf.write("\n")
+        buf.write(replacement)
+        buf.writelines(f"\n{line}" for line in lines[end_line:])
+        _atomic_write_text(p, buf.getvalue())
 
         return f"Successfully extracted lines {start_line}-{end_line} into function {new_function_name}."
     except SyntaxError as e:
@@ -3058,6 +4528,46 @@ def extract_function(
         return f"Error extracting function: {str(e)}"
 
 
+# Expressions that never need parentheses when substituted for a name
+_INLINE_ATOMS = (
+    ast.Name,
+    ast.Constant,
+    ast.Attribute,
+    ast.Subscript,
+    ast.Call,
+    ast.List,
+    ast.Tuple,
+    ast.Dict,
+    ast.Set,
+    ast.ListComp,
+    ast.SetComp,
+    ast.DictComp,
+    ast.GeneratorExp,
+    ast.JoinedStr,
+)
+
+
+def _inline_needs_parens(value: ast.expr, usage: ast.Name, parent: ast.AST) -> bool:
+    """Whether `value` must be parenthesised to replace `usage` in `parent`."""
+    if (
+        isinstance(value, ast.Constant)
+        and type(value.value) in (int, float, complex)
+        and isinstance(parent, ast.Attribute)
+    ):
+        # `1.bit_length()` would lex as the float `1.` followed by a name
+        return True
+    if isinstance(value, _INLINE_ATOMS):
+        return False
+    if isinstance(value, (ast.NamedExpr, ast.Yield, ast.YieldFrom, ast.Starred)):
+        return True
+    # Positions where any expression stands on its own
+    if isinstance(parent, (ast.stmt, ast.keyword, ast.List, ast.Set, ast.Dict)):
+        return False
+    if isinstance(parent, ast.Call) and usage is not parent.func:
+        return False
+    return True
+
+
 @mcp.tool()
 def inline_variable(
     file_path: str,
@@ -3077,113 +4587,147 @@ def inline_variable(
         Success message or error description.
     """
     try:
-        import ast
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
 
-        content = p.read_text(encoding="utf-8")
-        tree = ast.parse(content)
-
-        # Find assignment node
-        assignment_node = None
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Assign):
-                for target in node.targets:
-                    if isinstance(target, ast.Name) and target.id == variable_name:
-                        # Check line number
-                        if assignment_line == 0 or node.lineno == assignment_line:
-                            assignment_node = node
-                            break
-                if assignment_node:
-                    break
-
-        if assignment_node is None:
-            return f"Error: No assignment found for variable '{variable_name}'" + (
-                f" at line {assignment_line}." if assignment_line else "."
-            )
-
-        # Build parent map to find scope
-        parent_map = {}
-        for parent in ast.walk(tree):
-            for child in ast.iter_child_nodes(parent):
-                parent_map[child] = parent
-
-        def get_parent(node):
-            return parent_map.get(node)
+        content, tree = _get_tree(p)
 
-        # Determine the scope node (nearest function, class, or module)
-        scope_node = assignment_node
-        while scope_node and not isinstance(
-            scope_node,
-            (ast.Module, ast.FunctionDef, ast.ClassDef, ast.AsyncFunctionDef),
-        ):
-            scope_node = get_parent(scope_node)
-        if scope_node is None:
-            scope_node = tree  # fallback to module
-
-        # Collect usages of variable in the same scope after assignment
-        usages = []
-
-        class UsageCollector(ast.NodeVisitor):
+        # A single traversal finds the assignment and every load of the
+        # variable, each tagged with its parent and chain of enclosing scopes
+        class InlineScanner(ast.NodeVisitor):
             def __init__(self):
+                self.scopes = (tree,)
+                self.parents = []
+                self.assignment = None
+                self.assignment_scope = tree
                 self.usages = []
-                self.in_target_scope = False
-                self.current_scope = None
 
-            def visit_FunctionDef(self, node):
-                self.current_scope = node
+            def generic_visit(self, node):
+                self.parents.append(node)
+                super().generic_visit(node)
+                self.parents.pop()
+
+            def visit_scope(self, node):
+                outer = self.scopes
+                self.scopes = outer + (node,)
                 self.generic_visit(node)
+                self.scopes = outer
 
-            def visit_ClassDef(self, node):
-                self.current_scope = node
+            visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_scope
+
+            def visit_Assign(self, node):
+                if self.assignment is None and (
+                    assignment_line == 0 or node.lineno == assignment_line
+                ):
+                    for target in node.targets:
+                        if isinstance(target, ast.Name) and target.id == variable_name:
+                            self.assignment = node
+                            self.assignment_scope = self.scopes[-1]
+                            break
                 self.generic_visit(node)
 
             def visit_Name(self, node):
                 if isinstance(node.ctx, ast.Load) and node.id == variable_name:
-                    # Check if node is within the target scope and after assignment line
-                    # For simplicity, assume all usages in same scope are candidates
-                    self.usages.append(node)
-                self.generic_visit(node)
+                    # Usages inside an f-string are rewritten with the
+                    # outermost one, so quotes in the value cannot clash
+                    fstring = next(
+                        (p for p in self.parents if isinstance(p, ast.JoinedStr)),
+                        None,
+                    )
+                    self.usages.append((node, self.parents[-1], self.scopes, fstring))
+
+        scanner = InlineScanner()
+        scanner.visit(tree)
+        assignment_node = scanner.assignment
+
+        if assignment_node is None:
+            return f"Error: No assignment found for variable '{variable_name}'" + (
+                f" at line {assignment_line}." if assignment_line else "."
+            )
 
-        collector = UsageCollector()
-        collector.visit(scope_node)
-        usages = collector.usages
+        # Usages within the assignment's scope (nearest function, class, or
+        # module), excluding any inside the assignment statement itself
+        scope_node = scanner.assignment_scope
+        assignment_span = (
+            (assignment_node.lineno, assignment_node.col_offset),
+            (assignment_node.end_lineno, assignment_node.end_col_offset),
+        )
+        usages = [
+            (node, parent, fstring)
+            for node, parent, scopes, fstring in scanner.usages
+            if scope_node in scopes
+            and not (
+                assignment_span[0]
+                <= (node.lineno, node.col_offset)
+                < assignment_span[1]
+            )
+        ]
 
         if not usages:
             return (
                 f"Error: Variable '{variable_name}' is not used after its assignment."
             )
 
-        # Replace each usage with the assignment expression
-        class InlineTransformer(ast.NodeTransformer):
-            def visit_Name(self, node):
-                if isinstance(node.ctx, ast.Load) and node.id == variable_name:
-                    # Replace with the expression (deep copy)
-                    new_node = ast.copy_location(assignment_node.value, node)
-                    return new_node
-                return node
+        # Splice the unparsed expression over each usage, leaving the rest
+        # of the source (formatting, comments) untouched. The assignment
+        # itself is kept; other references may still need it.
+        value = assignment_node.value
+        value_src = ast.unparse(value)
+        line_starts = [0] + [m.end() for m in _LSP_LINE_BREAK_RE.finditer(content)]
+
+        def offset(lineno: int, col_offset: int) -> int:
+            # ast columns are UTF-8 byte offsets within the line
+            start = line_starts[lineno - 1]
+            line = content[start : start + col_offset]
+            return start + len(line.encode("utf-8")[:col_offset].decode("utf-8"))
+
+        # An f-string holding usages is replaced whole by its unparsed form,
+        # with the usages substituted in the tree
+        fstring_usages: Dict[ast.JoinedStr, set] = defaultdict(set)
+        edits = []
+        for node, parent, fstring in usages:
+            if fstring is None:
+                edits.append((node, parent))
+            else:
+                if fstring not in fstring_usages:
+                    edits.append((fstring, None))
+                fstring_usages[fstring].add((node.lineno, node.col_offset))
 
-        transformer = InlineTransformer()
-        new_tree = transformer.visit(tree)
-        ast.fix_missing_locations(new_tree)
+        class SubstituteUsages(ast.NodeTransformer):
+            def __init__(self, positions):
+                self.positions = positions
 
-        # Remove the assignment statement if all usages replaced
-        # Actually we need to remove the assignment node from its parent body
-        parent = get_parent(assignment_node)
-        if isinstance(parent, list):
-            parent.remove(assignment_node)
-        else:
-            # parent is a statement, we cannot remove directly; fallback to no removal
-            pass
+            def visit_Name(self, node):
+                if (node.lineno, node.col_offset) in self.positions:
+                    return copy.deepcopy(value)
+                return node
 
-        # Generate new source
-        new_content = ast.unparse(new_tree)
-        p.write_text(new_content, encoding="utf-8")
+        parts = []
+        last = 0
+        for node, parent in sorted(edits, key=lambda e: (e[0].lineno, e[0].col_offset)):
+            start = offset(node.lineno, node.col_offset)
+            end = offset(node.end_lineno, node.end_col_offset)
+            parts.append(content[last:start])
+            if isinstance(node, ast.JoinedStr):
+                substituted = SubstituteUsages(fstring_usages[node]).visit(
+                    copy.deepcopy(node)
+                )
+                parts.append(ast.unparse(substituted))
+            elif _inline_needs_parens(value, node, parent):
+                parts.append(f"({value_src})")
+            else:
+                parts.append(value_src)
+            last = end
+        parts.append(content[last:])
+        new_content = "".join(parts)
+        try:
+            ast.parse(new_content)
+        except SyntaxError as e:
+            return f"Error: Inlining '{variable_name}' would produce invalid code: {e}"
+        _atomic_write_text(p, new_content)
 
         return f"Successfully inlined variable '{variable_name}' at line {assignment_node.lineno}."
     except SyntaxError as e:
@@ -3206,14 +4750,10 @@ def explain_code(file_path: str = "", code: str = "", language: str = "python")
         Explanation as a markdown string.
     """
     try:
-        import openai
-
         # Read code from file if file_path provided
         if file_path:
-            from pathlib import Path
-
-            p = Path(file_path).expanduser().resolve()
-            if not p.exists():
+            p, exists = _resolve_path(file_path)
+            if not exists:
                 return f"Error: File not found: {file_path}"
             code_content = p.read_text(encoding="utf-8")
         else:
@@ -3225,13 +4765,14 @@ def explain_code(file_path: str = "", code: str = "", language: str = "python")
         prompt = f"Explain the following {language} code in plain English. Describe what it does, its inputs/outputs, and any notable patterns or issues.\n\n```{language}\n{code_content}\n```"
 
         # Call OpenAI API
-        response = openai.chat.completions.create(
+        explanation = _cached_chat_completion(
+            "explanations",
+            os.environ.get("OPENAI_API_KEY"),
             model="gpt-4-turbo-preview",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
             max_tokens=800,
         )
-        explanation = response.choices[0].message.content
         return f"## Code Explanation\n\n{explanation}"
     except Exception as e:
         return f"Error generating explanation: {str(e)}"
@@ -3257,14 +4798,10 @@ def translate_code(
         Translated code as a string.
     """
     try:
-        import openai
-
         # Read code from file if file_path provided
         if file_path:
-            from pathlib import Path
-
-            p = Path(file_path).expanduser().resolve()
-            if not p.exists():
+            p, exists = _resolve_path(file_path)
+            if not exists:
                 return f"Error: File not found: {file_path}"
             source_code_content = p.read_text(encoding="utf-8")
         else:
@@ -3279,19 +4816,18 @@ def translate_code(
         prompt = f"Translate the following code from {source_language if source_language else 'any language'} to {target_language}. Preserve functionality, naming conventions, and comments.\n\n```{source_language if source_language else ''}\n{source_code_content}\n```"
 
         # Call OpenAI API
-        response = openai.chat.completions.create(
+        translated = _cached_chat_completion(
+            "translations",
+            os.environ.get("OPENAI_API_KEY"),
             model="gpt-4-turbo-preview",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
             max_tokens=1500,
         )
-        translated = response.choices[0].message.content
         # Clean up possible markdown code fences
         if translated.startswith("```"):
             # Extract code between fences
-            import re
-
-            match = re.search(r"```(?:\w+)?\s*(.*?)\s*```", translated, re.DOTALL)
+            match = _CODE_FENCE_RE.search(translated)
             if match:
                 translated = match.group(1).strip()
         return f"## Translated Code to {target_language}\n\n```{target_language}\n{translated}\n```"
@@ -3299,8 +4835,63 @@ def translate_code(
         return f"Error translating code: {str(e)}"
 
 
+_PYPI_MAX_CONNECTIONS = 32
+
+
+def _pip_index_version(pkg: str) -> Optional[str]:
+    """Latest version of ``pkg`` according to ``pip index``, if available."""
+    try:
+        cmd = ["pip", "index", "versions", pkg, "--format", "json"]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            return json.loads(result.stdout).get("latest_version")
+    except Exception:
+        pass
+    return None
+
+
+async def _fetch_latest_versions(pkgs: List[str]) -> List[str]:
+    """
+    Latest released version of each package in ``pkgs`` ("unknown" if none).
+
+    All PyPI JSON API requests share one pooled client (HTTP/2 multiplexed
+    when the optional ``h2`` package is installed), so a scan pays for one
+    TLS handshake rather than one per package. ``pip index``, which honors
+    pip.conf and PIP_INDEX_URL, is used for packages PyPI could not be
+    reached for or did not answer with a release (e.g. a 404 for a package
+    on a private index).
+    """
+    limits = httpx.Limits(max_connections=_PYPI_MAX_CONNECTIONS)
+    async with httpx.AsyncClient(
+        http2=_spec_exists("h2"), limits=limits, timeout=5
+    ) as client:
+        responses = await asyncio.gather(
+            *(client.get(f"https://pypi.org/pypi/{pkg}/json") for pkg in pkgs),
+            return_exceptions=True,
+        )
+
+    versions: List[Optional[str]] = []
+    for resp in responses:
+        if isinstance(resp, BaseException) or resp.status_code != 200:
+            versions.append(None)
+        else:
+            try:
+                versions.append(resp.json()["info"]["version"])
+            except (ValueError, KeyError, TypeError):
+                versions.append(None)
+
+    missing = [i for i, version in enumerate(versions) if version is None]
+    if missing:
+        fallback = await asyncio.gather(
+            *(asyncio.to_thread(_pip_index_version, pkgs[i]) for i in missing)
+        )
+        for i, version in zip(missing, fallback):
+            versions[i] = version
+    return [version or "unknown" for version in versions]
+
+
 @mcp.tool()
-def suggest_dependency_upgrades(project_path: str = ".") -> str:
+async def suggest_dependency_upgrades(project_path: str = ".") -> str:
     """
     Check for outdated Python dependencies and suggest upgrades.
 
@@ -3311,12 +4902,8 @@ def suggest_dependency_upgrades(project_path: str = ".") -> str:
         Markdown table with current version, latest version, and upgrade recommendation.
     """
     try:
-        import json
-        import subprocess
-        from pathlib import Path
-
-        p = Path(project_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(project_path)
+        if not exists:
             return f"Error: Project path not found: {project_path}"
 
         # Find requirements.txt or pyproject.toml
@@ -3343,48 +4930,28 @@ def suggest_dependency_upgrades(project_path: str = ".") -> str:
                             dependencies.append((line.strip(), "latest"))
         elif pyproject_file.exists():
             # Parse pyproject.toml (very basic)
-            import tomli
-
-            with open(pyproject_file, "rb") as f:
-                data = tomli.load(f)
-                # Check [tool.poetry.dependencies] or [project.dependencies]
-                deps = data.get("tool", {}).get("poetry", {}).get("dependencies", {})
-                if not deps:
-                    deps = data.get("project", {}).get("dependencies", [])
-                # Convert to list of (pkg, version)
-                for pkg, spec in deps.items():
-                    if isinstance(spec, str):
-                        dependencies.append((pkg, spec))
-                    else:
-                        dependencies.append((pkg, str(spec)))
+            data = _load_pyproject(pyproject_file)
+            # Check [tool.poetry.dependencies] or [project.dependencies]
+            deps = data.get("tool", {}).get("poetry", {}).get("dependencies", {})
+            if not deps:
+                deps = data.get("project", {}).get("dependencies", [])
+            # Convert to list of (pkg, version)
+            for pkg, spec in deps.items():
+                if isinstance(spec, str):
+                    dependencies.append((pkg, spec))
+                else:
+                    dependencies.append((pkg, str(spec)))
         else:
             return "Error: No requirements.txt or pyproject.toml found."
 
         if not dependencies:
             return "No dependencies found."
 
-        # Check latest versions using pip index (or pypi API)
-        results = []
-        for pkg, current in dependencies:
-            try:
-                # Use pip index to get latest version
-                cmd = ["pip", "index", "versions", pkg, "--format", "json"]
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-                if result.returncode == 0:
-                    info = json.loads(result.stdout)
-                    latest = info.get("latest_version", "unknown")
-                else:
-                    # Fallback to pypi API
-                    import json as json_module
-                    import urllib.request
-
-                    url = f"https://pypi.org/pypi/{pkg}/json"
-                    with urllib.request.urlopen(url, timeout=5) as resp:
-                        data = json_module.load(resp)
-                        latest = data.get("info", {}).get("version", "unknown")
-            except Exception as e:
-                latest = "unknown"
+        # Look up latest versions concurrently; each lookup is network-bound
+        latest_versions = await _fetch_latest_versions([d[0] for d in dependencies])
 
+        results = []
+        for (pkg, current), latest in zip(dependencies, latest_versions):
             results.append(
                 {
                     "package": pkg,
@@ -3419,10 +4986,8 @@ def list_functions(file_path: str) -> str:
     Returns:
         Markdown list of definitions or error message.
     """
-    from pathlib import Path
-
-    p = Path(file_path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(file_path)
+    if not exists:
         return f"Error: File not found: {file_path}"
     suffix = p.suffix.lower()
 
@@ -3460,6 +5025,397 @@ def list_functions(file_path: str) -> str:
         return "No definitions found."
 
 
+_ROLLING_HASH_MOD = (1 << 61) - 1
+_ROLLING_HASH_BASE = 1_000_003
+
+
+def _line_hash(data) -> int:
+    """64-bit hash of one line given as bytes or any bytes-like buffer."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def _window_hashes(lines: List[str], window: int) -> List[int]:
+    """
+    Rabin-Karp hashes of every ``window``-line block of ``lines``.
+
+    Each line is hashed once; block hashes are then rolled forward in O(1)
+    per step, so the total cost is linear in the file size rather than in
+    ``len(lines) * window``. Equal hashes are candidates only and must be
+    confirmed against the actual text.
+    """
+    line_hashes = [_line_hash(line.encode("utf-8", "surrogatepass")) for line in lines]
+    return _rolling_window_hashes(line_hashes, window)
+
+
+def _rolling_window_hashes(line_hashes: List[int], window: int) -> List[int]:
+    """Roll per-line hashes into one hash per ``window``-line block."""
+    if window < 1 or len(line_hashes) < window:
+        return []
+    mod, base = _ROLLING_HASH_MOD, _ROLLING_HASH_BASE
+    top = pow(base, window - 1, mod)
+    h = 0
+    for lh in line_hashes[:window]:
+        h = (h * base + lh) % mod
+    hashes = [h]
+    for i in range(window, len(line_hashes)):
+        h = ((h - line_hashes[i - window] * top) * base + line_hashes[i]) % mod
+        hashes.append(h)
+    return hashes
+
+
+_DUPLICATE_SKIP_TOKENS = frozenset(
+    {
+        tokenize.COMMENT,
+        tokenize.NL,
+        tokenize.NEWLINE,
+        tokenize.INDENT,
+        tokenize.DEDENT,
+        tokenize.ENDMARKER,
+    }
+)
+
+
+def _split_raw_lines(data: bytes) -> List[bytes]:
+    """Split on ``\n`` (dropping a trailing ``\r``), as _mmap_line_hashes does."""
+    lines = data.split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    return [line[:-1] if line.endswith(b"\r") else line for line in lines]
+
+
+def _mmap_line_hashes(file: Path) -> List[int]:
+    """
+    Per-line hashes of ``file`` computed straight from a read-only mmap.
+
+    Lines are hashed through memoryview slices of the page cache, so the
+    file is neither copied into Python buffers nor decoded to ``str``.
+    Line splitting matches _split_raw_lines.
+    """
+    with open(file, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if not size:
+            return []
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            hashes = []
+            with memoryview(mm) as view:
+                start = 0
+                while start < size:
+                    end = mm.find(b"\n", start)
+                    if end == -1:
+                        end = size
+                    stop = end - 1 if end > start and mm[end - 1] == 0x0D else end
+                    hashes.append(_line_hash(view[start:stop]))
+                    start = end + 1
+            return hashes
+
+
+def _duplicate_scan_lines(
+    content: str, tokenize_python: bool
+) -> tuple[List[str], List[int]]:
+    """
+    Normalized lines of ``content`` as compared by detect_duplicate_code.
+
+    Each line is reduced to a canonical form and lines left empty are
+    skipped. Python sources (``tokenize_python``) are canonicalised from
+    their tokens, so comments and spacing around operators are ignored;
+    other files, or sources that fail to tokenize, just have runs of
+    whitespace collapsed. Returns the lines together with their 1-based
+    line numbers.
+    """
+    if tokenize_python:
+        rows: Dict[int, List[str]] = {}
+        try:
+            for tok in tokenize.generate_tokens(io.StringIO(content).readline):
+                if tok.type not in _DUPLICATE_SKIP_TOKENS:
+                    rows.setdefault(tok.start[0], []).append(tok.string)
+        except (tokenize.TokenError, SyntaxError):
+            pass
+        else:
+            numbers = sorted(rows)
+            return [" ".join(rows[n]) for n in numbers], numbers
+
+    lines: List[str] = []
+    numbers = []
+    for number, line in enumerate(content.splitlines(), 1):
+        canonical = " ".join(line.split())
+        if canonical:
+            lines.append(canonical)
+            numbers.append(number)
+    return lines, numbers
+
+
+# Tool, VCS and build directories that never hold sources worth scanning
+_WALK_IGNORE_DIRS = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        ".venv",
+        "venv",
+        "node_modules",
+        "__pycache__",
+        ".mypy_cache",
+        ".ruff_cache",
+        ".pytest_cache",
+        ".tox",
+        "dist",
+        "build",
+    }
+)
+
+
+def _iter_matching_files(root: Path, pattern: str):
+    """
+    Yield files below ``root`` whose name matches the glob ``pattern``.
+
+    An ``os.scandir`` walk that prunes _WALK_IGNORE_DIRS before descending
+    and answers file/directory checks from the cached directory entries,
+    so ignored trees cost no stat calls at all. Symlinked directories are
+    not followed. Patterns containing a path separator go through rglob.
+    """
+    if "/" in pattern or os.sep in pattern:
+        yield from (f for f in root.rglob(pattern) if f.is_file())
+        return
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in _WALK_IGNORE_DIRS:
+                    stack.append(entry.path)
+            elif fnmatch.fnmatch(entry.name, pattern) and entry.is_file():
+                yield Path(entry.path)
+
+
+def _read_duplicate_scan_lines(file: Path, normalize: bool) -> tuple[list, List[int]]:
+    if not normalize:
+        lines = _split_raw_lines(file.read_bytes())
+        return lines, list(range(1, len(lines) + 1))
+    content = file.read_text(encoding="utf-8", errors="replace")
+    return _duplicate_scan_lines(content, file.suffix == ".py")
+
+
+def _hash_file(args: tuple[Path, int, bool]) -> List[tuple[int, Path, int]]:
+    """
+    Window hashes of one file as ``(hash, path, window index)`` tuples.
+
+    Module level so detect_duplicate_code can run it in worker processes.
+    Unreadable files yield no windows.
+    """
+    file, min_lines, normalize = args
+    try:
+        if normalize:
+            lines, _ = _read_duplicate_scan_lines(file, normalize)
+            hashes = _window_hashes(lines, min_lines)
+        else:
+            # Raw bytes are all that is compared; skip reading into str
+            hashes = _rolling_window_hashes(_mmap_line_hashes(file), min_lines)
+    except Exception:
+        return []
+    return [(h, file, i) for i, h in enumerate(hashes)]
+
+
+# Files whose reads are queued with the kernel at once; large enough to keep
+# the disk busy, small enough that early files are not evicted before use
+_PREFETCH_BATCH = 64
+
+
+def _prefetch_files(files: List[Path]) -> None:
+    """
+    Queue asynchronous readahead of ``files`` (POSIX_FADV_WILLNEED).
+
+    The kernel starts reading every file in the batch concurrently, so by
+    the time a file is hashed its pages are usually in the page cache. A
+    no-op where posix_fadvise is unavailable.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for file in files:
+        try:
+            fd = os.open(file, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+# Files read per _bulk_read_files call, and the threads doing the reads
+_BULK_READ_BATCH = 256
+_BULK_READ_WORKERS = 16
+
+
+def _bulk_read_files(files: List[Path]) -> Dict[Path, bytes]:
+    """
+    Contents of ``files``, read concurrently; unreadable files are left out.
+
+    Blocking reads release the GIL, so a small thread pool keeps many reads
+    in flight at once instead of paying each file's latency in turn.
+    """
+
+    def read(file: Path) -> tuple[Path, Optional[bytes]]:
+        try:
+            return file, file.read_bytes()
+        except OSError:
+            return file, None
+
+    if len(files) < 2:
+        pairs = map(read, files)
+    else:
+        with ThreadPoolExecutor(
+            max_workers=min(_BULK_READ_WORKERS, len(files))
+        ) as executor:
+            pairs = list(executor.map(read, files))
+    return {file: data for file, data in pairs if data is not None}
+
+
+# Below either threshold worker start-up and IPC cost more than hashing
+_DUPLICATE_PARALLEL_MIN_FILES = 32
+_DUPLICATE_PARALLEL_MIN_BYTES = 2 << 20
+
+# Process pool reused across detect_duplicate_code calls, as (workers, pool)
+_DUPLICATE_POOL: Optional[tuple[int, ProcessPoolExecutor]] = None
+_DUPLICATE_POOL_LOCK = threading.Lock()
+
+
+def _duplicate_pool(n_workers: int) -> ProcessPoolExecutor:
+    """
+    The shared hashing pool, recreated when a different size is requested.
+
+    Workers come from a forkserver (spawn where that is unavailable), since
+    forking this multi-threaded server could copy locks held by other threads.
+    """
+    global _DUPLICATE_POOL
+    with _DUPLICATE_POOL_LOCK:
+        if _DUPLICATE_POOL is not None and _DUPLICATE_POOL[0] != n_workers:
+            _DUPLICATE_POOL[1].shutdown(wait=False, cancel_futures=True)
+            _DUPLICATE_POOL = None
+        if _DUPLICATE_POOL is None:
+            import multiprocessing
+
+            method = (
+                "forkserver"
+                if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn"
+            )
+            _DUPLICATE_POOL = (
+                n_workers,
+                ProcessPoolExecutor(
+                    max_workers=n_workers,
+                    mp_context=multiprocessing.get_context(method),
+                ),
+            )
+        return _DUPLICATE_POOL[1]
+
+
+def _discard_duplicate_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop ``pool`` after it broke, so the next call starts a fresh one."""
+    global _DUPLICATE_POOL
+    with _DUPLICATE_POOL_LOCK:
+        if _DUPLICATE_POOL is not None and _DUPLICATE_POOL[1] is pool:
+            _DUPLICATE_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def _shutdown_duplicate_pool() -> None:
+    if _DUPLICATE_POOL is not None:
+        _DUPLICATE_POOL[1].shutdown(wait=False, cancel_futures=True)
+
+
+def _hash_files(batch: List[tuple[Path, int, bool]]) -> List[tuple[int, Path, int]]:
+    """_hash_file over a batch of jobs, with the batch's reads prefetched."""
+    _prefetch_files([job[0] for job in batch])
+    results = []
+    for job in batch:
+        results.extend(_hash_file(job))
+    return results
+
+
+def _find_duplicate_blocks(
+    files: List[Path],
+    min_lines: int,
+    normalize: bool,
+    parallel: bool = False,
+    workers: Optional[int] = None,
+) -> tuple[List[tuple[int, List[tuple[Path, int]]]], Optional[int]]:
+    """
+    Duplicate ``min_lines`` blocks across ``files`` as (hash, locations) pairs.
+
+    Also returns the worker count chosen for parallel hashing, or None when
+    parallel hashing was not attempted. Scans of fewer than
+    _DUPLICATE_PARALLEL_MIN_FILES files or _DUPLICATE_PARALLEL_MIN_BYTES
+    bytes stay in this process.
+    """
+    # Map hash -> list of (file, window index)
+    hash_map = defaultdict(list)
+
+    jobs = [(file, min_lines, normalize) for file in files]
+    results = None
+    n_workers = None
+    if parallel and len(files) >= _DUPLICATE_PARALLEL_MIN_FILES:
+        total_bytes = 0
+        for file in files:
+            with contextlib.suppress(OSError):
+                total_bytes += file.stat().st_size
+        if total_bytes >= _DUPLICATE_PARALLEL_MIN_BYTES:
+            n_workers = min(
+                workers if workers is not None else os.cpu_count() or 1, len(files)
+            )
+    if n_workers is not None and n_workers < 2:
+        # One worker only adds IPC to the same serial work
+        n_workers = None
+    if n_workers is not None:
+        # Hashing is CPU-bound, so use processes rather than threads to get
+        # around the GIL; batching amortises the per-task IPC overhead.
+        size = min(_PREFETCH_BATCH, -(-len(jobs) // n_workers))
+        batches = [jobs[i : i + size] for i in range(0, len(jobs), size)]
+        pool = None
+        try:
+            pool = _duplicate_pool(n_workers)
+            results = list(pool.map(_hash_files, batches))
+        except (OSError, BrokenProcessPool):
+            if pool is not None:
+                _discard_duplicate_pool(pool)
+            results = None  # Fall back to hashing in this process
+    if results is None:
+        batches = [
+            jobs[i : i + _PREFETCH_BATCH] for i in range(0, len(jobs), _PREFETCH_BATCH)
+        ]
+        results = map(_hash_files, batches)
+    for local_map in results:
+        for block_hash, file, index in local_map:
+            hash_map[block_hash].append((file, index))
+
+    # Confirm candidate buckets against the actual text so that a rolling
+    # hash collision never reports unrelated blocks as duplicates.
+    file_lines: Dict[Path, tuple[List[str], List[int]]] = {}
+    duplicates = []
+    for h, locs in hash_map.items():
+        if len(locs) < 2:
+            continue
+        blocks = defaultdict(list)
+        for file, index in locs:
+            if file not in file_lines:
+                try:
+                    file_lines[file] = _read_duplicate_scan_lines(file, normalize)
+                except OSError:
+                    file_lines[file] = ([], [])
+            lines, numbers = file_lines[file]
+            block = tuple(lines[index : index + min_lines])
+            if len(block) == min_lines:
+                blocks[block].append((file, numbers[index]))
+        duplicates.extend((h, same) for same in blocks.values() if len(same) > 1)
+    return duplicates, n_workers
+
+
 @mcp.tool()
 def detect_duplicate_code(
     folder_path: str,
@@ -3467,6 +5423,7 @@ def detect_duplicate_code(
     min_lines: int = 5,
     parallel: bool = True,
     workers: Optional[int] = None,
+    normalize: bool = True,
 ) -> str:
     """
     Detect duplicate code blocks within Python files in a directory.
@@ -3475,66 +5432,30 @@ def detect_duplicate_code(
         folder_path: Directory to scan.
         file_pattern: File pattern to match (default "*.py").
         min_lines: Minimum number of lines in a block to consider (default 5).
-        parallel: If True, process files in parallel using multiple workers.
-        workers: Number of worker threads (default: number of CPU cores).
-                 Ignored if parallel is False.
+        parallel: If True, hash files in parallel using worker processes.
+                  Small scans are hashed in-process regardless.
+        workers: Number of worker processes (default: number of CPU cores,
+                 capped at the number of files). Ignored if parallel is False.
+        normalize: If True, ignore comments, blank lines and whitespace
+                   differences so reformatted copies are still reported.
 
     Returns:
         Markdown report of duplicate blocks.
     """
-    import hashlib
-    import os
-    from collections import defaultdict
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    from pathlib import Path
-    from typing import Optional
-
     p = Path(folder_path).expanduser().resolve()
     if not p.exists() or not p.is_dir():
         return f"Error: Invalid directory: {folder_path}"
+    if min_lines < 1:
+        return "Error: min_lines must be at least 1."
 
     # Collect all Python files
-    files = list(p.rglob(file_pattern))
+    files = sorted(_iter_matching_files(p, file_pattern))
     if not files:
         return f"No files matching '{file_pattern}' found."
 
-    # Map hash -> list of (file, line_start)
-    hash_map = defaultdict(list)
-
-    def process_file(file: Path):
-        local_map = []
-        try:
-            content = file.read_text(encoding="utf-8", errors="replace")
-            lines = content.splitlines()
-            for i in range(len(lines) - min_lines + 1):
-                block = "\n".join(lines[i : i + min_lines])
-                block_hash = hashlib.sha256(block.encode()).hexdigest()
-                local_map.append((block_hash, file, i + 1))
-        except Exception as e:
-            # Skip files with errors
-            pass
-        return local_map
-
-    if not parallel or len(files) == 1:
-        # Sequential processing
-        for file in files:
-            local_map = process_file(file)
-            for block_hash, file, line_start in local_map:
-                hash_map[block_hash].append((file, line_start))
-    else:
-        # Parallel processing
-        n_workers = workers if workers is not None else os.cpu_count() or 4
-        with ThreadPoolExecutor(max_workers=n_workers) as executor:
-            future_to_file = {
-                executor.submit(process_file, file): file for file in files
-            }
-            for future in as_completed(future_to_file):
-                local_map = future.result()
-                for block_hash, file, line_start in local_map:
-                    hash_map[block_hash].append((file, line_start))
-
-    # Filter duplicates (hash with more than one occurrence)
-    duplicates = {h: locs for h, locs in hash_map.items() if len(locs) > 1}
+    duplicates, n_workers = _find_duplicate_blocks(
+        files, min_lines, normalize, parallel, workers
+    )
     if not duplicates:
         return "No duplicate code blocks found."
 
@@ -3543,15 +5464,14 @@ def detect_duplicate_code(
         "# Duplicate Code Detection Report",
         f"Directory: {folder_path}",
         f"Min lines: {min_lines}",
+        f"Normalized: {'yes' if normalize else 'no'}",
         "",
     ]
-    if parallel:
-        report.append(
-            f"Parallel execution with {n_workers if 'n_workers' in locals() else 'default'} workers."
-        )
-    for i, (h, locs) in enumerate(duplicates.items(), 1):
+    if n_workers is not None:
+        report.append(f"Parallel execution with {n_workers} workers.")
+    for i, (h, locs) in enumerate(duplicates, 1):
         report.append(f"## Duplicate block {i}")
-        report.append(f"Hash: {h[:16]}...")
+        report.append(f"Hash: {h:016x}...")
         report.append("Locations:")
         for file, line in locs:
             report.append(f"- `{file.relative_to(p)}` line {line}")
@@ -3571,18 +5491,14 @@ def generate_api_docs(file_path: str) -> str:
     Returns:
         Markdown documentation.
     """
-    import ast
-    from pathlib import Path
-
-    p = Path(file_path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(file_path)
+    if not exists:
         return f"Error: File not found: {file_path}"
     if p.suffix != ".py":
         return "Error: Only Python files are supported."
 
     try:
-        content = p.read_text(encoding="utf-8")
-        tree = ast.parse(content)
+        _, tree = _get_tree(p)
     except Exception as e:
         return f"Error parsing file: {e}"
 
@@ -3638,49 +5554,76 @@ def extract_variable(
         Success message or error description.
     """
     try:
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         if p.suffix != ".py":
             return "Error: Only Python files are supported."
 
-        content = p.read_text(encoding="utf-8")
-        lines = content.splitlines()
-
-        if start_line < 1 or end_line > len(lines) or start_line > end_line:
-            return f"Error: Invalid line numbers. File has {len(lines)} lines."
-
-        # Extract block
-        block_lines = lines[start_line - 1 : end_line]
-        if not block_lines:
-            return "Error: Empty code block."
-
-        # Determine indentation
-        indent = _detect_indent(block_lines)
-        # Remove common indentation from block lines to get expression
-        dedented_lines = []
-        for line in block_lines:
-            if line.strip():
-                dedented_lines.append(line[indent:])
-            else:
-                dedented_lines.append("")
-
-        expression = "\n".join(dedented_lines).rstrip()
-        if not expression:
-            return "Error: Expression is empty after dedenting."
+        # Only the selected lines are decoded; the rest of the file is copied
+        # through as bytes straight from a read-only mapping
+        with open(p, "rb") as fh:
+            st = os.fstat(fh.fileno())
+            if not st.st_size:
+                return "Error: Invalid line numbers. File has 0 lines."
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                offsets = _line_offsets(mm, max(end_line, 0))
+                n_lines = len(offsets) - 1
+                if start_line < 1 or end_line > n_lines or start_line > end_line:
+                    return f"Error: Invalid line numbers. File has {n_lines} lines."
+
+                # Extract block
+                start_off, end_off = offsets[start_line - 1], offsets[end_line]
+                block = mm[start_off:end_off].decode("utf-8")
+                block_lines = block.splitlines()
+                if not block_lines:
+                    return "Error: Empty code block."
+
+                # Determine indentation
+                indent = _detect_indent(block_lines)
+                # Remove common indentation from block lines to get expression
+                dedented_lines = []
+                for line in block_lines:
+                    if line.strip():
+                        dedented_lines.append(line[indent:])
+                    else:
+                        dedented_lines.append("")
 
-        # Build assignment
-        if type_hint:
-            assignment = f"{variable_name}: {type_hint} = {expression}"
-        else:
-            assignment = f"{variable_name} = {expression}"
+                expression = "\n".join(dedented_lines).rstrip()
+                if not expression:
+                    return "Error: Expression is empty after dedenting."
 
-        # Apply changes: replace block with assignment, keep original indentation
-        new_lines = lines[: start_line - 1] + [assignment] + lines[end_line:]
-        new_content = "\n".join(new_lines)
-        p.write_text(new_content, encoding="utf-8")
+                # Build assignment
+                if type_hint:
+                    assignment = f"{variable_name}: {type_hint} = {expression}"
+                else:
+                    assignment = f"{variable_name} = {expression}"
+
+                # Apply changes: replace block with assignment, keep original
+                # indentation and the block's line ending
+                leading = next(line for line in block_lines if line.strip())[:indent]
+                ending = next((nl for nl in ("\r\n", "\n") if block.endswith(nl)), "")
+
+                # Refuse to overwrite an edit made since the file was read
+                current = os.stat(p)
+                if (current.st_ino, current.st_mtime_ns, current.st_size) != (
+                    st.st_ino,
+                    st.st_mtime_ns,
+                    st.st_size,
+                ):
+                    return "Error: File changed while extracting; please retry."
+                view = memoryview(mm)
+                try:
+                    _atomic_write_bytes(
+                        p,
+                        [
+                            view[:start_off],
+                            (leading + assignment + ending).encode("utf-8"),
+                            view[end_off:],
+                        ],
+                    )
+                finally:
+                    view.release()
 
         return f"Successfully extracted lines {start_line}-{end_line} into variable {variable_name}."
     except SyntaxError as e:
@@ -3689,158 +5632,575 @@ def extract_variable(
         return f"Error extracting variable: {str(e)}"
 
 
+# (project, file pattern, symbols, max results) -> (tree signature, report)
+_REFERENCE_CACHE: Dict[tuple[str, str, tuple[str, ...], int], tuple[str, str]] = {}
+_REFERENCE_CACHE_MAX = 128
+
+
+def _tree_signature(root: Path, pattern: str) -> str:
+    """Digest of path, size and mtime of every file matching ``pattern``."""
+    h = hashlib.blake2b(digest_size=16)
+    for file in sorted(_iter_matching_files(root, pattern)):
+        try:
+            st = file.stat()
+        except OSError:
+            continue
+        h.update(
+            f"{file}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8", "surrogatepass")
+        )
+    return h.hexdigest()
+
+
+# Python symbol indexes keyed by project root; see _load_symbol_index
+_SYMBOL_INDEXES: Dict[str, Dict[str, Any]] = {}
+# Serializes loading, updating and saving each root's index across threads
+_SYMBOL_INDEX_LOCKS: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+_SYMBOL_INDEX_LOCKS_LOCK = threading.Lock()
+_SYMBOL_INDEX_DIR = USER_CACHE_DIR / "symbols"
+_SYMBOL_INDEX_VERSION = 3
+
+
+_OCCURRENCE_NODE_TYPES = frozenset(
+    {
+        ast.Name,
+        ast.Attribute,
+        ast.FunctionDef,
+        ast.AsyncFunctionDef,
+        ast.ClassDef,
+        ast.arg,
+        ast.alias,
+    }
+)
+
+
+def _symbol_occurrences(tree: ast.Module) -> List[tuple[str, int, str]]:
+    """Every identifier in a module as ``(name, line number, node kind)``."""
+    occurrences = []
+    append = occurrences.append
+    # Most nodes are skipped after one set lookup on their exact type; the
+    # rest are told apart with identity checks against local names
+    Name, Attribute, FunctionDef, AsyncFunctionDef, ClassDef, arg = (
+        ast.Name,
+        ast.Attribute,
+        ast.FunctionDef,
+        ast.AsyncFunctionDef,
+        ast.ClassDef,
+        ast.arg,
+    )
+    wanted = _OCCURRENCE_NODE_TYPES
+    for node in ast.walk(tree):
+        node_type = type(node)
+        if node_type not in wanted:
+            continue
+        if node_type is Name:
+            append((node.id, node.lineno, "name"))
+        elif node_type is Attribute:
+            # The attribute name sits at the end of a possibly multi-line chain
+            append((node.attr, node.end_lineno or node.lineno, "attribute"))
+        elif node_type is FunctionDef or node_type is AsyncFunctionDef:
+            append((node.name, node.lineno, "function"))
+        elif node_type is ClassDef:
+            append((node.name, node.lineno, "class"))
+        elif node_type is arg:
+            append((node.arg, node.lineno, "name"))
+        else:
+            name = node.asname or node.name.split(".")[0]
+            append((name, node.lineno, "import"))
+    return occurrences
+
+
+@functools.lru_cache(maxsize=1)
+def _tree_sitter_python_parser() -> Any:
+    """A tree-sitter parser for Python, or None if the bindings are missing."""
+    try:
+        import tree_sitter_python
+        from tree_sitter import Language, Parser
+    except ImportError:
+        return None
+    return Parser(Language(tree_sitter_python.language()))
+
+
+_TREE_SITTER_IMPORTS = frozenset(
+    {"import_statement", "import_from_statement", "future_import_statement"}
+)
+
+
+def _tree_sitter_occurrences(source: bytes) -> List[tuple[str, int, str]]:
+    """
+    _symbol_occurrences for source that ``ast`` cannot parse.
+
+    tree-sitter recovers from syntax errors, so a file in the middle of an
+    edit still contributes its identifiers instead of dropping out of the
+    index. Returns nothing when tree-sitter is not installed.
+    """
+    parser = _tree_sitter_python_parser()
+    if parser is None:
+        return []
+    occurrences = []
+    stack = [(parser.parse(source).root_node, False)]
+    while stack:
+        node, in_import = stack.pop()
+        if node.type == "identifier":
+            parent = node.parent
+            if in_import:
+                kind = "import"
+            elif parent.type == "function_definition" and node == (
+                parent.child_by_field_name("name")
+            ):
+                kind = "function"
+            elif parent.type == "class_definition" and node == (
+                parent.child_by_field_name("name")
+            ):
+                kind = "class"
+            elif parent.type == "attribute" and node == (
+                parent.child_by_field_name("attribute")
+            ):
+                kind = "attribute"
+            else:
+                kind = "name"
+            name = node.text.decode("utf-8", errors="replace")
+            occurrences.append((name, node.start_point[0] + 1, kind))
+            continue
+        in_import = in_import or node.type in _TREE_SITTER_IMPORTS
+        stack.extend((child, in_import) for child in node.children)
+    return occurrences
+
+
+def _load_symbol_index(root: Path) -> Dict[str, Any]:
+    """
+    Inverted index of identifiers in every *.py file under ``root``.
+
+    The index is kept in memory and saved as JSON under USER_CACHE_DIR; on
+    each call only files whose (mtime_ns, size) changed are re-parsed.
+    Concurrent calls for the same root (tools run in worker threads) take
+    turns, so none sees the index mid-update.
+    """
+    key = str(root)
+    with _SYMBOL_INDEX_LOCKS_LOCK:
+        lock = _SYMBOL_INDEX_LOCKS[key]
+    with lock:
+        return _update_symbol_index(key)
+
+
+def _update_symbol_index(key: str) -> Dict[str, Any]:
+    """_load_symbol_index for the root ``key``, with its lock held."""
+    root = Path(key)
+    cache_path = (
+        _SYMBOL_INDEX_DIR / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+    )
+    index = _SYMBOL_INDEXES.get(key)
+    if index is None:
+        try:
+            data = json.loads(cache_path.read_text(encoding="utf-8"))
+            if data.get("version") != _SYMBOL_INDEX_VERSION:
+                raise ValueError("stale symbol index")
+            # JSON has no tuples; restore the shapes the lookups compare against
+            index = {
+                "version": _SYMBOL_INDEX_VERSION,
+                "files": {
+                    path: (mtime_ns, size, [tuple(o) for o in occurrences])
+                    for path, (mtime_ns, size, occurrences) in data["files"].items()
+                },
+            }
+        except Exception:
+            # Missing, unreadable or outdated index; build from scratch
+            index = {"version": _SYMBOL_INDEX_VERSION, "files": {}}
+        index["symbols"] = None
+
+    files = index["files"]
+    seen = set()
+    stale = []
+    for file in _iter_matching_files(root, "*.py"):
+        path = str(file)
+        seen.add(path)
+        try:
+            st = file.stat()
+        except OSError:
+            continue
+        entry = files.get(path)
+        if entry is None or entry[:2] != (st.st_mtime_ns, st.st_size):
+            stale.append((file, st))
+    changed = bool(stale)
+    for start in range(0, len(stale), _BULK_READ_BATCH):
+        batch = stale[start : start + _BULK_READ_BATCH]
+        contents = _bulk_read_files([file for file, _ in batch])
+        for file, st in batch:
+            source = contents.get(file, b"")
+            try:
+                content = source.decode("utf-8", errors="replace")
+                occurrences = _symbol_occurrences(_parse_with_disk_cache(content))
+            except (SyntaxError, ValueError):
+                occurrences = _tree_sitter_occurrences(source)
+            files[str(file)] = (st.st_mtime_ns, st.st_size, occurrences)
+    for path in [path for path in files if path not in seen]:
+        del files[path]
+        changed = True
+
+    if changed or index["symbols"] is None:
+        symbols: Dict[str, List[tuple[str, int, str]]] = defaultdict(list)
+        for path, (_, _, occurrences) in files.items():
+            for name, lineno, kind in occurrences:
+                symbols[name].append((path, lineno, kind))
+        index["symbols"] = dict(symbols)
+    if changed:
+        try:
+            _SYMBOL_INDEX_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+            data = json.dumps({"version": _SYMBOL_INDEX_VERSION, "files": files})
+            _atomic_write_bytes(cache_path, [data.encode("utf-8")])
+        except OSError:
+            pass
+    _SYMBOL_INDEXES[key] = index
+    return index
+
+
+def _indexed_references(
+    root: Path, symbols: List[str], symbol_type: str
+) -> Dict[str, List[tuple[str, int, str]]]:
+    """References to Python symbols from the index, one entry per source line."""
+    index = _load_symbol_index(root)["symbols"]
+    lines_by_file: Dict[str, List[str]] = {}
+    references = {}
+    for symbol in symbols:
+        occurrences = index.get(symbol, [])
+        if symbol_type in ("function", "class"):
+            # Uses of a name only count when it is defined as that kind somewhere
+            if not any(kind == symbol_type for _, _, kind in occurrences):
+                occurrences = []
+        elif symbol_type == "variable":
+            occurrences = [o for o in occurrences if o[2] in ("name", "attribute")]
+
+        matches = []
+        for path, lineno in sorted({(path, lineno) for path, lineno, _ in occurrences}):
+            lines = lines_by_file.get(path)
+            if lines is None:
+                try:
+                    lines = Path(path).read_text(encoding="utf-8", errors="replace")
+                    lines = lines_by_file[path] = lines.splitlines()
+                except OSError:
+                    lines = lines_by_file[path] = []
+            if 0 < lineno <= len(lines):
+                matches.append((path, lineno, lines[lineno - 1]))
+        references[symbol] = matches
+    return references
+
+
+async def _search_symbol(
+    root: Path, symbols: List[str], pattern: str, max_results: int
+) -> List[tuple[str, int, str]]:
+    """
+    Lines containing any of ``symbols`` as a whole word, as ``(file, line number, line)``.
+
+    Uses ripgrep's JSON output when ``rg`` is installed (multi-threaded and
+    .gitignore-aware, and immune to colons in paths); falls back to grep.
+    Several symbols are passed as one ``-e`` list, so both tools match them
+    all in a single multi-literal pass over each file. Output is consumed as
+    it is produced and the search is stopped once ``max_results`` matches
+    have been read. Raises FileNotFoundError if neither tool is available.
+
+    _WALK_IGNORE_DIRS are excluded, as in _iter_matching_files, so that the
+    files searched are all covered by _tree_signature.
+    """
+    patterns = [arg for symbol in symbols for arg in ("-e", symbol)]
+    ignored = sorted(_WALK_IGNORE_DIRS)
+    if shutil.which("rg"):
+        cmd = [
+            "rg",
+            "--json",
+            "-n",
+            "-w",
+            "-F",
+            "--glob",
+            pattern,
+            *[arg for name in ignored for arg in ("--glob", f"!{name}/")],
+            *patterns,
+            "--",
+            str(root),
+        ]
+
+        def parse(line: str) -> Optional[tuple[str, int, str]]:
+            event = json.loads(line)
+            if event.get("type") != "match":
+                return None
+            data = event["data"]
+            file = data["path"].get("text")
+            text = data["lines"].get("text")
+            if file is None or text is None:
+                return None  # Non-UTF-8 path or content
+            return file, data["line_number"], text
+
+    else:
+        # grep output format: file:line:content
+        cmd = [
+            "grep",
+            "-n",
+            "-r",
+            "-w",
+            "-F",
+            "--include=" + pattern,
+            *[f"--exclude-dir={name}" for name in ignored],
+            *patterns,
+            "--",
+            str(root),
+        ]
+
+        def parse(line: str) -> Optional[tuple[str, int, str]]:
+            parts = line.rstrip("\n").split(":", 2)
+            if len(parts) >= 3 and parts[1].isdigit():
+                return parts[0], int(parts[1]), parts[2]
+            return None
+
+    matches = []
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        async for raw in proc.stdout:
+            match = parse(raw.decode("utf-8", errors="replace"))
+            if match is not None:
+                matches.append(match)
+                if len(matches) >= max_results:
+                    break
+    finally:
+        if proc.returncode is None:
+            with contextlib.suppress(ProcessLookupError):
+                proc.terminate()
+        await proc.wait()
+    return matches
+
+
+def _format_references(
+    symbol: str, matches: List[tuple[str, int, str]], max_results: int
+) -> str:
+    """Render ``(file, line number, line)`` matches as the find_references report."""
+    if not matches:
+        return f"No references found for symbol '{symbol}'."
+    refs = [
+        f"- `{file}` line {lineno}: `{content.strip()}`"
+        for file, lineno, content in matches[:max_results]
+    ]
+    if len(matches) > max_results:
+        refs.append(
+            f"\nShowing the first {max_results} references; raise max_results for more."
+        )
+    return "## References found:\n\n" + "\n".join(refs)
+
+
+def _format_reference_groups(
+    references: Dict[str, List[tuple[str, int, str]]], max_results: int
+) -> str:
+    """_format_references for each symbol, under a heading when there are several."""
+    if len(references) == 1:
+        ((symbol, matches),) = references.items()
+        return _format_references(symbol, matches, max_results)
+    return "\n\n".join(
+        f"# `{symbol}`\n\n{_format_references(symbol, matches, max_results)}"
+        for symbol, matches in references.items()
+    )
+
+
 @mcp.tool()
-def find_references(
+async def find_references(
     project_path: str,
-    symbol: str,
+    symbol: Union[str, List[str]],
     symbol_type: str = "any",
     file_pattern: str = "*.py",
+    max_results: int = 500,
 ) -> str:
     """
     Find references to a symbol in a project.
 
     Args:
         project_path: Root directory of the project.
-        symbol: Symbol name to search for.
+        symbol: Symbol name, or list of names, to search for. A list is
+                answered in one pass and reported per symbol.
         symbol_type: Type of symbol ('function', 'class', 'variable', 'any').
         file_pattern: File pattern to search (default "*.py").
+        max_results: Maximum number of references to list (default 500).
 
     Returns:
         Markdown list of references with file paths and line numbers.
     """
     try:
-        import fnmatch
-        import subprocess
-        from pathlib import Path
-
-        p = Path(project_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(project_path)
+        if not exists:
             return f"Error: Project path not found: {project_path}"
         if not p.is_dir():
             return f"Error: Project path is not a directory: {project_path}"
+        if max_results < 1:
+            return "Error: max_results must be at least 1."
+        symbols = [symbol] if isinstance(symbol, str) else list(dict.fromkeys(symbol))
+        if not symbols or not all(symbols):
+            return "Error: No symbol given."
+
+        if file_pattern == "*.py":
+            references = await asyncio.to_thread(
+                _indexed_references, p, symbols, symbol_type
+            )
+            return _format_reference_groups(references, max_results)
+
+        # Other file types: reuse the previous answer while no matching file has changed
+        cache_key = (str(p), file_pattern, tuple(symbols), max_results)
+        signature = await asyncio.to_thread(_tree_signature, p, file_pattern)
+        cached = _REFERENCE_CACHE.get(cache_key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        # One extra match tells whether the list was cut short
+        matches = await _search_symbol(p, symbols, file_pattern, max_results + 1)
+        if len(symbols) == 1:
+            references = {symbols[0]: matches}
+        else:
+            # Attribute each matched line to the symbols it contains
+            word = re.compile(
+                r"(?<!\w)(?:"
+                + "|".join(map(re.escape, sorted(symbols, key=len, reverse=True)))
+                + r")(?!\w)"
+            )
+            references = {name: [] for name in symbols}
+            for match in matches[:max_results]:
+                for name in dict.fromkeys(word.findall(match[2])):
+                    references[name].append(match)
+        report = _format_reference_groups(references, max_results)
+        if len(symbols) > 1 and len(matches) > max_results:
+            report += f"\n\nSearch stopped after {max_results} matching lines; raise max_results for more."
+
+        if len(_REFERENCE_CACHE) >= _REFERENCE_CACHE_MAX:
+            _REFERENCE_CACHE.pop(next(iter(_REFERENCE_CACHE)))
+        _REFERENCE_CACHE[cache_key] = (signature, report)
+        return report
+    except FileNotFoundError:
+        return "Error: Neither rg nor grep found. This tool requires ripgrep or grep installed."
+    except Exception as e:
+        return f"Error finding references: {str(e)}"
 
-        # Use grep to search for symbol with word boundaries
-        cmd = [
-            "grep",
-            "-n",
-            "-r",
-            "--include=" + file_pattern,
-            "-w",
-            symbol,
-            str(p),
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        lines = result.stdout.strip().split("\n")
-        if not lines or lines[0] == "":
-            return f"No references found for symbol '{symbol}'."
 
-        # Format results
-        refs = []
-        for line in lines:
-            # grep output format: file:line:content
-            parts = line.split(":", 2)
-            if len(parts) >= 3:
-                file, lineno, content = parts
-                refs.append(f"- `{file}` line {lineno}: `{content.strip()}`")
+# Check/fix commands per linter, in the order fixes are applied (isort, then
+# black, then ruff); all of them accept many paths in one run.
+# --force-exclude keeps ruff's configured excludes in effect for explicit paths.
+_LINTER_COMMANDS = {
+    "isort": (["isort"], ["isort", "--check"]),
+    "black": (["black"], ["black", "--check"]),
+    "ruff": (
+        ["ruff", "check", "--force-exclude", "--fix"],
+        ["ruff", "check", "--force-exclude"],
+    ),
+}
+
+
+def _server_unfixed_paths(paths: List[str]) -> List[str]:
+    """Fix .py files through the warm ruff server; return the paths it left."""
+    return [
+        path
+        for path in paths
+        if not (path.endswith(".py") and _RUFF_SERVER.fix_file(Path(path)))
+    ]
+
 
-        return "## References found:\n\n" + "\n".join(refs)
+async def _run_linter(
+    linter: str, paths: List[str], apply_fix: bool, target: str
+) -> str:
+    """Run one linter over ``paths`` and summarize the outcome."""
+    fix_cmd, check_cmd = _LINTER_COMMANDS[linter]
+    base = fix_cmd if apply_fix else check_cmd
+    if linter == "ruff" and apply_fix:
+        # Clean files are finished by the warm ruff server; directories and
+        # files with remaining issues go to the CLI, which reports them
+        paths = await asyncio.to_thread(_server_unfixed_paths, paths)
+
+    results = []
+    try:
+        for start in range(0, len(paths), _FORMAT_BATCH_SIZE):
+            proc = await asyncio.create_subprocess_exec(
+                *base,
+                *paths[start : start + _FORMAT_BATCH_SIZE],
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await proc.communicate()
+            results.append((proc.returncode, stdout + stderr))
     except FileNotFoundError:
-        return "Error: grep command not found. This tool requires grep installed."
-    except Exception as e:
-        return f"Error finding references: {str(e)}"
+        return f"Error: Linter '{linter}' not installed. Please install it (pip install {linter})."
+    if all(returncode == 0 for returncode, _ in results):
+        if apply_fix:
+            return f"Successfully applied {linter} fixes to {target}."
+        else:
+            return f"No issues found by {linter} (check passed)."
+    else:
+        # Some linters return non-zero when issues are found (even after fixing)
+        output = b"".join(out for _, out in results).decode("utf-8", errors="replace")
+        if apply_fix:
+            # Ruff may have fixed some issues, but others remain
+            return f"{linter} completed with output:\n{output}"
+        else:
+            return f"{linter} found issues:\n{output}"
 
 
 @mcp.tool()
-def auto_fix_lint_issues(
-    file_path: str,
-    linter: str = "ruff",
+async def auto_fix_lint_issues(
+    file_path: Union[str, List[str]],
+    linter: Union[str, List[str]] = "ruff",
     apply_fix: bool = True,
 ) -> str:
     """
     Automatically fix lint issues using specified linter.
 
+    Several paths are linted by a single linter process (in batches of
+    _FORMAT_BATCH_SIZE) instead of one process per path. With several
+    linters, checks run concurrently; fixes run one linter at a time in
+    isort, black, ruff order since they rewrite the same files. Linters run
+    as asyncio subprocesses, so other tool calls proceed meanwhile.
+
     Args:
-        file_path: Path to the file or directory to lint.
-        linter: Linter to use ('ruff', 'black', 'isort').
+        file_path: Path, or list of paths, to the files or directories to lint.
+        linter: Linter, or list of linters, to use ('ruff', 'black', 'isort').
         apply_fix: If True, apply fixes; otherwise, only report issues.
 
     Returns:
         Summary of fixes applied or issues found.
     """
     try:
-        import subprocess
-        from pathlib import Path
-
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
-            return f"Error: Path not found: {file_path}"
-
-        if linter == "ruff":
-            cmd = ["ruff", "check", "--fix"] if apply_fix else ["ruff", "check"]
-            cmd.append(str(p))
-        elif linter == "black":
-            if apply_fix:
-                cmd = ["black", str(p)]
-            else:
-                cmd = ["black", "--check", str(p)]
-        elif linter == "isort":
-            if apply_fix:
-                cmd = ["isort", str(p)]
-            else:
-                cmd = ["isort", "--check", str(p)]
-        else:
-            return f"Error: Unsupported linter '{linter}'. Choose from 'ruff', 'black', 'isort'."
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            if apply_fix:
-                return f"Successfully applied {linter} fixes to {file_path}."
-            else:
-                return f"No issues found by {linter} (check passed)."
+        raw_paths = [file_path] if isinstance(file_path, str) else list(file_path)
+        if not raw_paths:
+            return "Error: No paths given."
+        paths = []
+        for raw in raw_paths:
+            p, exists = _resolve_path(raw)
+            if not exists:
+                return f"Error: Path not found: {raw}"
+            paths.append(str(p))
+
+        linters = [linter] if isinstance(linter, str) else list(dict.fromkeys(linter))
+        if not linters:
+            return "Error: No linters given."
+        for name in linters:
+            if name not in _LINTER_COMMANDS:
+                return f"Error: Unsupported linter '{name}'. Choose from 'ruff', 'black', 'isort'."
+
+        target = file_path if isinstance(file_path, str) else f"{len(raw_paths)} paths"
+        if len(linters) == 1:
+            return await _run_linter(linters[0], paths, apply_fix, target)
+        if apply_fix:
+            reports = {
+                name: await _run_linter(name, paths, apply_fix, target)
+                for name in _LINTER_COMMANDS
+                if name in linters
+            }
         else:
-            # Some linters return non-zero when issues are found (even after fixing)
-            output = result.stdout + result.stderr
-            if apply_fix:
-                # Ruff may have fixed some issues, but others remain
-                return f"{linter} completed with output:\n{output}"
-            else:
-                return f"{linter} found issues:\n{output}"
-    except FileNotFoundError as e:
-        return f"Error: Linter '{linter}' not installed. Please install it (pip install {linter})."
+            # Independent checks run as concurrent subprocesses
+            outputs = await asyncio.gather(
+                *(_run_linter(name, paths, apply_fix, target) for name in linters)
+            )
+            reports = dict(zip(linters, outputs))
+        return "\n\n".join(f"### {name}\n{report}" for name, report in reports.items())
     except Exception as e:
         return f"Error running linter: {str(e)}"
 
 
-@mcp.tool()
-def assess_code_quality(file_path: str) -> str:
-    """
-    Assess the quality of a Python file by analyzing complexity, duplication,
-    static analysis issues, and security vulnerabilities.
-
-    Args:
-        file_path: Absolute path to the Python file.
-
-    Returns:
-        A markdown report with metrics and suggestions.
-    """
-    import subprocess
-    import tempfile
-    from pathlib import Path
-
-    p = Path(file_path).expanduser().resolve()
-    if not p.exists():
-        return f"Error: File not found: {file_path}"
-    if p.suffix != ".py":
-        return "Error: Only Python files are supported."
-
-    report_lines = [f"# Code Quality Assessment for {p.name}", ""]
-
-    # 1. Cyclomatic complexity
+def _quality_complexity(file_path: str, p: Path) -> List[str]:
+    """Cyclomatic complexity summary from radon."""
+    report_lines: List[str] = []
     try:
-        from radon.complexity import cc_visit
-
-        content = p.read_text(encoding="utf-8")
-        blocks = cc_visit(content)
+        blocks = _cc_blocks(p)
         if blocks:
             avg_complexity = sum(b.complexity for b in blocks) / len(blocks)
             high_complexity = [b for b in blocks if b.complexity > 10]
@@ -3858,8 +6218,12 @@ def assess_code_quality(file_path: str) -> str:
     except ImportError:
         report_lines.append("## Cyclomatic Complexity")
         report_lines.append("- radon not installed; complexity analysis skipped.")
+    return report_lines
+
 
-    # 2. Code smells (using existing tool)
+def _quality_smells(file_path: str, p: Path) -> List[str]:
+    """Code smell summary from detect_code_smells."""
+    report_lines: List[str] = []
     try:
         smells = detect_code_smells(file_path, cc_threshold=10, loc_threshold=50)
         # The tool returns a markdown report; extract the relevant part
@@ -3879,85 +6243,147 @@ def assess_code_quality(file_path: str) -> str:
     except Exception as e:
         report_lines.append("## Code Smells")
         report_lines.append(f"- Error analyzing smells: {e}")
+    return report_lines
 
-    # 3. Static analysis (code_review)
+
+def _static_analysis_issues(p: Path) -> tuple[List[str], List[str]]:
+    """
+    Issues from pylint, flake8 and bandit as ``file:line: CODE message``.
+
+    Each tool's machine-readable output (pylint and bandit JSON, flake8's
+    one-issue-per-line format) is parsed instead of scraping the text
+    report. Also returns the names of tools that could not be run.
+    """
+    commands = {
+        "pylint": [sys.executable, "-m", "pylint", "--output-format=json", str(p)],
+        "flake8": [
+            sys.executable,
+            "-m",
+            "flake8",
+            "--format=%(path)s:%(row)d: %(code)s %(text)s",
+            str(p),
+        ],
+        "bandit": [sys.executable, "-m", "bandit", "-r", "-q", "-f", "json", str(p)],
+    }
+    issues: List[str] = []
+    skipped: List[str] = []
+    for tool, cmd in commands.items():
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            if tool == "pylint":
+                issues.extend(
+                    f"{m['path']}:{m['line']}: {m['message-id']} {m['message']}"
+                    for m in json.loads(result.stdout)
+                )
+            elif tool == "bandit":
+                issues.extend(
+                    f"{r['filename']}:{r['line_number']}: {r['test_id']} {r['issue_text']}"
+                    for r in json.loads(result.stdout)["results"]
+                )
+            elif result.returncode == 0 or (result.returncode == 1 and result.stdout):
+                issues.extend(line for line in result.stdout.splitlines() if line)
+            else:
+                skipped.append(tool)
+        except (subprocess.TimeoutExpired, ValueError, KeyError, TypeError):
+            # Not installed, timed out, or output we cannot parse
+            skipped.append(tool)
+    return issues, skipped
+
+
+def _quality_static_analysis(file_path: str, p: Path) -> List[str]:
+    """Issue count and samples from pylint, flake8 and bandit."""
+    report_lines: List[str] = []
     try:
-        review = code_review(file_path)
-        # The review contains output from pylint, flake8, bandit
-        # Count lines that look like issues
-        lines = review.split("\n")
-        issue_count = 0
-        for line in lines:
-            if (
-                line.strip()
-                and not line.startswith("===")
-                and not line.startswith("Error")
-            ):
-                # Heuristic: lines containing colon or error codes
-                if ":" in line and (
-                    "error" in line.lower()
-                    or "warning" in line.lower()
-                    or "C" in line
-                    or "W" in line
-                    or "E" in line
-                ):
-                    issue_count += 1
+        issues, skipped = _static_analysis_issues(p)
         report_lines.append("## Static Analysis")
-        report_lines.append(f"- Total issues found: {issue_count}")
-        if issue_count > 0:
+        report_lines.append(f"- Total issues found: {len(issues)}")
+        if issues:
             report_lines.append("- Sample issues:")
-            for line in lines[:5]:
-                if line.strip():
-                    report_lines.append(f"  - {line}")
+            for issue in issues[:5]:
+                report_lines.append(f"  - {issue}")
+        if skipped:
+            report_lines.append(f"- Not run: {', '.join(skipped)}")
     except Exception as e:
         report_lines.append("## Static Analysis")
         report_lines.append(f"- Error running static analysis: {e}")
+    return report_lines
+
 
-    # 4. Security scan (bandit)
+# One line per finding in bandit's text report: ">> Issue: [B101:assert_used] ..."
+_BANDIT_ISSUE_RE = re.compile(r"^>> Issue: (.*)$", re.MULTILINE)
+
+
+def _quality_security(file_path: str, p: Path) -> List[str]:
+    """Vulnerability count and samples from security_scan."""
+    report_lines: List[str] = []
     try:
-        security = security_scan(file_path)
-        lines = security.split("\n")
-        vuln_count = 0
-        for line in lines:
-            if "Issue" in line or "Severity" in line:
-                vuln_count += 1
+        findings = _BANDIT_ISSUE_RE.findall(security_scan(file_path))
         report_lines.append("## Security Scan")
-        report_lines.append(f"- Potential vulnerabilities: {vuln_count}")
-        if vuln_count > 0:
+        report_lines.append(f"- Potential vulnerabilities: {len(findings)}")
+        if findings:
             report_lines.append("- Sample findings:")
-            for line in lines[:3]:
-                if line.strip():
-                    report_lines.append(f"  - {line}")
+            for finding in findings[:3]:
+                report_lines.append(f"  - {finding}")
     except Exception as e:
         report_lines.append("## Security Scan")
         report_lines.append(f"- Error running security scan: {e}")
+    return report_lines
 
-    # 5. Duplicate code detection (within the same file)
-    try:
-        # Use detect_duplicate_code with a temporary directory containing only this file
-        import shutil
-        import tempfile
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmpfile = Path(tmpdir) / p.name
-            shutil.copy2(p, tmpfile)
-            dup_report = detect_duplicate_code(tmpdir, file_pattern="*.py", min_lines=5)
-            if "No duplicate code blocks found" not in dup_report:
-                # Count duplicate blocks
-                lines = dup_report.split("\n")
-                dup_blocks = sum(
-                    1 for line in lines if line.startswith("## Duplicate block")
-                )
-                report_lines.append("## Duplicate Code")
-                report_lines.append(f"- Duplicate blocks: {dup_blocks}")
-            else:
-                report_lines.append("## Duplicate Code")
-                report_lines.append("- No duplicate code blocks detected.")
+
+def _quality_duplicates(file_path: str, p: Path) -> List[str]:
+    """Duplicate blocks within the file."""
+    report_lines: List[str] = []
+    try:
+        duplicates, _ = _find_duplicate_blocks([p], min_lines=5, normalize=True)
+        if duplicates:
+            report_lines.append("## Duplicate Code")
+            report_lines.append(f"- Duplicate blocks: {len(duplicates)}")
+        else:
+            report_lines.append("## Duplicate Code")
+            report_lines.append("- No duplicate code blocks detected.")
     except Exception as e:
         report_lines.append("## Duplicate Code")
         report_lines.append(f"- Error checking duplicates: {e}")
+    return report_lines
+
 
-    # 6. Overall score (simplistic)
+@mcp.tool()
+async def assess_code_quality(file_path: str) -> str:
+    """
+    Assess the quality of a Python file by analyzing complexity, duplication,
+    static analysis issues, and security vulnerabilities.
+
+    Args:
+        file_path: Absolute path to the Python file.
+
+    Returns:
+        A markdown report with metrics and suggestions.
+    """
+    p, exists = _resolve_path(file_path)
+    if not exists:
+        return f"Error: File not found: {file_path}"
+    if p.suffix != ".py":
+        return "Error: Only Python files are supported."
+
+    report_lines = [f"# Code Quality Assessment for {p.name}", ""]
+
+    # The analyses are independent and mostly wait on subprocesses, which
+    # release the GIL, so they run on worker threads off the event loop;
+    # sections keep a fixed order
+    sections = (
+        _quality_complexity,
+        _quality_smells,
+        _quality_static_analysis,
+        _quality_security,
+        _quality_duplicates,
+    )
+    results = await asyncio.gather(
+        *(asyncio.to_thread(section, file_path, p) for section in sections)
+    )
+    for lines in results:
+        report_lines.extend(lines)
+
+    # Overall score (simplistic)
     # Placeholder: compute a score based on the above metrics
     report_lines.append("## Overall Assessment")
     report_lines.append(
@@ -3970,6 +6396,29 @@ def assess_code_quality(file_path: str) -> str:
     return "\n".join(report_lines)
 
 
+# Figure and axes reused across visualize_complexity calls
+_COMPLEXITY_PLOT: Optional[tuple[Any, Any]] = None
+
+
+def _complexity_axes() -> tuple[Any, Any]:
+    """
+    Return the shared (figure, axes) for complexity charts, cleared.
+
+    The figure is built once with matplotlib's object API rather than pyplot,
+    so no GUI backend is ever negotiated and it always renders through Agg.
+    Raises ImportError if matplotlib is not installed.
+    """
+    global _COMPLEXITY_PLOT
+    if _COMPLEXITY_PLOT is None:
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(10, 6))
+        _COMPLEXITY_PLOT = (fig, fig.add_subplot())
+    fig, ax = _COMPLEXITY_PLOT
+    ax.clear()
+    return fig, ax
+
+
 @mcp.tool()
 def visualize_complexity(file_path: str, output_file: str = "") -> str:
     """
@@ -3983,47 +6432,43 @@ def visualize_complexity(file_path: str, output_file: str = "") -> str:
         Success message with path to generated image, or error description.
     """
     try:
-        import matplotlib.pyplot as plt
+        fig, ax = _complexity_axes()
     except ImportError:
         return (
             "Error: matplotlib is not installed. Install with 'pip install matplotlib'."
         )
 
-    try:
-        from radon.complexity import cc_visit
-    except ImportError:
-        return "Error: radon is not installed. Install with 'pip install radon'."
-
-    import os
-    import tempfile
-    from pathlib import Path
-
-    p = Path(file_path).expanduser().resolve()
-    if not p.exists():
+    p, exists = _resolve_path(file_path)
+    if not exists:
         return f"Error: File not found: {file_path}"
     if p.suffix != ".py":
         return "Error: Only Python files are supported."
 
-    content = p.read_text(encoding="utf-8")
-    blocks = cc_visit(content)
+    try:
+        blocks = _cc_blocks(p)
+    except ImportError:
+        return "Error: radon is not installed. Install with 'pip install radon'."
 
     if not blocks:
         return "No functions found to analyze."
 
-    # Extract function names and complexities
-    names = []
-    complexities = []
-    for block in blocks:
-        names.append(block.name)
-        complexities.append(block.complexity)
+    # numpy is a matplotlib dependency, so it is available here
+    import numpy as np
 
-    # Create bar chart
-    plt.figure(figsize=(10, 6))
-    plt.barh(names, complexities, color="skyblue")
-    plt.xlabel("Cyclomatic Complexity")
-    plt.title(f"Function Complexity in {p.name}")
-    plt.gca().invert_yaxis()  # highest on top
-    plt.tight_layout()
+    names = np.array([block.name for block in blocks], dtype=object)
+    complexities = np.fromiter(
+        (block.complexity for block in blocks), dtype=np.int32, count=len(blocks)
+    )
+    # Most complex first (ties keep source order); barh draws bottom-up
+    order = np.argsort(-complexities, kind="stable")[::-1]
+
+    # Create bar chart; numeric positions keep same-named methods apart
+    positions = np.arange(len(blocks))
+    ax.barh(positions, complexities[order], color="skyblue")
+    ax.set_yticks(positions, labels=names[order])
+    ax.set_xlabel("Cyclomatic Complexity")
+    ax.set_title(f"Function Complexity in {p.name}")
+    fig.tight_layout()
 
     # Determine output file
     if output_file:
@@ -4034,8 +6479,7 @@ def visualize_complexity(file_path: str, output_file: str = "") -> str:
         os.close(fd)
         out_path = Path(temp_path)
 
-    plt.savefig(out_path, dpi=150)
-    plt.close()
+    fig.savefig(out_path, dpi=150)
 
     return f"Complexity visualization saved to: {out_path}"
 
@@ -4052,8 +6496,8 @@ def count_lines(file_path: str) -> str:
         Markdown summary of line counts.
     """
     try:
-        p = Path(file_path).expanduser().resolve()
-        if not p.exists():
+        p, exists = _resolve_path(file_path)
+        if not exists:
             return f"Error: File not found: {file_path}"
         content = p.read_text(encoding="utf-8", errors="replace")
         lines = content.splitlines()
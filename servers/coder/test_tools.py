@@ -1,3 +1,4 @@
+import asyncio
 import sys
 
 sys.path.insert(0, ".")
@@ -6,7 +7,7 @@ from server import ai_suggest_code, analyze_dependencies
 
 # Test analyze_dependencies
 print("Testing analyze_dependencies...")
-result = analyze_dependencies(".")
+result = asyncio.run(analyze_dependencies("."))
 print(result)
 
 # Test ai_suggest_code (requires OpenAI API key)
@@ -1,3 +1,4 @@
+import asyncio
 import sys
 
 sys.path.insert(0, "/Users/zdwalter/agent_ds/servers/coder")
@@ -13,7 +14,7 @@ with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
 
 try:
     print("Testing code_review...")
-    result = code_review(temp_path)
+    result = asyncio.run(code_review(temp_path))
     print(result[:500])
     print("\nTesting security_scan...")
     result2 = security_scan(temp_path)
@@ -183,6 +183,20 @@ def test_inline_variable():
             os.unlink(f.name)
 
 
+def test_inline_variable_keeps_code_valid(tmp_path):
+    """Test inlining into an f-string and under an attribute access."""
+    from coder.server import inline_variable
+
+    source = tmp_path / "mod.py"
+    source.write_text("def f():\n    name = 'hi'\n    return f'{name}!'\n")
+    assert "Successfully inlined" in inline_variable(str(source), "name")
+    assert "return f\"{'hi'}!\"" in source.read_text()
+
+    source.write_text("def f():\n    n = 1\n    return n.bit_length()\n")
+    assert "Successfully inlined" in inline_variable(str(source), "n")
+    assert "return (1).bit_length()" in source.read_text()
+
+
 def test_code_completion():
     """Test code completion suggestions."""
     import os
@@ -242,3 +256,182 @@ def foo():
             assert "Isort" in result
         finally:
             os.unlink(f.name)
+
+
+def test_profile_python_file(tmp_path):
+    """Test in-process profiling captures script output and stats."""
+    from coder.server import profile_python_file
+
+    script = tmp_path / "script.py"
+    script.write_text(
+        "def work():\n    return sum(range(100))\n\nprint('total', work())\n"
+    )
+    result = profile_python_file(str(script), sort_by="cumulative")
+    assert "Profiling Report for script.py" in result
+    assert "total 4950" in result
+    assert "work" in result
+
+
+def test_get_tree_cache_revalidates(tmp_path):
+    """Test that parsed trees are reused until the file changes."""
+    from coder.server import _get_tree
+
+    source = tmp_path / "mod.py"
+    source.write_text("x = 1\n")
+    content, tree = _get_tree(source)
+    assert content == "x = 1\n"
+    assert _get_tree(source)[1] is tree
+
+    source.write_text("x = 1\ny = 2\n")
+    content, new_tree = _get_tree(source)
+    assert new_tree is not tree
+    assert "y = 2" in content
+
+
+def test_lint_with_pylint_sees_edits(tmp_path):
+    """Test that in-process pylint runs pick up changes to the linted file."""
+    from coder.server import lint_with_pylint
+
+    source = tmp_path / "mod.py"
+    source.write_text("import os\n")
+    assert "Unused import os" in lint_with_pylint(str(source))
+
+    source.write_text("import sys\n")
+    os.utime(source, ns=(0, 0))
+    result = lint_with_pylint(str(source))
+    assert "Unused import sys" in result
+    assert "Unused import os" not in result
+
+
+def test_git_diff_file_tracks_index(tmp_path):
+    """Test the single-file git_diff shortcut against staged and unstaged edits."""
+    import subprocess
+
+    from coder.server import git_diff
+
+    def git(*args):
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True)
+
+    git("init", "-q")
+    (tmp_path / "f.txt").write_text("a\n")
+    git("add", "f.txt")
+    assert git_diff(str(tmp_path), "f.txt") == "No differences."
+
+    (tmp_path / "f.txt").write_text("b\n")
+    assert "+b" in git_diff(str(tmp_path), "f.txt")
+
+    git("add", "f.txt")
+    assert git_diff(str(tmp_path), "f.txt") == "No differences."
+
+    git("update-index", "--chmod=+x", "f.txt")
+    assert "new mode 100644" in git_diff(str(tmp_path), "f.txt")
+
+
+def test_refactor_rename_keeps_formatting(tmp_path):
+    """Test that renaming edits only the identifiers and keeps comments."""
+    from coder.server import refactor_rename
+
+    source = tmp_path / "mod.py"
+    source.write_text("# header\nx = 1  # one\nprint(x,  obj.x)\n")
+    result = refactor_rename(str(source), "x", "count")
+    assert "Renamed 2 occurrence(s)" in result
+    assert source.read_text() == "# header\ncount = 1  # one\nprint(count,  obj.x)\n"
+
+
+def test_remove_unused_imports_keeps_layout(tmp_path):
+    """Test that unused imports are cut without reformatting the module."""
+    from coder.server import remove_unused_imports
+
+    source = tmp_path / "mod.py"
+    source.write_text(
+        "# header\nimport os  # unused\nimport json as j\nx = 1; import re\n\n\n"
+        "print(j.dumps(x))  # keep\n"
+    )
+    result = remove_unused_imports(str(source))
+    assert "- `os`" in result and "- `re`" in result
+    assert "json" not in result
+    assert source.read_text() == (
+        "# header\nimport json as j\nx = 1\n\n\nprint(j.dumps(x))  # keep\n"
+    )
+
+
+def test_search_files_python_matches_per_line(tmp_path):
+    """Test that grep keeps Unicode semantics and never spans or passes lines."""
+    from coder.server import _search_files_python
+
+    (tmp_path / "a.txt").write_text("alpha\nfoo\n1\nbeta\n", encoding="utf-8")
+    (tmp_path / "b.txt").write_text("café au lait\nx\n", encoding="utf-8")
+
+    assert _search_files_python(str(tmp_path), r"caf\w", file_pattern="b.txt") == (
+        f"{tmp_path / 'b.txt'}:1:café au lait"
+    )
+    assert "b.txt:1:" in _search_files_python(str(tmp_path), "CAFÉ", ignore_case=True)
+    assert _search_files_python(str(tmp_path), r"alpha\s+\S+\s+\d\s+beta") == (
+        "No matches found."
+    )
+    result = _search_files_python(str(tmp_path), "^", file_pattern="a.txt")
+    assert result.splitlines()[-1].endswith("a.txt:4:beta")
+
+
+def test_ruff_server_fix_round_trip(tmp_path, monkeypatch):
+    """Test fixing through ruff server, including a configuration change."""
+    import shutil
+
+    import pytest
+
+    if shutil.which("ruff") is None:
+        pytest.skip("ruff is not installed")
+    from coder.server import _RuffServer
+
+    monkeypatch.chdir(tmp_path)
+    server = _RuffServer()
+    source = tmp_path / "mod.py"
+    config = tmp_path / "ruff.toml"
+    try:
+        config.write_text('[lint]\nignore = ["F401"]\n')
+        source.write_text("import os\n")
+        assert server.fix_file(source) is True
+        assert source.read_text() == "import os\n"
+
+        config.write_text("[lint]\n")
+        assert server.fix_file(source) is True
+        assert source.read_text() == ""
+    finally:
+        server.shutdown()
+
+
+def test_atomic_write_keeps_symlinks(tmp_path):
+    """Test that editing through a symlink rewrites its target, not the link."""
+    from coder.server import _resolve_path, edit_code_file
+
+    target = tmp_path / "real.py"
+    target.write_text("a = 1\n")
+    link = tmp_path / "link.py"
+    link.symlink_to(target)
+    assert edit_code_file(str(link), "a = 1", "a = 2") == "File updated successfully."
+    assert link.is_symlink()
+    assert target.read_text() == "a = 2\n"
+    assert _resolve_path(str(link)) == (target.resolve(), True)
+
+
+def test_analyze_typescript_overlapping_declarations(tmp_path):
+    """Test that a bodiless function does not hide the declaration after it."""
+    from coder.server import _analyze_typescript_file
+
+    source = tmp_path / "mod.ts"
+    source.write_text(
+        "declare function load(id: string): Promise<void>;\n"
+        "export interface Options {\n  a: number;\n}\n"
+    )
+    assert _analyze_typescript_file(source) == "Function: load\nInterface: Options"
+
+
+def test_batch_format_reports_failures(tmp_path):
+    """Test that batch_format does not report success for failed runs."""
+    from coder.server import batch_format
+
+    (tmp_path / "bad.py").write_text("x = (\n")
+    assert batch_format(str(tmp_path), workers=0) == (
+        "Error: workers must be at least 1."
+    )
+    assert "Formatted 0 out of 1 files." in batch_format(str(tmp_path), workers=1)